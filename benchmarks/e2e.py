@@ -0,0 +1,418 @@
+"""
+End-to-end runs of the action against an in-process fake GitHub API and fake inference
+cluster, nothing leaves the machine. The event payloads of test/ are the seeds: the pull
+request one gets a synthetic diff of N files with M hunks each, the review comment one a
+thread started by the bot so the reply path runs too.
+
+Each run is a fresh `python main.py` process (GitHub state is built at import) and reports
+wall time, GitHub reads and writes, LLM calls and the peak RSS of the process.
+
+    python -m benchmarks.e2e [--scenario pull_request review_comment] [--files 10]
+        [--hunks 3] [--latency lognormal:0.5,0.5] [--runs 1] [--json results.json]
+
+The scripted behaviours of benchmarks.fake_llm (error bursts, cold start, per token latency,
+canned answers) are available as well, and --backup points the Azure backup bots at the
+fake inference server too, so retries and the fallback are part of the run.
+
+The runs need the cl100k_base vocabulary on disk, tiktoken would download it otherwise: the
+bundled one, --tokenizer-path (PR_REVIEWER_TOKENIZER_PATH by default) or a tiktoken cache
+that holds it. It is checked before the runs and handed to each of them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from benchmarks.fake_github import BOT_USER, FakeGitHub, PullRequestState
+from benchmarks.fake_llm import Behaviour, FakeInference, add_behaviour_arguments
+from core.templates.tags import COMMENT_TAG
+from core.tokenizer import BPE_HASH, BUNDLED_BPE_PATH, TOKENIZER_PATH_ENV
+
+ROOT_FOLDER = Path(__file__).resolve().parent.parent
+PULL_REQUEST_EVENT = ROOT_FOLDER / "test" / "github_event_path_mock_pull_request.json"
+REVIEW_COMMENT_EVENT = (
+    ROOT_FOLDER / "test" / "github_event_path_mock_pull_request_review_comment.json"
+)
+SCENARIOS = ("pull_request", "review_comment")
+
+# Where tiktoken downloads cl100k_base from, its cache files are named after the URL
+BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+HUNK_SPACING = 20
+ADDED_LINES = 2
+
+
+@dataclass
+class Scenario:
+    event_name: str
+    payload: dict[str, Any]
+    state: PullRequestState
+
+
+@dataclass
+class RunResult:
+    scenario: str
+    files: int
+    hunks: int
+    behaviour: str
+    exit_code: int
+    # ::error lines of the log, main() reports failures without a non-zero exit code
+    errors: int
+    wall_s: float
+    github_reads: int
+    github_writes: int
+    llm_calls: int
+    llm_latency_s: float
+    peak_rss_mb: float
+    github_requests: dict[str, int] = field(default_factory=dict)
+    llm_stages: dict[str, int] = field(default_factory=dict)
+
+
+def _load_payload(path: Path) -> dict[str, Any]:
+    event = json.loads(path.read_text())
+    return event.get("payload", event)
+
+
+def _sha(rng: random.Random) -> str:
+    return f"{rng.getrandbits(160):040x}"
+
+
+def synthetic_file(
+    index: int, hunks: int, rng: random.Random
+) -> tuple[dict[str, Any], str]:
+    # Base content of hunks * HUNK_SPACING lines, each hunk adds ADDED_LINES lines in the
+    # middle of 6 context lines
+    filename = f"src/module_{index:03d}.py"
+    base_lines = [
+        f"    value_{line} = compute(value_{line - 1}, {rng.randint(0, 99)})"
+        for line in range(1, hunks * HUNK_SPACING + 1)
+    ]
+    patch_hunks = []
+    for hunk in range(hunks):
+        old_start = hunk * HUNK_SPACING + 1
+        new_start = old_start + hunk * ADDED_LINES
+        context = base_lines[old_start - 1 : old_start + 5]
+        added = [
+            f"    checked_{hunk}_{line} = validate(value_{old_start + 2})"
+            for line in range(ADDED_LINES)
+        ]
+        body = [f" {line}" for line in context[:3]]
+        body += [f"+{line}" for line in added]
+        body += [f" {line}" for line in context[3:]]
+        patch_hunks.append(
+            f"@@ -{old_start},6 +{new_start},{6 + ADDED_LINES} @@ def module_{index}():\n"
+            + "\n".join(body)
+        )
+    additions = hunks * ADDED_LINES
+    return {
+        "sha": _sha(rng),
+        "filename": filename,
+        "status": "modified",
+        "additions": additions,
+        "deletions": 0,
+        "changes": additions,
+        "patch": "\n".join(patch_hunks),
+    }, "\n".join([f"def module_{index}():"] + base_lines) + "\n"
+
+
+def pull_request_scenario(files: int, hunks: int, seed: int) -> Scenario:
+    rng = random.Random(seed)
+    payload = _load_payload(PULL_REQUEST_EVENT)
+    pull_request = payload["pull_request"]
+    synthetic = [synthetic_file(index, hunks, rng) for index in range(files)]
+    commits = [
+        {"sha": _sha(rng), "commit": {"message": f"Update modules ({index + 1})"}}
+        for index in range(3)
+    ]
+    pull_request["head"]["sha"] = commits[-1]["sha"]
+    pull_request["additions"] = sum(file["additions"] for file, _ in synthetic)
+    pull_request["deletions"] = 0
+    pull_request["changed_files"] = files
+    pull_request["commits"] = len(commits)
+    pull_request["draft"] = False
+    pull_request["body"] = "Synthetic pull request of the end-to-end benchmark."
+    return Scenario(
+        event_name="pull_request",
+        payload=payload,
+        state=PullRequestState(
+            full_name=pull_request["base"]["repo"]["full_name"],
+            pull_request=copy.deepcopy(pull_request),
+            files=[file for file, _ in synthetic],
+            commits=commits,
+            contents={file["filename"]: content for file, content in synthetic},
+        ),
+    )
+
+
+def review_comment_scenario(files: int, hunks: int, seed: int) -> Scenario:
+    # The user comment of the payload answers a bot comment of the same thread
+    rng = random.Random(seed)
+    payload = _load_payload(REVIEW_COMMENT_EVENT)
+    pull_request = payload["pull_request"]
+    comment = payload["comment"]
+    synthetic = [synthetic_file(index, hunks, rng) for index in range(files)]
+    thread_content = "\n".join(
+        line[1:] for line in comment["diff_hunk"].split("\n")[1:]
+    )
+    top_level = {
+        **comment,
+        "id": comment["in_reply_to_id"],
+        "in_reply_to_id": None,
+        "body": f"Consider handling the HTTP error codes here.\n\n{COMMENT_TAG}",
+        "html_url": comment["html_url"].replace(
+            str(comment["id"]), str(comment["in_reply_to_id"])
+        ),
+        "user": BOT_USER,
+    }
+    return Scenario(
+        event_name="pull_request_review_comment",
+        payload=payload,
+        state=PullRequestState(
+            full_name=pull_request["base"]["repo"]["full_name"],
+            pull_request=copy.deepcopy(pull_request),
+            files=[file for file, _ in synthetic],
+            commits=[{"sha": pull_request["head"]["sha"], "commit": {"message": ""}}],
+            contents={
+                **{file["filename"]: content for file, content in synthetic},
+                comment["path"]: thread_content,
+            },
+            review_comments={
+                top_level["id"]: top_level,
+                comment["id"]: copy.deepcopy(comment),
+            },
+        ),
+    )
+
+
+def find_vocabulary(tokenizer_path: str | None) -> Path:
+    if tokenizer_path:
+        path = Path(tokenizer_path)
+    elif BUNDLED_BPE_PATH.exists():
+        path = BUNDLED_BPE_PATH
+    else:
+        cache_dir = (
+            os.environ.get("TIKTOKEN_CACHE_DIR")
+            or os.environ.get("DATA_GYM_CACHE_DIR")
+            or os.path.join(tempfile.gettempdir(), "data-gym-cache")
+        )
+        path = Path(cache_dir) / hashlib.sha1(BPE_URL.encode()).hexdigest()
+        if not path.exists():
+            raise ValueError(
+                "the cl100k_base vocabulary is needed and would be downloaded by every "
+                f"run: download {BPE_URL} and pass it with --tokenizer-path or "
+                f"{TOKENIZER_PATH_ENV}"
+            )
+    if not path.is_file():
+        raise ValueError(f"tokenizer vocabulary {path} does not exist")
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    if digest != BPE_HASH:
+        raise ValueError(f"{path} is not the cl100k_base vocabulary, hash {digest}")
+    return path
+
+
+def action_inputs(
+    inference: FakeInference, overrides: dict[str, str], backup: bool = False
+) -> str:
+    # Defaults of action.yml, the way the runner passes them in INPUTS
+    action = yaml.safe_load((ROOT_FOLDER / "action.yml").read_text())
+    inputs = {
+        name: str(spec.get("default", "")) for name, spec in action["inputs"].items()
+    }
+    inputs.update(
+        api_base_url=f"{inference.url}\n",
+        api_base_url_azure=f"{inference.url}\n{inference.url}\n" if backup else "",
+        light_model_port=str(inference.port),
+        heavy_model_port=str(inference.port),
+        light_model_token_azure="e2e-benchmark" if backup else "",
+        heavy_model_token_azure="e2e-benchmark" if backup else "",
+    )
+    inputs.update(overrides)
+    return json.dumps(inputs)
+
+
+def run_action(
+    scenario: Scenario,
+    github: FakeGitHub,
+    inference: FakeInference,
+    run_dir: Path,
+    inputs: dict[str, str],
+    tokenizer_path: Path,
+    backup: bool = False,
+) -> tuple[int, float, float]:
+    event_path = run_dir / "event.json"
+    event_path.write_text(json.dumps({"payload": scenario.payload}))
+    env = {
+        **os.environ,
+        "GITHUB_ACTIONS": "true",
+        "INPUTS": action_inputs(inference, inputs, backup),
+        "GITHUB_API_URL": github.url,
+        "GITHUB_REPOSITORY": scenario.state.full_name,
+        "GITHUB_EVENT_NAME": scenario.event_name,
+        "GITHUB_EVENT_PATH": str(event_path),
+        "GITHUB_TOKEN": "e2e-benchmark",
+        "GITHUB_STEP_SUMMARY": str(run_dir / "step_summary.md"),
+        "RUNNER_TEMP": str(run_dir),
+        # Every request reaches the fake API, counts are not hidden by a warm cache
+        "PR_REVIEWER_HTTP_CACHE_MAX_MB": "0",
+        TOKENIZER_PATH_ENV: str(tokenizer_path),
+    }
+    env.pop("PR_SNAPSHOT_PATH", None)
+    with open(run_dir / "action.log", "w") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "main.py"],
+            cwd=ROOT_FOLDER,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        # wait4 gives the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return process.returncode, wall, usage.ru_maxrss / scale
+
+
+def read_llm_calls(run_dir: Path) -> list[dict[str, Any]]:
+    path = run_dir / "pr-reviewer-llm-calls.jsonl"
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line]
+
+
+def run_scenario(
+    name: str,
+    args: argparse.Namespace,
+    run_index: int,
+    output_dir: Path,
+    tokenizer_path: Path,
+) -> RunResult:
+    build = pull_request_scenario if name == "pull_request" else review_comment_scenario
+    scenario = build(args.files, args.hunks, args.seed + run_index)
+    run_dir = output_dir / f"{name}-{run_index}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    with FakeGitHub(scenario.state) as github, FakeInference(
+        Behaviour.from_args(args),
+        seed=args.seed + run_index,
+    ) as inference:
+        exit_code, wall, peak_rss_mb = run_action(
+            scenario,
+            github,
+            inference,
+            run_dir,
+            inputs={"concurrency_limit": str(args.concurrency)},
+            tokenizer_path=tokenizer_path,
+            backup=args.backup,
+        )
+    llm_calls = read_llm_calls(run_dir)
+    log = (run_dir / "action.log").read_text(errors="replace")
+    llm_stages: dict[str, int] = {}
+    for call in llm_calls:
+        # Per backend as well, to tell the fallbacks apart
+        stage = f"{call['stage']} ({call['backend']})"
+        llm_stages[stage] = llm_stages.get(stage, 0) + 1
+    return RunResult(
+        scenario=name,
+        files=args.files,
+        hunks=args.hunks,
+        behaviour=str(inference.behaviour),
+        exit_code=exit_code,
+        errors=sum(1 for line in log.splitlines() if line.startswith("::error")),
+        wall_s=wall,
+        github_reads=github.reads,
+        github_writes=github.writes,
+        llm_calls=len(llm_calls),
+        llm_latency_s=inference.latency_total,
+        peak_rss_mb=peak_rss_mb,
+        github_requests=dict(sorted(github.requests.items())),
+        llm_stages=llm_stages,
+    )
+
+
+def print_results(results: list[RunResult], verbose: bool) -> None:
+    print(
+        f"{'scenario':<16} {'files':>5} {'hunks':>5} {'wall s':>8} {'reads':>6} "
+        f"{'writes':>6} {'llm':>5} {'llm s':>7} {'rss MB':>7} {'errors':>6}"
+    )
+    for result in results:
+        print(
+            f"{result.scenario:<16} {result.files:>5} {result.hunks:>5} "
+            f"{result.wall_s:>8.2f} {result.github_reads:>6} {result.github_writes:>6} "
+            f"{result.llm_calls:>5} {result.llm_latency_s:>7.2f} "
+            f"{result.peak_rss_mb:>7.1f} {result.errors:>6}"
+        )
+        if verbose:
+            for route, count in result.github_requests.items():
+                print(f"    {count:>5}  {route}")
+            for stage, count in sorted(result.llm_stages.items()):
+                print(f"    {count:>5}  llm {stage}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--hunks", type=int, default=3)
+    add_behaviour_arguments(parser)
+    parser.add_argument(
+        "--backup",
+        action="store_true",
+        help="configure the Azure backup bots, served by the fake inference too",
+    )
+    parser.add_argument("--concurrency", type=int, default=6)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results there")
+    parser.add_argument(
+        "--output-dir", help="keep the logs, traces and LLM call records there"
+    )
+    parser.add_argument(
+        "--tokenizer-path",
+        default=os.environ.get(TOKENIZER_PATH_ENV),
+        help="cl100k_base vocabulary file, the runs must not download it",
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    try:
+        tokenizer_path = find_vocabulary(args.tokenizer_path)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory(prefix="pr-reviewer-e2e-") as temp_dir:
+        output_dir = Path(args.output_dir or temp_dir)
+        results = [
+            run_scenario(name, args, run_index, output_dir, tokenizer_path)
+            for name in args.scenario
+            for run_index in range(args.runs)
+        ]
+    print_results(results, args.verbose)
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps([asdict(result) for result in results], indent=2)
+        )
+    if any(result.exit_code != 0 or result.errors for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,557 @@
+"""
+In-process stand-in for the GitHub REST API (and the review threads GraphQL query), holding
+one pull request: the comparison, file contents and tree, issue comments, reviews and review
+comments.
+Writes change that state, so a run sees its own comments, and every request is counted.
+
+Only the routes the action uses are served. Review comments on lines outside the diff are
+rejected with a 422, like GitHub does, and so is a second pending review.
+"""
+
+from __future__ import annotations
+
+import base64
+import copy
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.parse import parse_qs, unquote, urlparse
+
+from core.schemas.patch import parse_hunks
+
+BOT_USER = {"login": "github-actions[bot]", "type": "Bot"}
+RATE_LIMIT = 5000
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def commentable_lines(patch: str | None) -> set[int]:
+    # New side lines GitHub accepts review comments on: the new range of every hunk
+    lines = set()
+    for hunk in parse_hunks(patch):
+        lines.update(range(hunk.new_start, hunk.new_end_line + 1))
+    return lines
+
+
+@dataclass
+class PullRequestState:
+    full_name: str
+    # The pull_request object of the event payload
+    pull_request: dict[str, Any]
+    # Comparison between the base and head commits
+    files: list[dict[str, Any]]
+    commits: list[dict[str, Any]]
+    # File contents by path, served for any ref
+    contents: dict[str, str] = field(default_factory=dict)
+    issue_comments: dict[int, dict[str, Any]] = field(default_factory=dict)
+    reviews: dict[int, dict[str, Any]] = field(default_factory=dict)
+    review_comments: dict[int, dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def number(self) -> int:
+        return int(self.pull_request["number"])
+
+
+class FakeGitHub:
+    def __init__(self, state: PullRequestState, host: str = "127.0.0.1", port: int = 0):
+        self.state = state
+        self.requests: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1_000_000)
+        self._commentable = {
+            file["filename"]: commentable_lines(file.get("patch"))
+            for file in state.files
+        }
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+        self._routes: list[tuple[str, re.Pattern, Callable[..., Any]]] = [
+            (method, re.compile(f"^{pattern}$"), handler)
+            for method, pattern, handler in (
+                ("GET", r"/repos/[^/]+/[^/]+/compare/(?P<spec>.+)", self.compare),
+                ("GET", r"/repos/[^/]+/[^/]+/contents/(?P<path>.+)", self.contents),
+                ("GET", r"/repos/[^/]+/[^/]+/git/trees/(?P<ref>.+)", self.get_tree),
+                ("GET", r"/repos/[^/]+/[^/]+/pulls/(?P<number>\d+)", self.get_pull),
+                ("PATCH", r"/repos/[^/]+/[^/]+/pulls/(?P<number>\d+)", self.edit_pull),
+                ("GET", r"/repos/[^/]+/[^/]+/pulls/\d+/commits", self.list_commits),
+                ("GET", r"/repos/[^/]+/[^/]+/pulls/\d+/files", self.list_files),
+                ("GET", r"/repos/[^/]+/[^/]+/pulls/\d+/reviews", self.list_reviews),
+                ("POST", r"/repos/[^/]+/[^/]+/pulls/\d+/reviews", self.create_review),
+                (
+                    "PUT",
+                    r"/repos/[^/]+/[^/]+/pulls/\d+/reviews/(?P<id>\d+)",
+                    self.edit_review,
+                ),
+                (
+                    "DELETE",
+                    r"/repos/[^/]+/[^/]+/pulls/\d+/reviews/(?P<id>\d+)",
+                    self.delete_review,
+                ),
+                (
+                    "GET",
+                    r"/repos/[^/]+/[^/]+/pulls/\d+/comments",
+                    self.list_review_comments,
+                ),
+                (
+                    "POST",
+                    r"/repos/[^/]+/[^/]+/pulls/\d+/comments",
+                    self.create_review_comment,
+                ),
+                (
+                    "POST",
+                    r"/repos/[^/]+/[^/]+/pulls/\d+/comments/(?P<id>\d+)/replies",
+                    self.reply_review_comment,
+                ),
+                (
+                    "PATCH",
+                    r"/repos/[^/]+/[^/]+/pulls/comments/(?P<id>\d+)",
+                    self.edit_review_comment,
+                ),
+                (
+                    "DELETE",
+                    r"/repos/[^/]+/[^/]+/pulls/comments/(?P<id>\d+)",
+                    self.delete_review_comment,
+                ),
+                ("GET", r"/repos/[^/]+/[^/]+/issues/(?P<number>\d+)", self.get_issue),
+                (
+                    "GET",
+                    r"/repos/[^/]+/[^/]+/issues/\d+/comments",
+                    self.list_issue_comments,
+                ),
+                (
+                    "POST",
+                    r"/repos/[^/]+/[^/]+/issues/\d+/comments",
+                    self.create_issue_comment,
+                ),
+                (
+                    "PATCH",
+                    r"/repos/[^/]+/[^/]+/issues/comments/(?P<id>\d+)",
+                    self.edit_issue_comment,
+                ),
+                (
+                    "DELETE",
+                    r"/repos/[^/]+/[^/]+/issues/comments/(?P<id>\d+)",
+                    self.delete_issue_comment,
+                ),
+                ("POST", r"/graphql", self.graphql),
+            )
+        ]
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def repo_url(self) -> str:
+        return f"{self.url}/repos/{self.state.full_name}"
+
+    @property
+    def pull_url(self) -> str:
+        return f"{self.repo_url}/pulls/{self.state.number}"
+
+    def start(self) -> FakeGitHub:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-github", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> FakeGitHub:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def reads(self) -> int:
+        # The review threads query only reads
+        return sum(
+            count
+            for route, count in self.requests.items()
+            if route.startswith("GET ") or route == "POST graphql"
+        )
+
+    @property
+    def writes(self) -> int:
+        return sum(self.requests.values()) - self.reads
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        github = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = (
+                    json.loads(self.rfile.read(length) or b"null") if length else None
+                )
+                status, data = github.handle(self.command, self.path, body)
+                payload = b"" if data is None else json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                resource = "graphql" if self.path.startswith("/graphql") else "core"
+                self.send_header("X-RateLimit-Resource", resource)
+                self.send_header("X-RateLimit-Limit", str(RATE_LIMIT))
+                self.send_header(
+                    "X-RateLimit-Remaining",
+                    str(max(RATE_LIMIT - sum(github.requests.values()), 0)),
+                )
+                self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def handle(self, method: str, raw_path: str, body: Any) -> tuple[int, Any]:
+        url = urlparse(raw_path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                with self._lock:
+                    self.requests[f"{method} {handler.__name__}"] += 1
+                    try:
+                        return handler(body=body, query=query, **match.groupdict())
+                    except KeyError:
+                        return 404, {"message": "Not Found"}
+        with self._lock:
+            self.requests[f"{method} unknown"] += 1
+        return 404, {"message": f"Not Found: {method} {url.path}"}
+
+    # Objects as the REST API returns them, with urls pointing back to this server
+
+    def _pull(self) -> dict[str, Any]:
+        pull = copy.deepcopy(self.state.pull_request)
+        pull["url"] = self.pull_url
+        pull["issue_url"] = f"{self.repo_url}/issues/{self.state.number}"
+        pull["commits"] = len(self.state.commits)
+        return pull
+
+    def _commits(self) -> list[dict[str, Any]]:
+        return [
+            {**commit, "url": f"{self.repo_url}/commits/{commit['sha']}"}
+            for commit in self.state.commits
+        ]
+
+    def _comment_user(self, comment: dict[str, Any]) -> dict[str, Any]:
+        return comment.get("user") or BOT_USER
+
+    # Pull request
+
+    def compare(self, spec: str, **kwargs) -> tuple[int, Any]:
+        base, head = unquote(spec).split("...", 1)
+        return 200, {
+            "url": f"{self.repo_url}/compare/{spec}",
+            "status": "ahead",
+            "ahead_by": len(self.state.commits),
+            "behind_by": 0,
+            "total_commits": len(self.state.commits),
+            "base_commit": {"sha": base},
+            "merge_base_commit": {"sha": base},
+            "commits": self._commits(),
+            "files": self.state.files,
+        }
+
+    def contents(self, path: str, query: dict[str, str], **kwargs) -> tuple[int, Any]:
+        path = unquote(path)
+        content = self.state.contents[path]
+        encoded = base64.b64encode(content.encode()).decode()
+        return 200, {
+            "type": "file",
+            "encoding": "base64",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": f"{abs(hash(content)):040x}"[:40],
+            "size": len(content),
+            "url": f"{self.repo_url}/contents/{path}?ref={query.get('ref', '')}",
+            "content": encoded,
+        }
+
+    def get_tree(self, ref: str, **kwargs) -> tuple[int, Any]:
+        # Same files for any ref, as contents
+        return 200, {
+            "sha": ref,
+            "url": f"{self.repo_url}/git/trees/{ref}",
+            "truncated": False,
+            "tree": [
+                {
+                    "path": path,
+                    "mode": "100644",
+                    "type": "blob",
+                    "sha": f"{abs(hash(content)):040x}"[:40],
+                    "size": len(content.encode()),
+                }
+                for path, content in self.state.contents.items()
+            ],
+        }
+
+    def get_pull(self, **kwargs) -> tuple[int, Any]:
+        return 200, self._pull()
+
+    def edit_pull(self, body: dict[str, Any], **kwargs) -> tuple[int, Any]:
+        for key in ("title", "body", "state"):
+            if key in body:
+                self.state.pull_request[key] = body[key]
+        return 200, self._pull()
+
+    def list_commits(self, **kwargs) -> tuple[int, Any]:
+        return 200, self._commits()
+
+    def list_files(self, **kwargs) -> tuple[int, Any]:
+        return 200, self.state.files
+
+    # Reviews and review comments
+
+    def _review(self, review: dict[str, Any]) -> dict[str, Any]:
+        return {**review, "pull_request_url": self.pull_url}
+
+    def list_reviews(self, **kwargs) -> tuple[int, Any]:
+        return 200, [self._review(review) for review in self.state.reviews.values()]
+
+    def _new_review_comment(
+        self, data: dict[str, Any], review_id: int | None = None
+    ) -> dict[str, Any]:
+        comment_id = next(self._ids)
+        comment = {
+            "id": comment_id,
+            "url": f"{self.repo_url}/pulls/comments/{comment_id}",
+            "html_url": f"https://github.com/{self.state.full_name}/pull/"
+            f"{self.state.number}#discussion_r{comment_id}",
+            "pull_request_review_id": review_id,
+            "path": data["path"],
+            "line": data.get("line"),
+            "start_line": data.get("start_line"),
+            "original_line": data.get("line"),
+            "original_start_line": data.get("start_line"),
+            "side": data.get("side", "RIGHT"),
+            "body": data["body"],
+            "commit_id": data.get("commit_id"),
+            "original_commit_id": data.get("commit_id"),
+            "diff_hunk": "",
+            "in_reply_to_id": data.get("in_reply_to_id"),
+            "user": BOT_USER,
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        return comment
+
+    def _comment_is_valid(self, data: dict[str, Any]) -> bool:
+        lines = self._commentable.get(data.get("path"), set())
+        # position is an offset in the diff hunk, not a line: not supported
+        line = data.get("line")
+        start_line = data.get("start_line") or line
+        return line in lines and start_line in lines
+
+    def create_review(self, body: dict[str, Any], **kwargs) -> tuple[int, Any]:
+        comments = body.get("comments") or []
+        if not all(self._comment_is_valid(comment) for comment in comments):
+            return 422, {
+                "message": "Unprocessable Entity",
+                "errors": ["Line could not be resolved"],
+            }
+        pending = not body.get("event")
+        if pending and any(
+            review["state"] == "PENDING" for review in self.state.reviews.values()
+        ):
+            return 422, {
+                "message": "Unprocessable Entity",
+                "errors": ["User can only have one pending review per pull request"],
+            }
+        review_id = next(self._ids)
+        review = {
+            "id": review_id,
+            "user": BOT_USER,
+            "body": body.get("body") or "",
+            "state": "PENDING" if pending else "COMMENTED",
+            "commit_id": body.get("commit_id"),
+            "submitted_at": _now(),
+            "html_url": f"https://github.com/{self.state.full_name}/pull/"
+            f"{self.state.number}#pullrequestreview-{review_id}",
+        }
+        self.state.reviews[review_id] = review
+        for data in comments:
+            comment = self._new_review_comment(
+                {**data, "commit_id": body.get("commit_id")}, review_id
+            )
+            self.state.review_comments[comment["id"]] = comment
+        return 200, self._review(review)
+
+    def edit_review(self, id: str, body: dict[str, Any], **kwargs) -> tuple[int, Any]:
+        review = self.state.reviews[int(id)]
+        review["body"] = body.get("body", review["body"])
+        return 200, self._review(review)
+
+    def delete_review(self, id: str, **kwargs) -> tuple[int, Any]:
+        review = self.state.reviews[int(id)]
+        if review["state"] != "PENDING":
+            return 422, {"message": "Can not delete a non-pending pull request review"}
+        del self.state.reviews[int(id)]
+        for comment_id, comment in list(self.state.review_comments.items()):
+            if comment["pull_request_review_id"] == int(id):
+                del self.state.review_comments[comment_id]
+        return 200, self._review(review)
+
+    def list_review_comments(self, **kwargs) -> tuple[int, Any]:
+        return 200, list(self.state.review_comments.values())
+
+    def create_review_comment(self, body: dict[str, Any], **kwargs) -> tuple[int, Any]:
+        if not self._comment_is_valid(body):
+            return 422, {"message": "Unprocessable Entity"}
+        comment = self._new_review_comment(body)
+        self.state.review_comments[comment["id"]] = comment
+        return 201, comment
+
+    def reply_review_comment(
+        self, id: str, body: dict[str, Any], **kwargs
+    ) -> tuple[int, Any]:
+        parent = self.state.review_comments[int(id)]
+        comment = self._new_review_comment(
+            {
+                **parent,
+                "body": body["body"],
+                "in_reply_to_id": parent.get("in_reply_to_id") or parent["id"],
+            }
+        )
+        self.state.review_comments[comment["id"]] = comment
+        return 201, comment
+
+    def edit_review_comment(
+        self, id: str, body: dict[str, Any], **kwargs
+    ) -> tuple[int, Any]:
+        comment = self.state.review_comments[int(id)]
+        comment["body"] = body["body"]
+        comment["updated_at"] = _now()
+        return 200, comment
+
+    def delete_review_comment(self, id: str, **kwargs) -> tuple[int, Any]:
+        del self.state.review_comments[int(id)]
+        return 204, None
+
+    # Issue comments
+
+    def get_issue(self, **kwargs) -> tuple[int, Any]:
+        pull = self.state.pull_request
+        return 200, {
+            "number": self.state.number,
+            "url": f"{self.repo_url}/issues/{self.state.number}",
+            "title": pull.get("title"),
+            "body": pull.get("body"),
+            "state": pull.get("state", "open"),
+            "user": pull.get("user"),
+            "pull_request": {"url": self.pull_url},
+        }
+
+    def list_issue_comments(self, **kwargs) -> tuple[int, Any]:
+        return 200, list(self.state.issue_comments.values())
+
+    def create_issue_comment(self, body: dict[str, Any], **kwargs) -> tuple[int, Any]:
+        comment_id = next(self._ids)
+        comment = {
+            "id": comment_id,
+            "url": f"{self.repo_url}/issues/comments/{comment_id}",
+            "html_url": f"https://github.com/{self.state.full_name}/pull/"
+            f"{self.state.number}#issuecomment-{comment_id}",
+            "body": body["body"],
+            "user": BOT_USER,
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        self.state.issue_comments[comment_id] = comment
+        return 201, comment
+
+    def edit_issue_comment(
+        self, id: str, body: dict[str, Any], **kwargs
+    ) -> tuple[int, Any]:
+        comment = self.state.issue_comments[int(id)]
+        comment["body"] = body["body"]
+        comment["updated_at"] = _now()
+        return 200, comment
+
+    def delete_issue_comment(self, id: str, **kwargs) -> tuple[int, Any]:
+        del self.state.issue_comments[int(id)]
+        return 204, None
+
+    # GraphQL, review threads only
+
+    def _thread_comment_node(self, comment: dict[str, Any]) -> dict[str, Any]:
+        user = self._comment_user(comment)
+        login = user.get("login", "")
+        if user.get("type") == "Bot":
+            login = login.removesuffix("[bot]")
+        return {
+            "databaseId": comment["id"],
+            "author": {"login": login, "__typename": user.get("type", "User")},
+            "url": comment.get("html_url"),
+            "body": comment.get("body"),
+            "path": comment.get("path"),
+            "diffHunk": comment.get("diff_hunk"),
+            "createdAt": comment.get("created_at"),
+            "updatedAt": comment.get("updated_at"),
+            "line": comment.get("line"),
+            "startLine": comment.get("start_line"),
+            "originalLine": comment.get("original_line"),
+            "originalStartLine": comment.get("original_start_line"),
+            "pullRequestReview": {"databaseId": comment.get("pull_request_review_id")},
+            "commit": {"oid": comment.get("commit_id")},
+            "originalCommit": {"oid": comment.get("original_commit_id")},
+        }
+
+    def graphql(self, body: dict[str, Any], **kwargs) -> tuple[int, Any]:
+        if "reviewThreads" not in body["query"]:
+            return 200, {"errors": [{"type": "NOT_FOUND", "message": "Not supported"}]}
+        threads: dict[int, list[dict[str, Any]]] = {}
+        for comment in sorted(
+            self.state.review_comments.values(), key=lambda comment: comment["id"]
+        ):
+            threads.setdefault(
+                comment.get("in_reply_to_id") or comment["id"], []
+            ).append(comment)
+        nodes = [
+            {
+                "id": f"thread-{top_level_id}",
+                "path": comments[0].get("path"),
+                "isResolved": False,
+                "isOutdated": False,
+                "line": comments[0].get("line"),
+                "startLine": comments[0].get("start_line"),
+                "comments": {
+                    "nodes": [
+                        self._thread_comment_node(comment) for comment in comments
+                    ],
+                    "pageInfo": {"hasNextPage": False, "endCursor": None},
+                },
+            }
+            for top_level_id, comments in threads.items()
+        ]
+        return 200, {
+            "data": {
+                "repository": {
+                    "pullRequest": {
+                        "reviewThreads": {
+                            "nodes": nodes,
+                            "pageInfo": {"hasNextPage": False, "endCursor": None},
+                        }
+                    }
+                }
+            }
+        }
@@ -0,0 +1,497 @@
+"""
+Local stand-in for the inference services, to exercise the bots without the cluster:
+
+- /cmd/state and /cmd/start, the application endpoints start_pr_reviewer polls
+- /v1/chat/completions as served by TGI for HFBot (huggingface_hub InferenceClient)
+- /v1/chat/completions as served by the Mistral chat API for MistralBot (mistralai client,
+  recognized by its User-Agent)
+
+Answers follow the formats the action parses (triage tag, line ranges of review comments),
+or canned outputs, and are streamed as server-sent events when the request asks for it.
+Scripted behaviours make retries and the fallback reproducible: time to first token drawn
+from a latency distribution, per token latency, cold start of the applications and bursts
+of error statuses. Used in-process by benchmarks.e2e, or on its own:
+
+    python -m benchmarks.fake_llm [--port 8080] [--latency lognormal:0.5,0.5]
+        [--token-latency 0.02] [--cold-start 90] [--hf-errors 504:3/10]
+        [--mistral-errors 429:1/5] [--canned answers.json] [--needs-review-ratio 0.5]
+
+with the action inputs pointing at it:
+
+    api_base_url: http://127.0.0.1:8080
+    light_model_port / heavy_model_port: 8080
+    api_base_url_azure: http://127.0.0.1:8080 (twice, light and heavy)
+    light_model_token_azure / heavy_model_token_azure: any value
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+from urllib.parse import parse_qs, urlparse
+
+ANNOTATED_LINE = re.compile(r"^(\d+): ", re.MULTILINE)
+NEW_HUNK = re.compile(r"---new_hunk---\n```\n(.*?)\n```", re.DOTALL)
+STREAM_PIECE = re.compile(r"\s*\S+")
+ANSWER_KINDS = ("triage", "review", "text")
+
+
+@dataclass
+class LatencyModel:
+    """
+    Seconds before each answer: fixed:S, uniform:LOW,HIGH, exponential:MEAN or
+    lognormal:MEDIAN,SIGMA (long tail, the closest to a busy cluster).
+    """
+
+    kind: str = "fixed"
+    params: tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> LatencyModel:
+        kind, _, params = spec.partition(":")
+        values = tuple(float(value) for value in params.split(",") if value)
+        expected = {"fixed": 1, "uniform": 2, "exponential": 1, "lognormal": 2}
+        if expected.get(kind) != len(values):
+            raise ValueError(f"invalid latency {spec!r}, see LatencyModel")
+        return cls(kind, values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "exponential":
+            return rng.expovariate(1 / self.params[0]) if self.params[0] else 0.0
+        median, sigma = self.params
+        return median * rng.lognormvariate(0, sigma)
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(f'{value:g}' for value in self.params)}"
+
+
+@dataclass
+class ErrorBurst:
+    """
+    STATUS:COUNT/EVERY, the first COUNT chat requests of every EVERY are answered with
+    STATUS (e.g. 504:3/10, the gateway timing out three times in a row).
+    """
+
+    status: int
+    count: int
+    every: int
+
+    @classmethod
+    def parse(cls, spec: str) -> ErrorBurst:
+        match = re.fullmatch(r"(\d{3}):(\d+)/(\d+)", spec)
+        if not match or int(match.group(3)) == 0:
+            raise ValueError(f"invalid error burst {spec!r}, see ErrorBurst")
+        return cls(*(int(group) for group in match.groups()))
+
+    def fails(self, index: int) -> bool:
+        return index % self.every < self.count
+
+    def __str__(self) -> str:
+        return f"{self.status}:{self.count}/{self.every}"
+
+
+@dataclass
+class Behaviour:
+    # Before the first token, then per token of the answer
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    token_latency_s: float = 0.0
+    # Applications are OFFLINE until started, then STARTING for that long
+    cold_start_s: float = 0.0
+    hf_errors: ErrorBurst | None = None
+    mistral_errors: ErrorBurst | None = None
+    needs_review_ratio: float = 1.0
+    # Answer per kind (triage, review, text) instead of the generated ones
+    canned: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> Behaviour:
+        canned = {}
+        if args.canned:
+            with open(args.canned) as f:
+                canned = json.load(f)
+            unknown = set(canned) - set(ANSWER_KINDS)
+            if unknown:
+                raise ValueError(f"unknown answer kinds in {args.canned}: {unknown}")
+        return cls(
+            latency=args.latency,
+            token_latency_s=args.token_latency,
+            cold_start_s=args.cold_start,
+            hf_errors=args.hf_errors,
+            mistral_errors=args.mistral_errors,
+            needs_review_ratio=args.needs_review_ratio,
+            canned=canned,
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"latency={self.latency} token_latency={self.token_latency_s:g}s "
+            f"cold_start={self.cold_start_s:g}s hf_errors={self.hf_errors or '-'} "
+            f"mistral_errors={self.mistral_errors or '-'} "
+            f"needs_review_ratio={self.needs_review_ratio:g} "
+            f"canned={','.join(sorted(self.canned)) or '-'}"
+        )
+
+
+def add_behaviour_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--latency",
+        type=LatencyModel.parse,
+        default=LatencyModel.parse("fixed:0"),
+        help="time to first token: fixed:S, uniform:LOW,HIGH, exponential:MEAN or "
+        "lognormal:MEDIAN,SIGMA",
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.0, help="seconds per answer token"
+    )
+    parser.add_argument(
+        "--cold-start",
+        type=float,
+        default=0.0,
+        help="seconds for an application to come ONLINE once started",
+    )
+    parser.add_argument(
+        "--hf-errors",
+        type=ErrorBurst.parse,
+        help="STATUS:COUNT/EVERY answered by the TGI route, e.g. 504:3/10",
+    )
+    parser.add_argument(
+        "--mistral-errors",
+        type=ErrorBurst.parse,
+        help="STATUS:COUNT/EVERY answered by the Mistral route, e.g. 429:1/5",
+    )
+    parser.add_argument(
+        "--needs-review-ratio",
+        type=float,
+        default=1.0,
+        help="share of the files triaged NEEDS_REVIEW",
+    )
+    parser.add_argument(
+        "--canned", help="json file of answers per kind: triage, review, text"
+    )
+
+
+def _tokens(text: str) -> int:
+    # Close enough to cl100k for sizing, without loading the tokenizer
+    return max(1, len(text) // 4)
+
+
+class FakeInference:
+    def __init__(
+        self,
+        behaviour: Behaviour | None = None,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.behaviour = behaviour or Behaviour()
+        self.requests: Counter[str] = Counter()
+        self.latency_total = 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started: dict[str, float] = {}
+        self._chat_index: Counter[str] = Counter()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> FakeInference:
+        threading.Thread(
+            target=self._server.serve_forever, name="fake-inference", daemon=True
+        ).start()
+        return self
+
+    def serve_forever(self) -> None:
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> FakeInference:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        inference = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, data: Any) -> None:
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, events: Iterator[dict[str, Any]]) -> None:
+                # Server-sent events until the connection is closed
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for event in events:
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                application = parse_qs(url.query).get("application", [""])[0]
+                if url.path == "/cmd/state":
+                    self._reply(200, inference.state(application))
+                elif url.path == "/cmd/start":
+                    self._reply(200, inference.start_application(application))
+                else:
+                    self._reply(404, {"error": f"unknown route {url.path}"})
+
+            def do_POST(self) -> None:
+                path = urlparse(self.path).path
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not path.endswith("/chat/completions"):
+                    self._reply(404, {"error": f"unknown route {path}"})
+                    return
+                user_agent = self.headers.get("User-Agent", "")
+                backend = "mistral" if user_agent.startswith("mistral") else "hf"
+                error = inference.error(backend)
+                if error is not None:
+                    self._reply(*error)
+                elif body.get("stream"):
+                    self._stream(inference.chat_completion_chunks(body, backend))
+                else:
+                    self._reply(200, inference.chat_completion(body, backend))
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.requests[kind] += 1
+
+    def state(self, application: str) -> str:
+        self.count("state")
+        if self.behaviour.cold_start_s <= 0:
+            return "ONLINE"
+        with self._lock:
+            started = self._started.get(application)
+        if started is None:
+            return "OFFLINE"
+        if time.monotonic() - started < self.behaviour.cold_start_s:
+            return "STARTING"
+        return "ONLINE"
+
+    def start_application(self, application: str) -> str:
+        self.count("start")
+        with self._lock:
+            self._started.setdefault(application, time.monotonic())
+        return self.state(application)
+
+    def online(self) -> bool:
+        # Chat requests are served once any application finished its cold start
+        if self.behaviour.cold_start_s <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            return any(
+                now - started >= self.behaviour.cold_start_s
+                for started in self._started.values()
+            )
+
+    def error(self, backend: str) -> tuple[int, dict[str, Any]] | None:
+        # Status and body of a scripted failure of this chat request, if it is one
+        if backend == "hf" and not self.online():
+            self.count("error hf 503")
+            return 503, {"error": "Model is loading", "error_type": "overloaded"}
+        burst = (
+            self.behaviour.hf_errors
+            if backend == "hf"
+            else self.behaviour.mistral_errors
+        )
+        with self._lock:
+            index = self._chat_index[backend]
+            self._chat_index[backend] += 1
+        if burst is None or not burst.fails(index):
+            return None
+        self.count(f"error {backend} {burst.status}")
+        return burst.status, {
+            "error": f"scripted {burst.status}",
+            "status": burst.status,
+        }
+
+    def _draw(self) -> tuple[float, float]:
+        with self._lock:
+            return self.behaviour.latency.sample(self._rng), self._rng.random()
+
+    def answer(self, prompt: str, draw: float) -> tuple[str, str]:
+        if "[TRIAGE]" in prompt:
+            kind = "triage"
+            triage = (
+                "NEEDS_REVIEW"
+                if draw < self.behaviour.needs_review_ratio
+                else "APPROVED"
+            )
+            content = (
+                "* Updates the computation helpers of the module.\n"
+                f"[TRIAGE]: {triage}"
+            )
+        elif NEW_HUNK.search(prompt):
+            kind = "review"
+            comments = []
+            for hunk in NEW_HUNK.findall(prompt):
+                lines = [int(line) for line in ANNOTATED_LINE.findall(hunk)]
+                if lines:
+                    start = lines[0]
+                    end = lines[min(1, len(lines) - 1)]
+                    comments.append(
+                        f"{start}-{end}:\nConsider checking the result of this "
+                        f"computation before using it.\n---"
+                    )
+            content = "\n".join(comments) or "LGTM!"
+        else:
+            kind = "text"
+            content = (
+                "The changes update the computation helpers and their call sites, "
+                "with no change to the public interface."
+            )
+        return kind, self.behaviour.canned.get(kind, content)
+
+    def _prepare(
+        self, body: dict[str, Any], backend: str
+    ) -> tuple[str, str, dict[str, int]]:
+        prompt = "\n".join(
+            message.get("content") or "" for message in body.get("messages", [])
+        )
+        latency, draw = self._draw()
+        time.sleep(latency)
+        kind, content = self.answer(prompt, draw)
+        usage = {
+            "prompt_tokens": _tokens(prompt),
+            "completion_tokens": _tokens(content),
+            "total_tokens": _tokens(prompt) + _tokens(content),
+        }
+        with self._lock:
+            self.requests[f"chat {backend} {kind}"] += 1
+            self.latency_total += (
+                latency + usage["completion_tokens"] * self.behaviour.token_latency_s
+            )
+        return kind, content, usage
+
+    def _envelope(self, body: dict[str, Any], obj: str) -> dict[str, Any]:
+        return {
+            "id": f"fake-{sum(self.requests.values())}",
+            "object": obj,
+            "created": int(time.time()),
+            "model": body.get("model") or "tgi",
+            "system_fingerprint": "fake-inference",
+        }
+
+    def chat_completion(self, body: dict[str, Any], backend: str) -> dict[str, Any]:
+        _, content, usage = self._prepare(body, backend)
+        time.sleep(usage["completion_tokens"] * self.behaviour.token_latency_s)
+        return {
+            **self._envelope(body, "chat.completion"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "logprobs": None,
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    def chat_completion_chunks(
+        self, body: dict[str, Any], backend: str
+    ) -> Iterator[dict[str, Any]]:
+        # About one word per chunk, the usage comes with the last one
+        self.count(f"stream {backend}")
+        _, content, usage = self._prepare(body, backend)
+        envelope = self._envelope(body, "chat.completion.chunk")
+        for index, piece in enumerate(STREAM_PIECE.findall(content)):
+            time.sleep(_tokens(piece) * self.behaviour.token_latency_s)
+            delta = {"content": piece}
+            if index == 0:
+                delta["role"] = "assistant"
+            yield {
+                **envelope,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": delta,
+                        "logprobs": None,
+                        "finish_reason": None,
+                    }
+                ],
+            }
+        yield {
+            **envelope,
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"content": ""},
+                    "logprobs": None,
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--seed", type=int, default=0)
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    inference = FakeInference(
+        Behaviour.from_args(args), seed=args.seed, host=args.host, port=args.port
+    )
+    print(f"Serving on {inference.url}: {inference.behaviour}")
+    try:
+        inference.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for kind, count in sorted(inference.requests.items()):
+            print(f"  {count:>6}  {kind}")
+
+
+if __name__ == "__main__":
+    main()
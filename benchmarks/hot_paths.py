@@ -0,0 +1,411 @@
+"""
+Micro-benchmarks of the CPU hot paths, the functions called once per file, hunk, path or
+comment of a PR, on synthetic inputs from a small PR to monorepo scale:
+
+- parse_hunks + Patch.from_hunk (splitting a file diff into patches)
+- Hunk.write (rendering the annotated new / old hunks of the prompts)
+- get_token_count
+- ReviewSummary.parse_ai_review
+- sanitize_response
+- PathFilter.check (memo cleared, every path is matched once)
+- CommentIndex.within_range (what get_review_comments_within_range resolves to)
+- Prompts.render_review_file_diff
+
+Timings are relative to a fixed pure Python workload timed in alternation with each case, so
+baselines hold when the CPU speed changes, between runs, during a run or on a similar
+machine. This is why it is a script and not a pytest-benchmark suite: pytest-benchmark
+compares absolute timings, and on a shared runner the speed alone moves them by more than
+the tolerance, failing unchanged code. They are compared with
+benchmarks/baselines/hot_paths.json and the run fails (exit code 1) when a case is slower
+than its baseline by more than the tolerance, or when a case with a baseline can't run.
+Cases under 10 us per call are reported but not gated, timer and scheduling noise alone
+moves them by more than the tolerance.
+
+    python -m benchmarks.hot_paths [--size small medium monorepo] [--case parse_hunks]
+        [--tolerance 0.3] [--save]
+
+get_token_count needs the cl100k_base vocabulary on disk: the bundled one,
+PR_REVIEWER_TOKENIZER_PATH or a tiktoken cache.
+
+--save records the current timings as the new baselines, after an intended change.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+os.environ.setdefault("GITHUB_REPOSITORY", "Stellantis-ADX/pr-reviewer-ai")
+os.environ.setdefault("GITHUB_API_URL", "https://api.github.com")
+os.environ.setdefault("GITHUB_EVENT_NAME", "pull_request")
+os.environ.setdefault(
+    "GITHUB_EVENT_PATH", "test/github_event_path_mock_pull_request.json"
+)
+# Nothing is requested from GitHub, the client only needs a token to be built
+os.environ.setdefault("GITHUB_TOKEN", "benchmark")
+
+import yaml
+from github.PullRequestComment import PullRequestComment
+
+from core.bots.bot import AiResponse
+from core.github.comment_index import CommentIndex
+from core.schemas.files import AiSummary, FileContent, FilteredFile
+from core.schemas.options import PathFilter
+from core.schemas.patch import Patch, Patches, parse_hunks
+from core.schemas.pr_common import PRDescription
+from core.schemas.prompts import Prompts
+from core.schemas.review import ReviewSummary
+from core.tokenizer import TOKENIZER, get_token_count
+from core.utils import sanitize_response
+
+ROOT_FOLDER = Path(__file__).resolve().parent.parent
+BASELINES_PATH = ROOT_FOLDER / "benchmarks" / "baselines" / "hot_paths.json"
+
+# Hunks of a file diff, files of a PR, review comments on it
+SIZES = {
+    "small": {"hunks": 5, "paths": 20, "comments": 10},
+    "medium": {"hunks": 100, "paths": 500, "comments": 300},
+    "monorepo": {"hunks": 2000, "paths": 20000, "comments": 5000},
+}
+HUNK_LINES = 12
+ROUNDS = 15
+MIN_ROUND_S = 0.05
+MIN_GATED_US = 10.0
+
+
+def synthetic_file(hunks: int, seed: int = 0) -> FilteredFile:
+    rng = random.Random(seed)
+    parts = []
+    for index in range(hunks):
+        start = 1 + index * 40
+        lines = []
+        for offset in range(HUNK_LINES):
+            prefix = rng.choice(" +-") if 2 < offset < HUNK_LINES - 3 else " "
+            lines.append(
+                f"{prefix}    value_{start + offset} = compute({offset}, {rng.random():.6f})"
+            )
+        parts.append(
+            f"@@ -{start},{HUNK_LINES} +{start},{HUNK_LINES} @@ def function_{index}():\n"
+            + "\n".join(lines)
+        )
+    patch = "\n".join(parts)
+    patches = Patches(items=[Patch.from_hunk(hunk) for hunk in parse_hunks(patch)])
+    patches.items_str = "\n".join(str(item) for item in patches.items)
+    return FilteredFile(
+        filename="src/generated/module.py",
+        file_content=FileContent("src/generated/module.py", ref="base"),
+        file_diff=patch,
+        patches=patches,
+    )
+
+
+def synthetic_review(file: FilteredFile) -> str:
+    # One comment per patch, every other one with a suggestion still carrying line numbers
+    comments = []
+    for index, patch in enumerate(file.patches):
+        comment = (
+            f"{patch.start_line}-{patch.end_line}:\nCheck the value computed here."
+        )
+        if index % 2 == 0:
+            suggestion = "\n".join(
+                f"{line}:     value_{line} = compute_checked({line})"
+                for line in range(patch.start_line, patch.start_line + 3)
+            )
+            comment += f"\n```suggestion\n{suggestion}\n```"
+        comments.append(comment + "\n---")
+    return "\n".join(comments)
+
+
+def synthetic_paths(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    folders = ["src", "lib", "dist", "node_modules", "vendor", "docs", "test", "build"]
+    extensions = [
+        "py",
+        "ts",
+        "js",
+        "go",
+        "java",
+        "min.js",
+        "lock",
+        "png",
+        "md",
+        "pb.go",
+    ]
+    return [
+        "/".join(rng.choice(folders) for _ in range(rng.randint(1, 5)))
+        + f"/file_{index}.{rng.choice(extensions)}"
+        for index in range(count)
+    ]
+
+
+def synthetic_comments(
+    count: int, paths: int, seed: int = 0
+) -> list[PullRequestComment]:
+    rng = random.Random(seed)
+    comments = []
+    for index in range(count):
+        line = rng.randint(1, 5000)
+        attributes = {
+            "id": index + 1,
+            "path": f"src/file_{rng.randrange(paths)}.py",
+            "body": f"Comment {index}",
+            "line": line,
+            "start_line": line - rng.randint(0, 10) if rng.random() < 0.7 else None,
+            # A third of the comments are replies
+            "in_reply_to_id": (
+                rng.randint(1, index) if index and rng.random() < 0.3 else None
+            ),
+        }
+        comments.append(PullRequestComment(None, {}, attributes, completed=True))
+    return comments
+
+
+def default_path_rules() -> str:
+    action = yaml.safe_load((ROOT_FOLDER / "action.yml").read_text())
+    return action["inputs"]["path_filters"]["default"]
+
+
+def bench_parse_hunks(size: dict[str, int]) -> Callable[[], object]:
+    patch = synthetic_file(size["hunks"]).file_diff
+    return lambda: [Patch.from_hunk(hunk) for hunk in parse_hunks(patch)]
+
+
+def bench_hunk_write(size: dict[str, int]) -> Callable[[], object]:
+    patches = synthetic_file(size["hunks"]).patches
+    return lambda: "\n".join(str(item) for item in patches.items)
+
+
+def bench_get_token_count(size: dict[str, int]) -> Callable[[], object]:
+    # Raises when the vocabulary can't be loaded, which fails the run
+    TOKENIZER.encoding
+    items_str = synthetic_file(size["hunks"]).patches.items_str
+    return lambda: get_token_count(items_str)
+
+
+def bench_parse_ai_review(size: dict[str, int]) -> Callable[[], object]:
+    file = synthetic_file(size["hunks"])
+    response = AiResponse(message=synthetic_review(file))
+    return lambda: ReviewSummary().parse_ai_review(response, file)
+
+
+def bench_sanitize_response(size: dict[str, int]) -> Callable[[], object]:
+    response = synthetic_review(synthetic_file(size["hunks"]))
+    return lambda: sanitize_response(response)
+
+
+def bench_path_filter(size: dict[str, int]) -> Callable[[], object]:
+    path_filter = PathFilter(default_path_rules())
+    paths = synthetic_paths(size["paths"])
+
+    def check_all() -> list[bool]:
+        # Every path is new to the filter, as in a run
+        path_filter._results.clear()
+        return [path_filter.check(path) for path in paths]
+
+    return check_all
+
+
+def bench_comments_within_range(size: dict[str, int]) -> Callable[[], object]:
+    index = CommentIndex(synthetic_comments(size["comments"], size["paths"]))
+    rng = random.Random(0)
+    lookups = []
+    for _ in range(100):
+        start_line = rng.randint(1, 5000)
+        lookups.append(
+            (f"src/file_{rng.randrange(size['paths'])}.py", start_line, start_line + 40)
+        )
+    return lambda: [index.within_range(*lookup) for lookup in lookups]
+
+
+def bench_render_review_file_diff(size: dict[str, int]) -> Callable[[], object]:
+    file = synthetic_file(size["hunks"])
+    prompts = Prompts(summarize="Summarize.", summarize_release_notes="Release notes.")
+    ai_summary = AiSummary(
+        raw_summary="raw " * 2000, short_summary="short " * 500, changeset_summary=""
+    )
+    pr_description = PRDescription.model_construct(
+        title="Synthetic change", description="description " * 200
+    )
+    return lambda: prompts.render_review_file_diff(file, ai_summary, pr_description)
+
+
+CASES: dict[str, Callable[[dict[str, int]], Callable[[], object]]] = {
+    "parse_hunks": bench_parse_hunks,
+    "hunk_write": bench_hunk_write,
+    "get_token_count": bench_get_token_count,
+    "parse_ai_review": bench_parse_ai_review,
+    "sanitize_response": bench_sanitize_response,
+    "path_filter_check": bench_path_filter,
+    "comments_within_range": bench_comments_within_range,
+    "render_review_file_diff": bench_render_review_file_diff,
+}
+
+
+def calibration() -> None:
+    # Fixed mix of what the hot paths do: string scanning, regex, dicts and small objects
+    text = "\n".join(
+        f"{index}: value_{index} = compute({index})" for index in range(2000)
+    )
+    regex = re.compile(r"^(\d+): ", re.MULTILINE)
+    counts: dict[str, int] = {}
+    for match in regex.finditer(text):
+        counts[match.group(1)] = counts.get(match.group(1), 0) + 1
+    sorted(text.split("\n"), key=len)
+
+
+@dataclass
+class Timing:
+    # Per call, medians of the rounds
+    us: float
+    calibration_us: float
+    relative: float
+
+
+def calls_per_round(fn: Callable[[], object]) -> int:
+    # Enough calls for a round to last MIN_ROUND_S
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_ROUND_S:
+            return calls
+        calls *= 2 if elapsed == 0 else max(2, min(10, int(MIN_ROUND_S / elapsed) + 1))
+
+
+def round_time(fn: Callable[[], object], calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def measure(fn: Callable[[], object]) -> Timing:
+    # Rounds of the case alternate with rounds of the calibration, each case round is timed
+    # against the mean of the two around it: a change of CPU speed during the run (frequency
+    # scaling, noisy neighbours) affects both. The median of these ratios is kept, the best
+    # round of each alone moves with whichever round had the machine to itself. No
+    # collection during the rounds (as timeit), it would land in whichever round comes next.
+    calls = calls_per_round(fn)
+    calibration_calls = calls_per_round(calibration)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        times, calibration_times, ratios = [], [], []
+        previous = round_time(calibration, calibration_calls)
+        for _ in range(ROUNDS):
+            case_time = round_time(fn, calls)
+            current = round_time(calibration, calibration_calls)
+            times.append(case_time)
+            calibration_times.append(current)
+            ratios.append(case_time / ((previous + current) / 2))
+            previous = current
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return Timing(
+        statistics.median(times) * 1e6,
+        statistics.median(calibration_times) * 1e6,
+        statistics.median(ratios),
+    )
+
+
+def load_baselines() -> dict:
+    if not BASELINES_PATH.exists():
+        return {"cases": {}}
+    return json.loads(BASELINES_PATH.read_text())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--size", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--case", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.3,
+        help="allowed slowdown against the baseline, 0.3 is 30%%",
+    )
+    parser.add_argument("--save", action="store_true", help="update the baselines")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    print(
+        f"{'case':<26}{'size':<10}{'us/call':>12}{'relative':>10}{'baseline':>10}"
+        f"{'change':>9}"
+    )
+
+    results: dict[str, float] = {}
+    regressions = []
+    missing: dict[str, str] = {}
+    for case in args.case:
+        for size in args.size:
+            key = f"{case}[{size}]"
+            try:
+                fn = CASES[case](SIZES[size])
+            except Exception as e:
+                reason = str(e).splitlines()[0][:80] if str(e) else type(e).__name__
+                print(f"{case:<26}{size:<10}  can't run: {reason}")
+                missing[key] = reason
+                continue
+            timing = measure(fn)
+            results[key] = timing.relative
+            row = f"{case:<26}{size:<10}{timing.us:>12.1f}{timing.relative:>10.4g}"
+            baseline = baselines["cases"].get(key)
+            if baseline is None:
+                print(f"{row}{'-':>10}{'new':>9}")
+                continue
+            change = timing.relative / baseline - 1
+            if timing.us < MIN_GATED_US:
+                print(f"{row}{baseline:>10.4g}{change:>+9.0%}  (not gated)")
+                continue
+            print(f"{row}{baseline:>10.4g}{change:>+9.0%}")
+            if change > args.tolerance:
+                regressions.append(f"{key}: {change:+.0%}")
+
+    if args.save:
+        # Cases that didn't run (e.g. no tokenizer vocabulary) keep their baseline
+        cases = {**baselines["cases"], **results}
+        BASELINES_PATH.parent.mkdir(parents=True, exist_ok=True)
+        BASELINES_PATH.write_text(
+            json.dumps(
+                {
+                    "python": f"{platform.python_implementation()} "
+                    f"{platform.python_version()}",
+                    "cases": {
+                        key: float(f"{value:.4g}")
+                        for key, value in sorted(cases.items())
+                    },
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+        print(f"Baselines written to {BASELINES_PATH}")
+        return
+
+    for regression in regressions:
+        print(f"FAIL: {regression} (tolerance {args.tolerance:+.0%})")
+    # A case with a baseline that can't run is not a pass
+    not_run = [key for key in missing if key in baselines["cases"]]
+    for key, reason in missing.items():
+        print(f"{'FAIL' if key in not_run else 'WARNING'}: {key} did not run: {reason}")
+    if regressions or not_run:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
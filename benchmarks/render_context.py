@@ -0,0 +1,175 @@
+"""
+Allocation of the prompt render path on a large file: the merged model_dump() dicts the
+prompts were rendered from before RenderContext (the same calls, on the current models)
+against RenderContext. Each path renders once before it is measured, so caches filled on
+first use (token counts of the patches, field names of the models) are not counted.
+
+    python -m benchmarks.render_context [--lines 20000] [--renders 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+import tracemalloc
+from typing import Any, Callable
+
+os.environ.setdefault("GITHUB_REPOSITORY", "Stellantis-ADX/pr-reviewer-ai")
+os.environ.setdefault("GITHUB_API_URL", "https://api.github.com")
+os.environ.setdefault("GITHUB_EVENT_NAME", "pull_request")
+os.environ.setdefault(
+    "GITHUB_EVENT_PATH", "test/github_event_path_mock_pull_request.json"
+)
+# Nothing is requested from GitHub, the client only needs a token to be built
+os.environ.setdefault("GITHUB_TOKEN", "benchmark")
+
+from core.schemas.files import AiSummary, FileContent, FilteredFile
+from core.schemas.patch import Patch, Patches, parse_hunks
+from core.schemas.pr_common import PRDescription
+from core.schemas.render_context import RenderContext
+from core.templates.prompts import REVIEW_FILE_DIFF, SUMMARIZE_FILE_DIFF
+
+
+def make_file(lines: int) -> FilteredFile:
+    hunk_size = 40
+    hunks = []
+    for start in range(1, lines, hunk_size):
+        body = "\n".join(
+            f"{'+' if index % 3 else ' '}    value_{start + index} = compute({index})"
+            for index in range(hunk_size)
+        )
+        hunks.append(f"@@ -{start},{hunk_size} +{start},{hunk_size} @@\n{body}")
+    patch = "\n".join(hunks)
+    patches = Patches(items=[Patch.from_hunk(hunk) for hunk in parse_hunks(patch)])
+    patches.items_str = "\n".join(str(item) for item in patches.items)
+    return FilteredFile(
+        filename="generated/big_module.py",
+        file_content=FileContent("generated/big_module.py", ref="base"),
+        file_diff=patch,
+        patches=patches,
+    )
+
+
+def model_dump_replacements(
+    file: FilteredFile, ai_summary: AiSummary, pr_description: PRDescription
+) -> dict[str, Any]:
+    # Prompts.render_review_file_diff before RenderContext
+    return {
+        **file.model_dump(),
+        **file.patches.model_dump(by_alias=True),
+        **ai_summary.model_dump(),
+        **pr_description.model_dump(),
+    }
+
+
+def render_with_model_dump(
+    file: FilteredFile, ai_summary: AiSummary, pr_description: PRDescription
+) -> tuple[str, str]:
+    summarize = SUMMARIZE_FILE_DIFF.safe_substitute(file.model_dump())
+    review = REVIEW_FILE_DIFF.safe_substitute(
+        model_dump_replacements(file, ai_summary, pr_description)
+    )
+    return summarize, review
+
+
+def render_with_context(
+    file: FilteredFile, ai_summary: AiSummary, pr_description: PRDescription
+) -> tuple[str, str]:
+    summarize = SUMMARIZE_FILE_DIFF.safe_substitute(RenderContext(file))
+    review = REVIEW_FILE_DIFF.safe_substitute(
+        RenderContext(file, ai_summary, pr_description, patches=file.patches.items_str)
+    )
+    return summarize, review
+
+
+def replacements_with_model_dump(
+    file: FilteredFile, ai_summary: AiSummary, pr_description: PRDescription
+) -> list[str]:
+    replacements = model_dump_replacements(file, ai_summary, pr_description)
+    return [replacements[key] for key in REVIEW_FILE_DIFF.get_identifiers()]
+
+
+def replacements_with_context(
+    file: FilteredFile, ai_summary: AiSummary, pr_description: PRDescription
+) -> list[str]:
+    replacements = RenderContext(
+        file, ai_summary, pr_description, patches=file.patches.items_str
+    )
+    return [replacements[key] for key in REVIEW_FILE_DIFF.get_identifiers()]
+
+
+def measure(render: Callable[..., Any], renders: int, *args: Any) -> tuple[int, float]:
+    render(*args)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    for _ in range(renders):
+        # Keep only the last result, like a caller would
+        result = render(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--renders", type=int, default=50)
+    args = parser.parse_args()
+
+    file = make_file(args.lines)
+    ai_summary = AiSummary(
+        raw_summary="raw " * 2000, short_summary="short " * 500, changeset_summary=""
+    )
+    pr_description = PRDescription.model_construct(
+        title="Big generated change", description="description " * 200
+    )
+    assert render_with_model_dump(
+        file, ai_summary, pr_description
+    ) == render_with_context(file, ai_summary, pr_description)
+
+    print(
+        f"file diff: {len(file.file_diff) / 1024:.0f} KiB, "
+        f"packed patches: {len(file.patches.items_str) / 1024:.0f} KiB, "
+        f"renders: {args.renders}"
+    )
+    for label, candidates in (
+        (
+            "replacements only",
+            (
+                ("model_dump", replacements_with_model_dump),
+                ("render_context", replacements_with_context),
+            ),
+        ),
+        (
+            "full render",
+            (
+                ("model_dump", render_with_model_dump),
+                ("render_context", render_with_context),
+            ),
+        ),
+    ):
+        print(label)
+        results = []
+        for name, render in candidates:
+            peak, elapsed = measure(
+                render, args.renders, file, ai_summary, pr_description
+            )
+            results.append((peak, elapsed))
+            print(
+                f"{name:>15}: peak {peak / 1024:.1f} KiB, "
+                f"{elapsed / args.renders * 1_000_000:.1f} us per call"
+            )
+        (before_peak, before_elapsed), (after_peak, after_elapsed) = results
+        print(
+            f"{'change':>15}: peak {(after_peak - before_peak) / 1024:+.1f} KiB "
+            f"({after_peak / before_peak - 1:+.0%}), "
+            f"time {after_elapsed / before_elapsed - 1:+.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
+import time
 from abc import ABC, abstractmethod
 from typing import Optional
 
 from pydantic import BaseModel
 
+from core.bots.metrics import LLM_METRICS, LlmCall
 from core.schemas.limits import TokenLimits
 from core.schemas.options import Options
+from core.tokenizer import get_token_count
 
 SYSTEM_MESSAGE = (
     "{system_message} Knowledge cutoff: {knowledge_cut_off} "
@@ -44,6 +47,35 @@ class Bot(ABC):
         self.options = options
         self.model_options = model_options
 
+    def chat(self, message: str, stage: str = "") -> AiResponse:
+        # Every call ends up as one record in LLM_METRICS, stage is the caller's step
+        if not message:
+            return AiResponse()
+        call = LlmCall(stage=stage, model=self.model_options.model)
+        start = time.perf_counter()
+        try:
+            response = self._chat(message, call)
+            call.ok = bool(response.message)
+            return response
+        except Exception as e:
+            call.error = str(e)
+            raise
+        finally:
+            call.latency_s = time.perf_counter() - start
+            try:
+                # Counted here when the server doesn't report usage
+                if call.prompt_tokens is None:
+                    call.prompt_tokens = get_token_count(message)
+                if call.completion_tokens is None and call.ok:
+                    call.completion_tokens = get_token_count(response.message)
+            except Exception as e:
+                print(f"Failed to count tokens of the LLM call: {e}")
+            LLM_METRICS.record(call)
+
     @abstractmethod
-    def chat(self, message: str) -> AiResponse:
+    def _chat(self, message: str, call: LlmCall) -> AiResponse:
+        pass
+
+    def warm_up(self, background: bool = False) -> None:
+        # Ready once constructed, see LazyBot
         pass
@@ -1,16 +1,16 @@
-import json
 import time
 from typing import Optional
+from urllib.parse import urlparse
 
 import requests
 from github_action_utils import notice as info
-from huggingface_hub import InferenceClient
 
 from core.bots.bot import SYSTEM_MESSAGE, AiResponse, Bot, ModelOptions
+from core.bots.metrics import LlmCall
 from core.schemas.limits import TokenLimits
 from core.schemas.options import Options
 from core.tokenizer import get_token_count
-from core.utils import no_ssl_verification
+from core.utils import no_ssl_verification, service_url
 
 
 class HFOptions(ModelOptions):
@@ -38,11 +38,12 @@ def start_pr_reviewer(
     urls_available = {url: False for url in options.api_base_urls}
     with no_ssl_verification():
         for url in urls_available.keys():
+            base_url = service_url(url)
             url_state = (
-                f"https://{url}/cmd/state?application={hf_options.application_name}"
+                f"{base_url}/cmd/state?application={hf_options.application_name}"
             )
             url_start = (
-                f"https://{url}/cmd/start?application={hf_options.application_name}"
+                f"{base_url}/cmd/start?application={hf_options.application_name}"
             )
             print("url_state: ", url_state)
             try:
@@ -124,8 +125,7 @@ class HFBot(Bot):
         #         f"See frontend of applications here: https://{api_url} "
         #     )
 
-    def chat(self, message: str) -> AiResponse:
-        start = time.time()
+    def _chat(self, message: str, call: LlmCall) -> AiResponse:
         if not message:
             return AiResponse()
 
@@ -137,23 +137,27 @@ class HFBot(Bot):
             else self.api["heavy_model_port"]
         )
 
-        # It could contain port, so we need to remove it
-        inference_url = self.api["base_url"].split(":")[0]
+        # It could contain scheme and port, so we need to remove them
+        inference_url = urlparse(service_url(self.api["base_url"])).hostname
         inference_url = f"http://{inference_url}:{port}"
+        call.backend = "hf"
+        call.endpoint = inference_url
+        call.model = self.api["model_name"]
+        # huggingface_hub takes most of the startup time, skipped runs never chat
+        from huggingface_hub import InferenceClient
+
         self.client = InferenceClient(
             base_url=inference_url,
             timeout=180,
         )
-        print(f"Prompt: {get_token_count(message)} tokens")
-        print(f"System_message: {get_token_count(self.api['system_message'])} tokens")
-        max_tokens = (
-            self.api["max_model_tokens"]
-            - get_token_count(message)
-            - get_token_count(self.api["system_message"])
+        call.prompt_tokens = get_token_count(message) + get_token_count(
+            self.api["system_message"]
         )
+        max_tokens = self.api["max_model_tokens"] - call.prompt_tokens
 
         if self.api:
             for attempt in range(1, self.options.retries + 1):
+                call.retries = attempt - 1
                 try:
                     response = self.client.chat_completion(
                         model=self.api["model_name"],
@@ -191,21 +195,17 @@ class HFBot(Bot):
                         f"Failed to send message to {inference_url}: {e}, backtrace: {e}"
                     )
 
-            end = time.time()
-            info(f"response: {json.dumps(response)}")
-            info(f"AI sendMessage (including retries) response time: {end - start} ms")
+            if self.options.debug:
+                info(f"response: {response}")
         else:
             raise RuntimeError("Cannot chat, the AI API is not initialized")
 
         response_text = ""
         if response is not None:
             response_text = response.choices[0].message.content
+            call.set_usage(response)
         else:
             info("AI response is null")
-        info(
-            f"response_text: {response_text};\n "
-            f"response_text tokens: {get_token_count(response_text)}"
-        )
 
         if response_text.startswith("with "):
             response_text = response_text[5:]
@@ -214,6 +214,7 @@ class HFBot(Bot):
             info(
                 f"Using backup bot from Azure -> {self.back_up_bot.model_options.model}"
             )
-            return self.back_up_bot.chat(message)
+            call.prompt_tokens = call.completion_tokens = None
+            return self.back_up_bot._chat(message, call)
 
         return AiResponse(message=response_text)
@@ -3,11 +3,12 @@ import time
 from typing import Optional
 
 from github_action_utils import notice as info
-from mistralai.client import MistralClient
 
 from core.bots.bot import SYSTEM_MESSAGE, AiResponse, Bot, ModelOptions
+from core.bots.metrics import LlmCall
 from core.schemas.limits import TokenLimits
 from core.schemas.options import Options
+from core.utils import service_url
 
 
 class MistralOptions(ModelOptions):
@@ -45,8 +46,12 @@ class MistralBot(Bot):
                 "temperature": options.model_temperature,
                 "model": mistral_options.model,
             }
+            # mistralai is only imported when a backup bot is configured
+            from mistralai.client import MistralClient
+
+            self.endpoint = service_url(base_url)
             self.client = MistralClient(
-                endpoint=f"https://{base_url}", api_key=self.api["api_key"]
+                endpoint=self.endpoint, api_key=self.api["api_key"]
             )
             self.api = {
                 "system_message": system_message,
@@ -62,11 +67,13 @@ class MistralBot(Bot):
                 "Unable to initialize the Mistral API." "Please provide url and api_key"
             )
 
-    def chat(self, message: str) -> AiResponse:
-        start = time.time()
+    def _chat(self, message: str, call: LlmCall) -> AiResponse:
         if not message:
             return AiResponse()
 
+        call.backend = "azure"
+        call.endpoint = self.endpoint
+        call.model = self.model_options.model
         response = None
         try:
             response = self.client.chat(
@@ -85,18 +92,13 @@ class MistralBot(Bot):
         except Exception as e:
             info(f"Failed to send message to Mistral AI: {e}, backtrace: {e}")
 
-        end = time.time()
         # TODO check why it's not JSON serializable
         # info(f"response: {json.dumps(response)}")
 
-        info(
-            f"Mistral AI sendMessage (including retries) response time: {end - start} ms"
-        )
-
         response_text = ""
         if response is not None:
-            info(f"response: {response.choices[0].message.content}")
             response_text = response.choices[0].message.content
+            call.set_usage(response)
         else:
             info("Mistral AI response is null")
 
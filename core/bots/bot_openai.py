@@ -90,7 +90,7 @@ class OpenAiBot:
             end = time.time()
             info(f"response: {json.dumps(response)}")
             info(
-                f"OpenAI sendMessage (including retries) response time: {end - start} ms"
+                f"OpenAI sendMessage (including retries) response time: {end - start:.2f} s"
             )
         else:
             raise RuntimeError("The OpenAI API is not initialized")
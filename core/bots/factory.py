@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable
+
+from core.bots.bot import AiResponse, Bot, ModelOptions
+from core.bots.bot_hf import HFBot, HFOptions
+from core.bots.bot_mistral import MistralBot, MistralOptions
+from core.bots.metrics import LlmCall
+from core.schemas.limits import TokenLimits
+from core.schemas.options import Options
+from core.tracing import span
+
+
+class LazyBot(Bot):
+    """
+    Bot built on first chat() or warm_up(): building an HF bot waits for the model to be
+    online, which can take minutes, and runs that skip or only reply never need some bots.
+    A failed build is not retried, every chat() raises the same error.
+    """
+
+    def __init__(
+        self,
+        options: Options,
+        model_options: ModelOptions,
+        build: Callable[[], Bot],
+        name: str,
+    ):
+        super().__init__(options, model_options)
+        self.name = name
+        self._build = build
+        self._bot: Bot | None = None
+        self._error: Exception | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def bot(self) -> Bot:
+        with self._lock:
+            if self._bot is None and self._error is None:
+                try:
+                    with span("build bot", "llm", bot=self.name):
+                        self._bot = self._build()
+                except Exception as e:
+                    self._error = RuntimeError(f"failed to create {self.name} bot: {e}")
+            if self._error is not None:
+                raise self._error
+            return self._bot
+
+    def warm_up(self, background: bool = False) -> None:
+        if not background:
+            self.bot
+            return
+
+        def build() -> None:
+            try:
+                self.bot
+            except Exception as e:
+                print(f"Failed to warm up {self.name} bot: {e}")
+
+        threading.Thread(
+            target=build, name=f"{self.name}-bot-warm-up", daemon=True
+        ).start()
+
+    def chat(self, message: str, stage: str = "") -> AiResponse:
+        with span("chat", "llm", bot=self.name, stage=stage):
+            return super().chat(message, stage)
+
+    def _chat(self, message: str, call: LlmCall) -> AiResponse:
+        # The built bot fills the record of this call, no second one
+        return self.bot._chat(message, call)
+
+
+class BotFactory:
+    """
+    Lazy light (summaries) and heavy (reviews, replies) bots, each an HF bot with an
+    optional Mistral backup built only if the HF one ever fails to answer.
+    """
+
+    def __init__(self, options: Options):
+        self.options = options
+
+    def _mistral_bot(
+        self,
+        name: str,
+        model: str,
+        token_limits: TokenLimits,
+        token: str,
+        url_index: int,
+    ) -> LazyBot | None:
+        if not token:
+            return None
+        url = self.options.api_base_url_azure[url_index]
+        model_options = MistralOptions(model, token_limits)
+        return LazyBot(
+            self.options,
+            model_options,
+            lambda: MistralBot(
+                self.options, model_options, api_key=token, base_url=url
+            ),
+            name=f"{name} backup",
+        )
+
+    def _hf_bot(
+        self, name: str, model: str, token_limits: TokenLimits, back_up_bot: Bot | None
+    ) -> LazyBot:
+        model_options = HFOptions(model, token_limits)
+        return LazyBot(
+            self.options,
+            model_options,
+            lambda: HFBot(self.options, model_options, back_up_bot=back_up_bot),
+            name=name,
+        )
+
+    def light_bot(self) -> LazyBot:
+        options = self.options
+        return self._hf_bot(
+            f"summary ({options.light_model_name})",
+            options.light_model_name,
+            options.light_token_limits,
+            back_up_bot=self._mistral_bot(
+                "summary",
+                options.light_model_name_azure,
+                options.light_token_limits_azure,
+                options.light_model_token_azure,
+                url_index=0,
+            ),
+        )
+
+    def heavy_bot(self) -> LazyBot:
+        options = self.options
+        return self._hf_bot(
+            f"review ({options.heavy_model_name})",
+            options.heavy_model_name,
+            options.heavy_token_limits,
+            back_up_bot=self._mistral_bot(
+                "review",
+                options.heavy_model_name_azure,
+                options.heavy_token_limits_azure,
+                options.heavy_model_token_azure,
+                url_index=1,
+            ),
+        )
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Mapping
+
+METRICS_PATH_ENV = "PR_REVIEWER_LLM_METRICS_PATH"
+PROMETHEUS_PATH_ENV = "PR_REVIEWER_PROMETHEUS_PATH"
+PROMETHEUS_PREFIX = "pr_reviewer"
+
+
+@dataclass
+class LlmCall:
+    """
+    One Bot.chat() call, filled in by the bot that answered it: HF, or its Azure backup
+    when HF gave nothing back.
+    """
+
+    stage: str
+    model: str
+    backend: str = ""
+    endpoint: str = ""
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    # Including retries, backoff and the backup call
+    latency_s: float = 0.0
+    # Only known for streamed responses, none of the bots streams yet: see latency_s
+    time_to_first_token_s: float | None = None
+    retries: int = 0
+    ok: bool = False
+    error: str = ""
+    timestamp: float = field(default_factory=time.time)
+
+    def set_usage(self, response: Any) -> None:
+        # Token counts as reported by the server, when it does
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        if getattr(usage, "prompt_tokens", None) is not None:
+            self.prompt_tokens = usage.prompt_tokens
+        if getattr(usage, "completion_tokens", None) is not None:
+            self.completion_tokens = usage.completion_tokens
+
+    def __str__(self) -> str:
+        return (
+            f"stage={self.stage or '-'} backend={self.backend or '-'} model={self.model} "
+            f"tokens={self.prompt_tokens}+{self.completion_tokens} "
+            f"latency={self.latency_s:.2f} s retries={self.retries} ok={self.ok}"
+        )
+
+
+@dataclass
+class StageMetrics:
+    calls: int = 0
+    failures: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_s: float = 0.0
+    max_latency_s: float = 0.0
+
+    def add(self, call: LlmCall) -> None:
+        self.calls += 1
+        self.failures += not call.ok
+        self.retries += call.retries
+        self.prompt_tokens += call.prompt_tokens or 0
+        self.completion_tokens += call.completion_tokens or 0
+        self.latency_s += call.latency_s
+        self.max_latency_s = max(self.max_latency_s, call.latency_s)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.calls} calls ({self.failures} failed, {self.retries} retries), "
+            f"{self.prompt_tokens}+{self.completion_tokens} tokens, "
+            f"{self.latency_s:.1f} s (max {self.max_latency_s:.1f} s)"
+        )
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LlmMetrics:
+    """
+    Records of the LLM calls of a run. Each call is appended to a JSONL file as soon as it
+    ends (PR_REVIEWER_LLM_METRICS_PATH, or the runner temp dir), the aggregate per stage and
+    backend is logged by export() along with the optional Prometheus textfile.
+    """
+
+    def __init__(self):
+        self._calls: list[LlmCall] = []
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self) -> list[LlmCall]:
+        with self._lock:
+            return list(self._calls)
+
+    @staticmethod
+    def jsonl_path() -> str | None:
+        path = os.environ.get(METRICS_PATH_ENV)
+        if not path and os.environ.get("RUNNER_TEMP"):
+            path = os.path.join(
+                os.environ["RUNNER_TEMP"], "pr-reviewer-llm-calls.jsonl"
+            )
+        return path
+
+    def record(self, call: LlmCall) -> None:
+        print(f"LLM call: {call}")
+        path = self.jsonl_path()
+        with self._lock:
+            self._calls.append(call)
+            if not path:
+                return
+            try:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a") as f:
+                    f.write(json.dumps(asdict(call)) + "\n")
+            except Exception as e:
+                print(f"Failed to write LLM call metrics to {path}: {e}")
+
+    def summary(self) -> dict[tuple[str, str], StageMetrics]:
+        stages: dict[tuple[str, str], StageMetrics] = defaultdict(StageMetrics)
+        for call in self.calls:
+            stages[(call.stage, call.backend)].add(call)
+        return dict(stages)
+
+    def prometheus(self, extra: Mapping[str, float] | None = None) -> str:
+        metrics = [
+            ("llm_calls_total", "counter", "LLM calls", "calls"),
+            ("llm_failures_total", "counter", "LLM calls without answer", "failures"),
+            ("llm_retries_total", "counter", "LLM call retries", "retries"),
+            ("llm_prompt_tokens_total", "counter", "Prompt tokens", "prompt_tokens"),
+            (
+                "llm_completion_tokens_total",
+                "counter",
+                "Completion tokens",
+                "completion_tokens",
+            ),
+            (
+                "llm_latency_seconds_sum",
+                "counter",
+                "LLM call wall time",
+                "latency_s",
+            ),
+            (
+                "llm_latency_seconds_max",
+                "gauge",
+                "Longest LLM call",
+                "max_latency_s",
+            ),
+        ]
+        summary = self.summary()
+        lines = []
+        for name, kind, description, attribute in metrics:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for (stage, backend), stage_metrics in summary.items():
+                lines.append(
+                    f'{PROMETHEUS_PREFIX}_{name}{{stage="{_escape_label(stage)}",'
+                    f'backend="{_escape_label(backend)}"}} '
+                    f"{getattr(stage_metrics, attribute)}"
+                )
+        for name, value in (extra or {}).items():
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            lines.append(f"{PROMETHEUS_PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, extra: Mapping[str, float] | None = None) -> None:
+        for (stage, backend), stage_metrics in sorted(self.summary().items()):
+            print(f"LLM {stage or '-'} ({backend or '-'}): {stage_metrics}")
+        prometheus_path = os.environ.get(PROMETHEUS_PATH_ENV)
+        if not prometheus_path:
+            return
+        try:
+            # Renamed into place, the textfile collector never reads a partial file
+            Path(prometheus_path).parent.mkdir(parents=True, exist_ok=True)
+            temp_path = f"{prometheus_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(self.prometheus(extra))
+            os.replace(temp_path, prometheus_path)
+            print(f"Prometheus metrics written to {prometheus_path}")
+        except Exception as e:
+            print(f"Failed to write Prometheus metrics to {prometheus_path}: {e}")
+
+
+LLM_METRICS = LlmMetrics()
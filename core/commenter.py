@@ -4,15 +4,22 @@ from enum import Enum
 from typing import TYPE_CHECKING, Optional
 
 from box import Box
-from github import Issue
+from github import GithubException, Issue
 from github.Commit import Commit
 from github.IssueComment import IssueComment
+from github.PullRequest import PullRequest
 from github.PullRequestComment import PullRequestComment
+from github.PullRequestReview import PullRequestReview
 from github_action_utils import notice as info
 from github_action_utils import warning
 
 from core.consts import DISMISSAL_MESSAGE
-from core.github import GITHUB_CONTEXT, REPO
+from core.github import GITHUB_HANDLES, GITHUB_SCHEDULER
+from core.github.bulk import BulkMutationExecutor, BulkOperation
+from core.github.cache import MemoizedLoader
+from core.github.comment_index import CommentIndex
+from core.github.scheduler import Priority, RateLimitExhausted
+from core.schemas.pr_snapshot import get_pr_snapshot
 from core.utils import from_box_comment_to_review_comment
 
 if TYPE_CHECKING:  # a hack to avoid circular imports, when we ONLY want to type hint
@@ -23,6 +30,15 @@ from core.schemas.comment_chains import CommentChain, CommentChains
 from core.templates.tags import TAGS
 
 
+def _is_validation_error(error: Exception) -> bool:
+    # GitHub answers 422 to a review with a comment it can't place on the diff
+    return isinstance(error, GithubException) and error.status == 422
+
+
+class _BisectAborted(Exception):
+    pass
+
+
 class CommentMode(str, Enum):
     CREATE = "create"
     REPLACE = "replace"
@@ -30,9 +46,10 @@ class CommentMode(str, Enum):
 
 class GithubCommentManager:
 
-    def __init__(self):
-        self.issue_comments_cache = {}
-        self.review_comments_cache = {}
+    def __init__(self, github_concurrency_limit: int = 6):
+        self.bulk = BulkMutationExecutor(max_workers=github_concurrency_limit)
+        # Shared between worker threads, one listing per PR whatever the number of callers
+        self.issue_comments_cache = MemoizedLoader()
 
     def comment(
         self,
@@ -55,13 +72,17 @@ class GithubCommentManager:
             self.replace(comment_body, tag, pr_number)
 
     def dismiss_review_and_remove_comments(self, pull_number: int):
-        pr = REPO.get_pull(pull_number)
-        # TODO try to find out if commit was resolved. Couldn't be done with the current API Rest,
-        # Only with GraphQL API
+        # Housekeeping, it must never keep the summary and the review from being posted
+        try:
+            self._dismiss_review_and_remove_comments(pull_number)
+        except RateLimitExhausted as e:
+            print(f"Skipped dismissing the previous review: {e}")
+
+    def _dismiss_review_and_remove_comments(self, pull_number: int):
         pull_request_review = sorted(
             [
                 review
-                for review in pr.get_reviews()
+                for review in GITHUB_HANDLES.get_reviews(pull_number)
                 if review.user.type == "Bot"
                 and review.body
                 and review.body != DISMISSAL_MESSAGE
@@ -74,55 +95,46 @@ class GithubCommentManager:
             return
 
         last_pull_request_review = pull_request_review[-1]
-        review_comments = [
-            review_comment for review_comment in pr.get_review_comments()
+        # Threads started by the last review, the ones someone replied to are kept
+        review_threads_to_remove = [
+            thread
+            for thread in GITHUB_HANDLES.get_review_threads(pull_number)
+            if thread.top_level_comment.pull_request_review_id
+            == last_pull_request_review.id
+            and not thread.replies
         ]
-        review_comments_wrt_pull_request_review = [
-            review_comment
-            for review_comment in review_comments
-            if review_comment.pull_request_review_id == last_pull_request_review.id
-        ]
-        review_comments_wrt_pull_request_review_ids = [
-            review_comment.id
-            for review_comment in review_comments_wrt_pull_request_review
-        ]
-
-        ids_to_keep = set()
-        for review_comment in review_comments:
-            if (
-                review_comment.in_reply_to_id
-                in review_comments_wrt_pull_request_review_ids
-            ):
-                ids_to_keep.add(review_comment.id)
-                ids_to_keep.add(review_comment.in_reply_to_id)
 
-        try:
-            # we cannot delete review
-            # so let's change it to dismissed
-            last_pull_request_review.edit(body=DISMISSAL_MESSAGE)
-            info(
-                f"Dismiss review for PR #{pull_number} id: {last_pull_request_review.id}"
+        # we cannot delete review
+        # so let's change it to dismissed
+        operations = [
+            BulkOperation(
+                description=f"dismiss review {last_pull_request_review.id}",
+                run=lambda: last_pull_request_review.edit(body=DISMISSAL_MESSAGE),
             )
-        except Exception as e:
-            print(f"Failed to dismiss review: {e}")
-
-        try:
-            # delete comments
-            for review_comment in review_comments_wrt_pull_request_review:
-                if review_comment.id not in ids_to_keep:
-                    review_comment.delete()
-                    info(
-                        f"Deleting review comment for PR #{pull_number} id: {review_comment.id}"
-                    )
-        except Exception as e:
-            print(f"Failed to delete review comments: {e}")
+        ]
+        operations.extend(
+            BulkOperation(
+                description=f"delete review comment {thread.top_level_comment.id}",
+                run=thread.top_level_comment.delete,
+                missing_is_done=True,
+            )
+            for thread in review_threads_to_remove
+        )
+        summary = self.bulk.run(operations)
+        GITHUB_HANDLES.invalidate_reviews(pull_number)
+        GITHUB_HANDLES.invalidate_review_threads(pull_number)
+        info(
+            f"Dismiss review for PR #{pull_number} id: {last_pull_request_review.id}, "
+            f"removed review comments: {summary}"
+        )
+        if summary.failed:
+            print(f"Failed to dismiss review or delete comments: {summary.failed}")
 
         return
 
     def delete_pending_review(self, pull_number: int):
         try:
-            pull_request = REPO.get_pull(pull_number)
-            reviews = pull_request.get_reviews()
+            reviews = GITHUB_HANDLES.get_reviews(pull_number)
             # TODO check if we even need check PENDING
             pending_review = next(
                 (review for review in reviews if review.state == "PENDING"), None
@@ -133,6 +145,7 @@ class GithubCommentManager:
                 )
                 try:
                     pending_review.delete()
+                    GITHUB_HANDLES.invalidate_reviews(pull_number)
                 except Exception as e:
                     warning(f"Failed to delete pending review: {e}")
         except Exception as e:
@@ -156,12 +169,15 @@ class GithubCommentManager:
             )
             if allow_empty_review:
                 try:
-                    pull_request = REPO.get_pull(pull_number)
-                    pull_request.create_review(body=body, event="COMMENT")
+                    with GITHUB_SCHEDULER.priority(Priority.HIGH):
+                        pull_request = GITHUB_HANDLES.get_pull(pull_number)
+                        pull_request.create_review(body=body, event="COMMENT")
+                    GITHUB_HANDLES.invalidate_reviews(pull_number)
                 except Exception as e:
                     warning(f"Failed to submit empty review: {e}")
             return
 
+        comments_to_delete = {}
         for review_comment in review_summary.buffer:
             comments = self.get_comments_at_range(
                 pull_number,
@@ -170,19 +186,41 @@ class GithubCommentManager:
                 review_comment.end_line,
             )
             for comment in comments:
-                if TAGS.COMMENT_TAG in comment.body:
+                if (
+                    TAGS.COMMENT_TAG in comment.body
+                    and comment.id not in comments_to_delete
+                ):
                     info(
                         f"Deleting review comment for "
                         f"{review_comment.path}:{review_comment.start_line}-{review_comment.end_line}: "
                         f"{review_comment.comment}"
                     )
-                    try:
-                        comment.delete()
-                    except Exception as e:
-                        warning(f"Failed to delete review comment: {e}")
+                    comments_to_delete[comment.id] = BulkOperation(
+                        description=f"delete review comment {comment.id}",
+                        run=comment.delete,
+                        missing_is_done=True,
+                    )
+
+        if comments_to_delete:
+            with GITHUB_SCHEDULER.priority(Priority.LOW):
+                summary = self.bulk.run(list(comments_to_delete.values()))
+            GITHUB_HANDLES.invalidate_review_threads(pull_number)
+            info(f"Removed outdated review comments: {summary}")
+            if summary.failed:
+                warning(f"Failed to delete review comments: {summary.failed}")
+
+        with GITHUB_SCHEDULER.priority(Priority.HIGH):
+            self._create_review(pull_number, commit, body, review_summary)
 
+    def _create_review(
+        self,
+        pull_number: int,
+        commit: Commit,
+        body: str,
+        review_summary: ReviewSummary,
+    ):
         try:
-            pull_request = REPO.get_pull(pull_number)
+            pull_request = GITHUB_HANDLES.get_pull(pull_number)
             review = pull_request.create_review(
                 body=body,
                 commit=commit,
@@ -191,6 +229,8 @@ class GithubCommentManager:
                     comment.generate_comment_data() for comment in review_summary.buffer
                 ],
             )
+            GITHUB_HANDLES.invalidate_reviews(pull_number)
+            GITHUB_HANDLES.invalidate_review_threads(pull_number)
 
             info(
                 f"Submitting review for PR #{pull_number}, "
@@ -198,33 +238,154 @@ class GithubCommentManager:
             )
 
         except Exception as e:
-            warning(
-                f"Failed to create review: {e}. Falling back to individual comments."
-            )
+            GITHUB_HANDLES.invalidate_reviews(pull_number)
             self.delete_pending_review(pull_number)
-            comment_counter = 0
-            for review_comment in review_summary.buffer:
-                info(
-                    f"Creating new review comment for "
-                    f"{review_comment.path}:{review_comment.start_line}-{review_comment.end_line}:"
-                    f" {review_comment.comment}"
+            if _is_validation_error(e):
+                warning(
+                    f"Failed to create review: {e}. Looking for the comments GitHub rejects."
+                )
+                self._create_review_without_invalid_comments(
+                    pull_number, commit, body, review_summary
+                )
+            else:
+                # Bisecting wouldn't help, it's not about the comments
+                warning(
+                    f"Failed to create review: {e}. Posting the comments one by one."
+                )
+                self._create_review_comments(
+                    GITHUB_HANDLES.get_pull(pull_number),
+                    commit,
+                    [
+                        comment.generate_comment_data()
+                        for comment in review_summary.buffer
+                    ],
                 )
-                comment_data = review_comment.generate_comment_data()
+            GITHUB_HANDLES.invalidate_reviews(pull_number)
+            GITHUB_HANDLES.invalidate_review_threads(pull_number)
 
-                try:
-                    pull_request = REPO.get_pull(pull_number)
-                    # TODO explore create_review_comment it could set as suggestion
-                    pull_request.create_comment(
-                        body=comment_data["body"],
-                        commit=commit,
-                        path=comment_data["path"],
-                        position=comment_data["line"],
-                    )
-                except Exception as ee:
-                    warning(f"Failed to create review comment: {ee}")
+    def _create_review_without_invalid_comments(
+        self,
+        pull_number: int,
+        commit: Commit,
+        body: str,
+        review_summary: ReviewSummary,
+    ):
+        # Cached handle, it doesn't cost a request per comment
+        pull_request = GITHUB_HANDLES.get_pull(pull_number)
+        comments = [
+            comment.generate_comment_data() for comment in review_summary.buffer
+        ]
+        middle = len(comments) // 2
+        try:
+            # The whole batch already failed, start with its halves
+            invalid_comments = self._find_invalid_comments(
+                pull_request, commit, comments[:middle]
+            ) + self._find_invalid_comments(pull_request, commit, comments[middle:])
+        except _BisectAborted as e:
+            warning(f"Stopped looking for the rejected comments: {e}")
+            self.delete_pending_review(pull_number)
+            self._create_review_comments(pull_request, commit, comments)
+            return
+        valid_comments = [
+            comment for comment in comments if comment not in invalid_comments
+        ]
 
-                comment_counter += 1
-                info(f"Comment {comment_counter}/{len(review_summary.buffer)} posted")
+        try:
+            review = pull_request.create_review(
+                body=body, commit=commit, event="COMMENT", comments=valid_comments
+            )
+            info(
+                f"Submitting review for PR #{pull_number}, "
+                f"total comments: {len(valid_comments)}, review id: {review.id}, "
+                f"rejected comments: {len(invalid_comments)}"
+            )
+        except Exception as e:
+            warning(f"Failed to create review without the rejected comments: {e}")
+            self.delete_pending_review(pull_number)
+            # Nothing was posted, let's try them all one by one
+            invalid_comments = comments
+
+        self._create_review_comments(pull_request, commit, invalid_comments)
+
+    def _create_review_comments(
+        self, pull_request: PullRequest, commit: Commit, comments: list[dict]
+    ):
+        if not comments:
+            return
+
+        for comment_data in comments:
+            info(
+                f"Creating new review comment for "
+                f"{comment_data['path']}:{comment_data.get('start_line', comment_data['line'])}"
+                f"-{comment_data['line']}: {comment_data['body']}"
+            )
+
+        def create_comment(comment_data: dict) -> None:
+            # Lines of the file as in a review, position would be an offset in the diff
+            lines = {"line": comment_data["line"], "side": "RIGHT"}
+            if "start_line" in comment_data:
+                lines["start_line"] = comment_data["start_line"]
+                lines["start_side"] = comment_data.get("start_side", "RIGHT")
+            pull_request.create_review_comment(
+                body=comment_data["body"],
+                commit=commit,
+                path=comment_data["path"],
+                **lines,
+            )
+
+        # Creating a comment twice would duplicate it, no retries here
+        summary = BulkMutationExecutor(self.bulk.max_workers, retries=0).run(
+            [
+                BulkOperation(
+                    description=f"create review comment for {comment_data['path']}:{comment_data['line']}",
+                    run=lambda comment_data=comment_data: create_comment(comment_data),
+                )
+                for comment_data in comments
+            ]
+        )
+        info(f"Individual review comments: {summary}")
+
+    @staticmethod
+    def _create_pending_review(
+        pull_request: PullRequest, commit: Commit, comments: list[dict]
+    ) -> PullRequestReview:
+        # Without an event the review stays pending, PullRequest.create_review always sends
+        # one (COMMENT by default) and would publish the probe
+        headers, data = pull_request.requester.requestJsonAndCheck(
+            "POST",
+            f"{pull_request.url}/reviews",
+            input={"commit_id": commit.sha, "comments": comments},
+        )
+        return PullRequestReview(pull_request.requester, headers, data, completed=True)
+
+    def _find_invalid_comments(
+        self, pull_request: PullRequest, commit: Commit, comments: list[dict]
+    ) -> list[dict]:
+        # Bisect a batch GitHub rejects (e.g. a line outside of the diff) down to the faulty comments,
+        # probing with pending reviews which are deleted right away
+        if not comments:
+            return []
+        try:
+            pending_review = self._create_pending_review(pull_request, commit, comments)
+        except Exception as e:
+            # A pending review left behind is rejected with a 422 too, whatever the comments
+            if not _is_validation_error(e) or "pending review" in str(e.data):
+                raise _BisectAborted(f"probe failed: {e}") from e
+            if len(comments) == 1:
+                return comments
+            middle = len(comments) // 2
+            return self._find_invalid_comments(
+                pull_request, commit, comments[:middle]
+            ) + self._find_invalid_comments(pull_request, commit, comments[middle:])
+
+        try:
+            pending_review.delete()
+        except Exception as e:
+            # A user has one pending review per PR, every later probe would be rejected
+            raise _BisectAborted(
+                f"failed to delete pending review {pending_review.id}: {e}"
+            ) from e
+        return []
 
     def review_comment_reply(
         self, pull_number: int, top_level_comment: PullRequestComment, message: str
@@ -232,12 +393,13 @@ class GithubCommentManager:
         reply = f"{TAGS.COMMENT_GREETING}\n\n{message}\n\n{TAGS.COMMENT_REPLY_TAG}\n"
         try:
             # Post the reply to the user comment
-            pull_request = REPO.get_pull(pull_number)
+            pull_request = GITHUB_HANDLES.get_pull(pull_number)
             pull_request.create_review_comment_reply(top_level_comment.id, reply)
+            GITHUB_HANDLES.invalidate_review_threads(pull_number)
         except Exception as error:
             warning(f"Failed to reply to the top-level comment {error}")
             try:
-                pull_request = REPO.get_pull(pull_number)
+                pull_request = GITHUB_HANDLES.get_pull(pull_number)
                 pull_request.create_review_comment_reply(
                     top_level_comment.id,
                     f"Could not post the reply to the top-level comment due to the following error: {error}",
@@ -258,47 +420,20 @@ class GithubCommentManager:
     def get_review_comments_within_range(
         self, pull_number: int, path: str, start_line: int, end_line: int
     ) -> list[PullRequestComment]:
-        comments = self.list_review_comments(pull_number)
-        return [
-            comment
-            for comment in comments
-            if comment.path == path
-            and comment.body != ""
-            and (
-                (
-                    comment.raw_data.get("start_line") is not None
-                    and comment.raw_data.get("start_line") >= start_line
-                    and comment.raw_data.get("line") <= end_line
-                )
-                or (start_line == end_line and comment.raw_data.get("line") == end_line)
-            )
-        ]
+        return self.get_comment_index(pull_number).within_range(
+            path, start_line, end_line
+        )
 
     def get_comments_at_range(
         self, pull_number: int, path: str, start_line: int, end_line: int
     ) -> list[PullRequestComment]:
-        comments = self.list_review_comments(pull_number)
-        return [
-            comment
-            for comment in comments
-            if comment.path == path
-            and comment.body != ""
-            and (
-                (
-                    comment.raw_data.get("start_line") is not None
-                    and comment.raw_data.get("start_line") == start_line
-                    and comment.raw_data.get("line") == end_line
-                )
-                or (start_line == end_line and comment.raw_data.get("line") == end_line)
-            )
-        ]
+        return self.get_comment_index(pull_number).at_range(path, start_line, end_line)
 
     def get_comment_chains_within_range(
         self, pull_number: int, path: str, start_line: int, end_line: int, tag: str = ""
     ) -> CommentChains:
-        existing_comments = self.get_review_comments_within_range(
-            pull_number, path, start_line, end_line
-        )
+        comment_index = self.get_comment_index(pull_number)
+        existing_comments = comment_index.within_range(path, start_line, end_line)
         top_level_comments = [
             comment for comment in existing_comments if not comment.in_reply_to_id
         ]
@@ -306,7 +441,7 @@ class GithubCommentManager:
         all_chains = []
 
         for top_level_comment in top_level_comments:
-            chain = self.compose_comment_chain(existing_comments, top_level_comment)
+            chain = self.compose_comment_chain(comment_index, top_level_comment)
             if chain and tag in chain:
                 all_chains.append(
                     CommentChain(
@@ -321,13 +456,12 @@ class GithubCommentManager:
 
     def compose_comment_chain(
         self,
-        review_comments: list[PullRequestComment],
+        comment_index: CommentIndex,
         top_level_comment: PullRequestComment,
     ) -> str:
         conversation_chain = [
             f"{cmt.user.login}: {cmt.body}"
-            for cmt in review_comments
-            if cmt.in_reply_to_id == top_level_comment.id
+            for cmt in comment_index.replies(top_level_comment.id)
         ]
         conversation_chain.insert(
             0, f"{top_level_comment.user.login}: {top_level_comment.body}"
@@ -338,26 +472,25 @@ class GithubCommentManager:
         self, pull_number: int, comment: Box
     ) -> tuple[str, PullRequestComment | None]:
         try:
-            review_comments = self.list_review_comments(pull_number)
-            print(f"Review comments: {review_comments}")
+            comment_index = self.get_comment_index(pull_number)
+            print(f"Review comments: {comment_index.comments}")
             print(f"Comment: {comment}")
-            comment = from_box_comment_to_review_comment(comment, review_comments)
-            top_level_comment = self.get_top_level_comment(review_comments, comment)
-            chain = self.compose_comment_chain(review_comments, top_level_comment)
+            comment = from_box_comment_to_review_comment(
+                comment, comment_index.comments
+            )
+            top_level_comment = self.get_top_level_comment(comment_index, comment)
+            chain = self.compose_comment_chain(comment_index, top_level_comment)
             return chain, top_level_comment
         except Exception as e:
             print(f"Failed to get conversation chain: {e}")
             return "", None
 
     def get_top_level_comment(
-        self, review_comments: list[PullRequestComment], comment: PullRequestComment
+        self, comment_index: CommentIndex, comment: PullRequestComment
     ) -> PullRequestComment:
         if comment.in_reply_to_id is not None:
-            # Find the parent comment in the review_comments list
-            parent_comment = next(
-                (cmt for cmt in review_comments if cmt.id == comment.in_reply_to_id),
-                None,
-            )
+            # Find the parent comment in the review comments
+            parent_comment = comment_index.by_id.get(comment.in_reply_to_id)
 
             # If the parent comment is found, return the parent comment
             if parent_comment:
@@ -366,32 +499,27 @@ class GithubCommentManager:
         # If the comment object does not have an in_reply_to_id attribute, return the comment object itself
         return comment
 
-    def list_review_comments(self, pull_number: int) -> list[PullRequestComment]:
-        # This only returns review comments (aka discussion comments) and not normal conversation comments
-        if pull_number in self.review_comments_cache:
-            return self.review_comments_cache[pull_number]
-
-        all_comments = []
+    def get_comment_index(self, pull_number: int) -> CommentIndex:
         try:
-            pull_request = REPO.get_pull(pull_number)
-            all_comments = [comment for comment in pull_request.get_comments()]
+            return GITHUB_HANDLES.get_comment_index(pull_number)
         except Exception as e:
             print(f"Failed to list review comments: {e}")
+            return CommentIndex([])
 
-        self.review_comments_cache[pull_number] = all_comments
-        return all_comments
+    def list_review_comments(self, pull_number: int) -> list[PullRequestComment]:
+        # This only returns review comments (aka discussion comments) and not normal conversation comments
+        return self.get_comment_index(pull_number).comments
 
     def create(self, comment_body: str, pr_number: int):
         try:
-            issue = REPO.get_issue(number=pr_number)
+            issue = GITHUB_HANDLES.get_issue(pr_number)
 
             comment = issue.create_comment(comment_body)
 
-            # Add comment to issueCommentsCache
-            if pr_number in self.issue_comments_cache:
-                self.issue_comments_cache[pr_number].append(comment)
-            else:
-                self.issue_comments_cache[pr_number] = [comment]
+            # Add comment to issueCommentsCache, only if it was already listed
+            self.issue_comments_cache.update(
+                pr_number, lambda comments: [*comments, comment]
+            )
         except Exception as e:
             print(f"Failed to create comment: {e}")
 
@@ -420,18 +548,19 @@ class GithubCommentManager:
 
     def list_issue_comments(self, pr_number: int) -> list[IssueComment]:
         # List issue comments
-        if pr_number in self.issue_comments_cache:
-            return self.issue_comments_cache[pr_number]
+        return self.issue_comments_cache.get(
+            pr_number, lambda: self._fetch_issue_comments(pr_number)
+        )
 
+    def _fetch_issue_comments(self, pr_number: int) -> list[IssueComment]:
         all_comments = []
         try:
-            issue: Issue = REPO.get_issue(number=pr_number)
+            issue: Issue = GITHUB_HANDLES.get_issue(pr_number)
             comments = [comment for comment in issue.get_comments()]
             all_comments.extend(comments)
         except Exception as e:
             print(f"Failed to list comments: {e}")
 
-        self.issue_comments_cache[pr_number] = all_comments
         return all_comments
 
     def get_reviewed_commit_ids_block(self, comment_body: str) -> str:
@@ -460,16 +589,12 @@ class GithubCommentManager:
         return ""
 
     def get_all_commit_ids(self) -> list[str]:
-        all_commits = []
         try:
-            pull = REPO.get_pull(GITHUB_CONTEXT.payload.pull_request.number)
-            # Get the commits from the pull request:
-            commits = pull.get_commits()
-            return [commit.sha for commit in commits]
+            return get_pr_snapshot().commit_ids
         except Exception as e:
             print(f"Failed to list commits: {e}")
 
-        return all_commits
+        return []
 
     def remove_in_progress_status(self, comment_body: str) -> str:
         # TODO it's not using use it! Maybe check for progress status in existing summarize comment
@@ -1,16 +1,12 @@
 import json
 import os
+from functools import cache
 from pathlib import Path
-
-from core.input_reader import read_yaml_file
+from typing import Any, Iterator, Mapping
 
 AVATAR_URL = "https://avatars.githubusercontent.com/u/124881756"
 ROOT_FOLDER = Path(__file__).resolve().parent.parent
-ACTION_INPUTS = (
-    {"inputs": json.loads(os.environ.get("INPUTS").strip("'"))}
-    if "GITHUB_ACTIONS" in os.environ
-    else read_yaml_file(str(ROOT_FOLDER.joinpath("action.yml")))
-)
+
 BOT_NAME = "@devtoolsai"
 BOT_NAME_NO_TAG = "Dev Tools AI"
 IGNORE_KEYWORD = f"{BOT_NAME}: ignore"
@@ -19,3 +15,27 @@ FEEDBACK_EMAIL = "devtools@stellantis.com"
 DISMISSAL_MESSAGE = (
     "🤖🙂 Review deleted, smiles undefeated! 🙂🤖 (option less_spammy ✅)"
 )
+
+
+@cache
+def load_action_inputs() -> dict[str, Any]:
+    if "GITHUB_ACTIONS" in os.environ:
+        return {"inputs": json.loads(os.environ.get("INPUTS").strip("'"))}
+    from core.input_reader import read_yaml_file
+
+    return read_yaml_file(str(ROOT_FOLDER.joinpath("action.yml")))
+
+
+class _ActionInputs(Mapping[str, Any]):
+    # Inputs are parsed on first read, not when core.consts is imported
+    def __getitem__(self, key: str) -> Any:
+        return load_action_inputs()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(load_action_inputs())
+
+    def __len__(self) -> int:
+        return len(load_action_inputs())
+
+
+ACTION_INPUTS: Mapping[str, Any] = _ActionInputs()
@@ -1,8 +1,47 @@
+from github.Commit import Commit
+from github.Repository import Repository
+
+from core.github.cache import GithubHandleCache
 from core.github.context import GithubActionContext
-from core.github.github import GITHUB_API
+from core.github.github import GITHUB_API, GITHUB_SCHEDULER
+
+
+def lazy_repo(full_name: str) -> Repository:
+    # Same as GITHUB_API.get_repo(full_name) without the request: every call made through
+    # the handle only needs its url, other attributes are fetched on first access
+    owner, name = full_name.split("/")
+    return Repository(
+        GITHUB_API.requester,
+        {},
+        {
+            "url": f"{GITHUB_API.requester.base_url}/repos/{full_name}",
+            "full_name": full_name,
+            "name": name,
+            "owner": {"login": owner},
+        },
+        completed=False,
+    )
+
 
 GITHUB_CONTEXT = GithubActionContext()
-REPO = GITHUB_API.get_repo(GITHUB_CONTEXT.full_name)
+REPO = lazy_repo(GITHUB_CONTEXT.full_name)
+GITHUB_HANDLES = GithubHandleCache(REPO)
+
+
+def lazy_commit(sha: str) -> Commit:
+    # Commit handle built without any request, it's enough to pass it as a review target
+    return Commit(
+        REPO.requester,
+        {},
+        {"sha": sha, "url": f"{REPO.url}/commits/{sha}"},
+        completed=False,
+    )
 
 
-__all__ = ["GITHUB_CONTEXT", "REPO"]
+__all__ = [
+    "GITHUB_CONTEXT",
+    "GITHUB_HANDLES",
+    "GITHUB_SCHEDULER",
+    "REPO",
+    "lazy_commit",
+]
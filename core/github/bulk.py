@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import concurrent.futures
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from github import GithubException
+
+from core.github.github import GITHUB_SCHEDULER
+from core.github.scheduler import RateLimitExhausted
+
+# Worth another try, the scheduler waits for the rate limit to reset before retrying
+RETRYABLE_STATUSES = (403, 429, 500, 502, 503, 504)
+
+
+@dataclass
+class BulkOperation:
+    description: str
+    run: Callable[[], Any]
+    # 404 on a delete means a previous attempt (or someone else) already did it
+    missing_is_done: bool = False
+
+
+@dataclass
+class BulkSummary:
+    done: list[str] = field(default_factory=list)
+    already_done: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return (
+            f"done: {len(self.done)}, already done: {len(self.already_done)}, "
+            f"failed: {len(self.failed)}"
+        )
+
+
+class BulkMutationExecutor:
+    """
+    Run independent GitHub mutations (deletes, edits) concurrently, at most max_workers at a time.
+    Every request still goes through the scheduler, so writes keep their pacing and priority.
+    Operations must be idempotent, failed ones are retried.
+    """
+
+    def __init__(self, max_workers: int, retries: int = 3, backoff: float = 1.0):
+        self.max_workers = max(1, max_workers)
+        self.retries = retries
+        self.backoff = backoff
+
+    def run(self, operations: list[BulkOperation]) -> BulkSummary:
+        summary = BulkSummary()
+        if not operations:
+            return summary
+
+        lock = threading.Lock()
+        # Priority is per thread, workers inherit the one of the caller
+        priority = GITHUB_SCHEDULER.current_priority
+
+        def worker(operation: BulkOperation) -> None:
+            with GITHUB_SCHEDULER.priority(priority):
+                outcome = self._run_with_retries(operation)
+            with lock:
+                getattr(summary, outcome).append(operation.description)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(operations))
+        ) as executor:
+            for future in concurrent.futures.as_completed(
+                [executor.submit(worker, operation) for operation in operations]
+            ):
+                future.result()
+
+        return summary
+
+    def _run_with_retries(self, operation: BulkOperation) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                operation.run()
+                return "done"
+            except RateLimitExhausted as e:
+                print(f"Skipped {operation.description}: {e}")
+                return "failed"
+            except GithubException as e:
+                if e.status == 404 and operation.missing_is_done:
+                    return "already_done"
+                if e.status not in RETRYABLE_STATUSES or attempt == self.retries:
+                    print(f"Failed to {operation.description}: {e}")
+                    return "failed"
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"Failed to {operation.description}: {e}")
+                    return "failed"
+            time.sleep(self.backoff * 2**attempt)
+        return "failed"
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Hashable, TypeVar
+
+from github.Issue import Issue
+from github.PullRequest import PullRequest
+from github.PullRequestReview import PullRequestReview
+from github.Repository import Repository
+
+from core.github.comment_index import CommentIndex
+from core.github.review_threads import (
+    ReviewThread,
+    fetch_review_threads,
+    fetch_review_threads_rest,
+)
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls: only the first caller for a key runs the loader,
+    the others wait for it and share its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, loader: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = loader()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result
+
+
+class MemoizedLoader:
+    """
+    Thread-safe memoization on top of SingleFlight: a value is loaded once per key and kept
+    until invalidated. Failed loads are not cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict[Hashable, Any] = {}
+        # Bumped on invalidation, so a load started before it is not stored afterward
+        self._generation = 0
+        self._flight = SingleFlight()
+
+    def get(self, key: Hashable, loader: Callable[[], T]) -> T:
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+
+        def load() -> T:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key]
+                generation = self._generation
+            value = loader()
+            with self._lock:
+                if generation == self._generation:
+                    self._values[key] = value
+            return value
+
+        return self._flight.do(key, load)
+
+    def peek(self, key: Hashable) -> Any | None:
+        with self._lock:
+            return self._values.get(key)
+
+    def update(self, key: Hashable, updater: Callable[[Any], Any]) -> None:
+        # Apply updater to the cached value under the lock, nothing happens if it's not cached
+        with self._lock:
+            if key in self._values:
+                self._values[key] = updater(self._values[key])
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+
+
+class GithubHandleCache:
+    """
+    Per-run cache of PR, issue and review handles. Concurrent lookups of the same handle
+    result in a single request. Call invalidate_* after writes that make a handle stale.
+    """
+
+    def __init__(self, repo: Repository):
+        self.repo = repo
+        self._handles = MemoizedLoader()
+
+    def get_pull(self, number: int) -> PullRequest:
+        return self._handles.get(("pull", number), lambda: self.repo.get_pull(number))
+
+    def get_issue(self, number: int) -> Issue:
+        return self._handles.get(
+            ("issue", number), lambda: self.repo.get_issue(number=number)
+        )
+
+    def get_reviews(self, number: int) -> list[PullRequestReview]:
+        return self._handles.get(
+            ("reviews", number),
+            lambda: [review for review in self.get_pull(number).get_reviews()],
+        )
+
+    def get_blob_sizes(self, ref: str) -> dict[str, int]:
+        # Size in bytes of every file at ref, from a single recursive tree listing. GitHub
+        # truncates it for very large trees, the files left out have no known size.
+        return self._handles.get(
+            ("blob_sizes", ref),
+            lambda: {
+                element.path: element.size
+                for element in self.repo.get_git_tree(ref, recursive=True).tree
+                if element.type == "blob"
+            },
+        )
+
+    def get_review_threads(self, number: int) -> list[ReviewThread]:
+        # Single source for review comments: chains, replies and stale comment cleanup
+        return self._handles.get(
+            ("review_threads", number), lambda: self._load_review_threads(number)
+        )
+
+    def _load_review_threads(self, number: int) -> list[ReviewThread]:
+        try:
+            return fetch_review_threads(self.repo, number)
+        except Exception as e:
+            print(f"Failed to fetch review threads with GraphQL, using REST: {e}")
+            return fetch_review_threads_rest(self.repo, number)
+
+    def get_comment_index(self, number: int) -> CommentIndex:
+        return self._handles.get(
+            ("comment_index", number),
+            lambda: CommentIndex(
+                [
+                    comment
+                    for thread in self.get_review_threads(number)
+                    for comment in thread.comments
+                ]
+            ),
+        )
+
+    def invalidate_pull(self, number: int) -> None:
+        self._handles.invalidate(("pull", number))
+
+    def invalidate_reviews(self, number: int) -> None:
+        self._handles.invalidate(("reviews", number))
+
+    def invalidate_review_threads(self, number: int) -> None:
+        self._handles.invalidate(("review_threads", number))
+        self._handles.invalidate(("comment_index", number))
+
+    def invalidate(self) -> None:
+        self._handles.invalidate()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import defaultdict
+
+from github.PullRequestComment import PullRequestComment
+
+
+class CommentIndex:
+    """
+    Index over the review comments of a PR, built once per comment list:
+
+    - per path, multi-line comments sorted by start_line, to find the ones inside a range
+    - per path and line, for single line ranges
+    - per (path, start_line, line), for exact ranges
+    - per top level comment id, its replies
+
+    Lookups return comments in the order of the original list and ignore empty bodies.
+    """
+
+    def __init__(self, comments: list[PullRequestComment]):
+        self.comments = comments
+        self.by_id: dict[int, PullRequestComment] = {}
+        self._position: dict[int, int] = {}
+        self._starts: dict[str, list[int]] = {}
+        self._ranges: dict[str, list[tuple[int, int, PullRequestComment]]] = {}
+        self._by_line: dict[tuple[str, int], list[PullRequestComment]] = defaultdict(
+            list
+        )
+        self._by_range: dict[tuple[str, int, int], list[PullRequestComment]] = (
+            defaultdict(list)
+        )
+        self._replies: dict[int, list[PullRequestComment]] = defaultdict(list)
+
+        ranges = defaultdict(list)
+        for position, comment in enumerate(comments):
+            self.by_id[comment.id] = comment
+            self._position[comment.id] = position
+            if comment.in_reply_to_id:
+                self._replies[comment.in_reply_to_id].append(comment)
+            if comment.body == "":
+                continue
+            start_line = comment.raw_data.get("start_line")
+            line = comment.raw_data.get("line")
+            if line is not None:
+                self._by_line[(comment.path, line)].append(comment)
+            if start_line is not None and line is not None:
+                ranges[comment.path].append((start_line, line, comment))
+                self._by_range[(comment.path, start_line, line)].append(comment)
+
+        for path, path_ranges in ranges.items():
+            path_ranges.sort(key=lambda item: (item[0], self._position[item[2].id]))
+            self._ranges[path] = path_ranges
+            self._starts[path] = [start_line for start_line, _, _ in path_ranges]
+
+    def _in_order(
+        self, comments: dict[int, PullRequestComment]
+    ) -> list[PullRequestComment]:
+        return sorted(comments.values(), key=lambda comment: self._position[comment.id])
+
+    def within_range(
+        self, path: str, start_line: int, end_line: int
+    ) -> list[PullRequestComment]:
+        # Multi-line comments contained in the range, or any comment on the line of a single line range
+        found = {}
+        path_ranges = self._ranges.get(path, [])
+        # line >= start_line, so once start_line is past end_line nothing else can fit
+        for index in range(
+            bisect_left(self._starts.get(path, []), start_line), len(path_ranges)
+        ):
+            comment_start_line, comment_line, comment = path_ranges[index]
+            if comment_start_line > end_line:
+                break
+            if comment_line <= end_line:
+                found[comment.id] = comment
+        if start_line == end_line:
+            for comment in self._by_line.get((path, end_line), []):
+                found[comment.id] = comment
+        return self._in_order(found)
+
+    def at_range(
+        self, path: str, start_line: int, end_line: int
+    ) -> list[PullRequestComment]:
+        found = {
+            comment.id: comment
+            for comment in self._by_range.get((path, start_line, end_line), [])
+        }
+        if start_line == end_line:
+            for comment in self._by_line.get((path, end_line), []):
+                found[comment.id] = comment
+        return self._in_order(found)
+
+    def replies(self, comment_id: int) -> list[PullRequestComment]:
+        return self._replies.get(comment_id, [])
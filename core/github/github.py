@@ -2,9 +2,24 @@ import os
 
 import github
 
+from core.github.http_cache import HttpCache
+from core.github.scheduler import RequestScheduler
+from core.github.transport import install_transport
+
+# Conditional requests (ETag / Last-Modified) answered with 304 don't count against the rate limit
+HTTP_CACHE = HttpCache.from_env()
+# All requests go through the scheduler, it replaces PyGithub's own pacing between requests
+GITHUB_SCHEDULER = RequestScheduler()
+install_transport(HTTP_CACHE, GITHUB_SCHEDULER)
+
 # Get the GitHub token from environment variables or input
 token = os.getenv("GITHUB_TOKEN")
-GITHUB_API = github.Github(token, base_url=os.getenv("GITHUB_API_URL"))
+GITHUB_API = github.Github(
+    token,
+    base_url=os.getenv("GITHUB_API_URL"),
+    seconds_between_requests=None,
+    seconds_between_writes=None,
+)
 
 # Disable debug logging
 # github.enable_console_debug_logging()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+HTTP_CACHE_DIR_ENV = "PR_REVIEWER_HTTP_CACHE_DIR"
+HTTP_CACHE_MAX_MB_ENV = "PR_REVIEWER_HTTP_CACHE_MAX_MB"
+DEFAULT_HTTP_CACHE_DIR = Path.home() / ".cache" / "pr-reviewer-ai" / "http"
+DEFAULT_HTTP_CACHE_MAX_MB = 64
+
+
+@dataclass
+class HttpCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stored: int = 0
+    evicted: int = 0
+    # Requests answered with 304 are not counted against the primary rate limit
+    rate_limit_saved: int = 0
+
+    def __str__(self) -> str:
+        return ", ".join(f"{key}: {value}" for key, value in asdict(self).items())
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    status: int
+    headers: dict[str, str]
+    body: str
+    etag: str | None = None
+    last_modified: str | None = None
+
+    @property
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    On-disk cache of GitHub GET responses validated with ETag / Last-Modified.
+    One json file per URL, least recently used entries are evicted
+    once the cache grows over max_bytes.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.stats = HttpCacheStats()
+        self._lock = threading.Lock()
+        # key -> (size, last use), loaded lazily from the directory
+        self._index: dict[str, tuple[int, float]] | None = None
+        self._total_bytes = 0
+
+    @classmethod
+    def from_env(cls) -> HttpCache | None:
+        max_mb = int(os.environ.get(HTTP_CACHE_MAX_MB_ENV, DEFAULT_HTTP_CACHE_MAX_MB))
+        if max_mb <= 0:
+            return None
+        directory = os.environ.get(HTTP_CACHE_DIR_ENV) or DEFAULT_HTTP_CACHE_DIR
+        return cls(directory, max_bytes=max_mb * 1024 * 1024)
+
+    @staticmethod
+    def key(url: str, headers: dict[str, str]) -> str:
+        # The token is not part of the key: it changes on every run, and GitHub still checks it
+        # when validating the conditional request, so a 304 is never returned to a token without access
+        accept = headers.get("Accept", "")
+        return hashlib.sha256(f"{accept}\n{url}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load_index(self) -> dict[str, tuple[int, float]]:
+        if self._index is None:
+            self._index = {}
+            self._total_bytes = 0
+            if self.directory.exists():
+                for path in self.directory.glob("*.json"):
+                    stat = path.stat()
+                    self._index[path.stem] = (stat.st_size, stat.st_mtime)
+                    self._total_bytes += stat.st_size
+        return self._index
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                return None
+            try:
+                data = json.loads(self._path(key).read_text())
+            except (OSError, ValueError):
+                self._forget(key)
+                return None
+            index[key] = (index[key][0], time.time())
+            # Keep the recency on disk too, it's used for eviction in the next runs
+            try:
+                os.utime(self._path(key))
+            except OSError:
+                pass
+        return CachedResponse(**data)
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        data = json.dumps(asdict(response)).encode()
+        with self._lock:
+            index = self._load_index()
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = self._path(key).with_suffix(f".{threading.get_ident()}.tmp")
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                print(f"Failed to store http cache entry: {e}")
+                return
+            if key in index:
+                self._total_bytes -= index[key][0]
+            index[key] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self.stats.stored += 1
+            self._evict()
+
+    def _forget(self, key: str) -> None:
+        size, _ = self._index.pop(key, (0, 0))
+        self._total_bytes -= size
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._forget(key)
+            self.stats.evicted += 1
+
+    def record_hit(self) -> None:
+        with self._lock:
+            self.stats.hits += 1
+            self.stats.rate_limit_saved += 1
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.stats.misses += 1
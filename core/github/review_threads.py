@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from github.PullRequestComment import PullRequestComment
+from github.Repository import Repository
+
+PAGE_SIZE = 100
+
+_COMMENT_FIELDS = """
+    databaseId
+    body
+    path
+    url
+    diffHunk
+    createdAt
+    updatedAt
+    line
+    startLine
+    originalLine
+    originalStartLine
+    author { login __typename }
+    replyTo { databaseId }
+    pullRequestReview { databaseId }
+    commit { oid }
+    originalCommit { oid }
+"""
+
+REVIEW_THREADS_QUERY = f"""
+query ($owner: String!, $name: String!, $number: Int!, $cursor: String) {{
+  repository(owner: $owner, name: $name) {{
+    pullRequest(number: $number) {{
+      reviewThreads(first: {PAGE_SIZE}, after: $cursor) {{
+        pageInfo {{ hasNextPage endCursor }}
+        nodes {{
+          id
+          isResolved
+          isOutdated
+          path
+          line
+          startLine
+          comments(first: {PAGE_SIZE}) {{
+            pageInfo {{ hasNextPage endCursor }}
+            nodes {{ {_COMMENT_FIELDS} }}
+          }}
+        }}
+      }}
+    }}
+  }}
+}}
+"""
+
+# Only for threads holding more than PAGE_SIZE comments
+THREAD_COMMENTS_QUERY = f"""
+query ($id: ID!, $cursor: String) {{
+  node(id: $id) {{
+    ... on PullRequestReviewThread {{
+      comments(first: {PAGE_SIZE}, after: $cursor) {{
+        pageInfo {{ hasNextPage endCursor }}
+        nodes {{ {_COMMENT_FIELDS} }}
+      }}
+    }}
+  }}
+}}
+"""
+
+
+@dataclass
+class ReviewThread:
+    id: str
+    path: str
+    is_resolved: bool = False
+    is_outdated: bool = False
+    # The first comment is the top level one, the others are replies to it
+    comments: list[PullRequestComment] = field(default_factory=list)
+
+    @property
+    def top_level_comment(self) -> PullRequestComment:
+        return self.comments[0]
+
+    @property
+    def replies(self) -> list[PullRequestComment]:
+        return self.comments[1:]
+
+
+def _to_rest_comment(
+    repo: Repository,
+    pull_number: int,
+    node: dict,
+    thread: dict,
+    top_level_id: int | None,
+) -> PullRequestComment:
+    # Same shape as the REST payload, so the comments behave like the ones from pull.get_comments()
+    author = node.get("author") or {}
+    login = author.get("login", "")
+    user_type = author.get("__typename", "User")
+    if user_type == "Bot" and not login.endswith("[bot]"):
+        # GraphQL drops the [bot] suffix REST uses
+        login = f"{login}[bot]"
+    comment_id = node["databaseId"]
+    attributes = {
+        "id": comment_id,
+        "url": f"{repo.url}/pulls/comments/{comment_id}",
+        "html_url": node.get("url"),
+        "pull_request_url": f"{repo.url}/pulls/{pull_number}",
+        "body": node.get("body") or "",
+        "path": node.get("path") or thread.get("path"),
+        "diff_hunk": node.get("diffHunk"),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+        # Replies carry no lines of their own, REST repeats the thread ones
+        "line": node.get("line") or thread.get("line"),
+        "start_line": node.get("startLine") or thread.get("startLine"),
+        "original_line": node.get("originalLine"),
+        "original_start_line": node.get("originalStartLine"),
+        # REST points every reply at the top level comment of the thread
+        "in_reply_to_id": top_level_id,
+        "pull_request_review_id": (node.get("pullRequestReview") or {}).get(
+            "databaseId"
+        ),
+        "commit_id": (node.get("commit") or {}).get("oid"),
+        "original_commit_id": (node.get("originalCommit") or {}).get("oid"),
+        "user": {"login": login, "type": user_type},
+    }
+    return PullRequestComment(repo.requester, {}, attributes, completed=True)
+
+
+def _thread_comment_nodes(repo: Repository, thread: dict) -> list[dict]:
+    comments = thread["comments"]
+    nodes = list(comments["nodes"])
+    page_info = comments["pageInfo"]
+    while page_info["hasNextPage"]:
+        _, data = repo.requester.graphql_query(
+            THREAD_COMMENTS_QUERY,
+            {"id": thread["id"], "cursor": page_info["endCursor"]},
+        )
+        comments = data["data"]["node"]["comments"]
+        nodes.extend(comments["nodes"])
+        page_info = comments["pageInfo"]
+    return nodes
+
+
+def fetch_review_threads(repo: Repository, pull_number: int) -> list[ReviewThread]:
+    """
+    All review threads of a PR with their comments and resolution state,
+    in one GraphQL query per 100 threads (REST doesn't expose isResolved).
+    """
+    owner, name = repo.full_name.split("/")
+    threads = []
+    cursor = None
+    while True:
+        _, data = repo.requester.graphql_query(
+            REVIEW_THREADS_QUERY,
+            {"owner": owner, "name": name, "number": pull_number, "cursor": cursor},
+        )
+        review_threads = data["data"]["repository"]["pullRequest"]["reviewThreads"]
+        for thread in review_threads["nodes"]:
+            nodes = _thread_comment_nodes(repo, thread)
+            if not nodes:
+                continue
+            top_level_id = nodes[0]["databaseId"]
+            threads.append(
+                ReviewThread(
+                    id=thread["id"],
+                    path=thread.get("path"),
+                    is_resolved=thread.get("isResolved", False),
+                    is_outdated=thread.get("isOutdated", False),
+                    comments=[
+                        _to_rest_comment(
+                            repo,
+                            pull_number,
+                            node,
+                            thread,
+                            None if index == 0 else top_level_id,
+                        )
+                        for index, node in enumerate(nodes)
+                    ],
+                )
+            )
+        if not review_threads["pageInfo"]["hasNextPage"]:
+            break
+        cursor = review_threads["pageInfo"]["endCursor"]
+    return threads
+
+
+def fetch_review_threads_rest(repo: Repository, pull_number: int) -> list[ReviewThread]:
+    # Fallback when GraphQL is not available, threads are rebuilt from in_reply_to_id
+    # and resolution state is unknown
+    threads: dict[int, ReviewThread] = {}
+    for comment in repo.get_pull(pull_number).get_comments():
+        top_level_id = comment.in_reply_to_id or comment.id
+        if top_level_id not in threads:
+            threads[top_level_id] = ReviewThread(
+                id=str(top_level_id), path=comment.path
+            )
+        threads[top_level_id].comments.append(comment)
+    return list(threads.values())
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import asdict, dataclass
+from enum import IntEnum
+from typing import Iterator, Mapping
+
+READ_VERBS = ("GET", "HEAD", "OPTIONS")
+
+
+class Priority(IntEnum):
+    # Lower value is served first
+    HIGH = 0  # final summary comment and review posts
+    NORMAL = 1
+    LOW = 2  # housekeeping: deleting old comments, dismissing reviews
+
+
+class RateLimitExhausted(Exception):
+    pass
+
+
+@dataclass
+class RateLimitBudget:
+    resource: str = "core"
+    limit: int = -1
+    remaining: int = -1
+    used: int = -1
+    reset: float = 0.0  # epoch seconds
+
+    def __str__(self) -> str:
+        return f"{self.resource}: {self.remaining}/{self.limit} remaining"
+
+
+@dataclass
+class SchedulerMetrics:
+    requests: int = 0
+    writes: int = 0
+    throttled: int = 0
+    skipped_low_priority: int = 0
+    waited_seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{key}: {round(value, 2)}" for key, value in asdict(self).items()
+        )
+
+
+class RequestScheduler:
+    """
+    Gate in front of every GitHub request.
+
+    - reads and writes wait while the primary rate limit is exhausted or a Retry-After is pending
+    - writes (mutations) are spaced by write_interval, following GitHub secondary rate limit
+      guidance, waiting writes are served by priority
+    - low priority writes are refused once the remaining budget drops under low_priority_reserve,
+      leaving it to the summary and review posts; their reads still go through, a refused
+      read would abort the caller before the writes that matter
+    """
+
+    def __init__(
+        self,
+        write_interval: float = 1.0,
+        low_priority_reserve: int = 100,
+        max_wait: float = 900.0,
+    ):
+        self.write_interval = write_interval
+        self.low_priority_reserve = low_priority_reserve
+        # Never sleep longer than this for a single request (the job has its own timeout)
+        self.max_wait = max_wait
+        # Budget per rate limit resource (core, graphql, search...)
+        self.budgets: dict[str, RateLimitBudget] = {}
+        self.metrics = SchedulerMetrics()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._waiting_writes: list[tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self._next_write_at = 0.0  # monotonic
+        self._blocked_until = 0.0  # epoch
+
+    @property
+    def budget(self) -> RateLimitBudget:
+        return self.budgets.get("core", RateLimitBudget())
+
+    def report(self) -> dict[str, float]:
+        # Flat metrics, e.g. to be exported along the other run metrics
+        with self._cond:
+            report = {
+                f"github_{key}": value for key, value in asdict(self.metrics).items()
+            }
+            for resource, budget in self.budgets.items():
+                report[f"github_rate_limit_remaining_{resource}"] = budget.remaining
+                report[f"github_rate_limit_limit_{resource}"] = budget.limit
+        return report
+
+    @property
+    def current_priority(self) -> Priority:
+        return getattr(self._local, "priority", Priority.NORMAL)
+
+    @contextlib.contextmanager
+    def priority(self, priority: Priority) -> Iterator[None]:
+        previous = self.current_priority
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def acquire(self, verb: str) -> None:
+        priority = self.current_priority
+        is_read = verb.upper() in READ_VERBS
+        start = time.monotonic()
+        with self._cond:
+            self.metrics.requests += 1
+            if (
+                priority == Priority.LOW
+                and not is_read
+                and 0 <= self.budget.remaining <= self.low_priority_reserve
+                and self.budget.reset > time.time()
+            ):
+                self.metrics.skipped_low_priority += 1
+                raise RateLimitExhausted(
+                    f"GitHub rate limit budget is reserved for high priority requests ({self.budget})"
+                )
+
+            if is_read:
+                self._wait_unblocked(start)
+            else:
+                self.metrics.writes += 1
+                self._wait_write_slot(priority, start)
+
+            waited = time.monotonic() - start
+            if waited > 0.01:
+                self.metrics.throttled += 1
+                self.metrics.waited_seconds += waited
+
+    def _remaining_wait(self, start: float) -> float:
+        return self.max_wait - (time.monotonic() - start)
+
+    def _wait_unblocked(self, start: float) -> None:
+        while (delay := self._blocked_until - time.time()) > 0:
+            if self._remaining_wait(start) <= 0:
+                return
+            self._cond.wait(min(delay, self._remaining_wait(start)))
+
+    def _wait_write_slot(self, priority: Priority, start: float) -> None:
+        ticket = (int(priority), next(self._tickets))
+        heapq.heappush(self._waiting_writes, ticket)
+        try:
+            while True:
+                delay = max(
+                    self._blocked_until - time.time(),
+                    self._next_write_at - time.monotonic(),
+                )
+                if self._remaining_wait(start) <= 0 or (
+                    self._waiting_writes[0] == ticket and delay <= 0
+                ):
+                    break
+                timeout = delay if self._waiting_writes[0] == ticket else None
+                if timeout is not None:
+                    timeout = min(timeout, self._remaining_wait(start))
+                self._cond.wait(timeout)
+        finally:
+            self._waiting_writes.remove(ticket)
+            heapq.heapify(self._waiting_writes)
+            self._next_write_at = time.monotonic() + self.write_interval
+            self._cond.notify_all()
+
+    def record(self, status: int, headers: Mapping[str, str], body: str = "") -> None:
+        headers = {key.lower(): value for key, value in headers.items()}
+        with self._cond:
+            budget = None
+            if "x-ratelimit-remaining" in headers:
+                budget = RateLimitBudget(
+                    resource=headers.get("x-ratelimit-resource", "core"),
+                    limit=int(headers.get("x-ratelimit-limit", -1)),
+                    remaining=int(headers["x-ratelimit-remaining"]),
+                    used=int(headers.get("x-ratelimit-used", -1)),
+                    reset=float(headers.get("x-ratelimit-reset", 0)),
+                )
+                self.budgets[budget.resource] = budget
+
+            blocked_until = 0.0
+            if status in (403, 429):
+                if "retry-after" in headers:
+                    blocked_until = time.time() + float(headers["retry-after"])
+                elif budget is not None and budget.remaining == 0:
+                    blocked_until = budget.reset
+                elif status == 429 or "rate limit" in body.lower():
+                    # No hint from GitHub, it recommends to wait at least one minute
+                    blocked_until = time.time() + 60
+            elif budget is not None and budget.remaining == 0:
+                blocked_until = budget.reset
+
+            if blocked_until > self._blocked_until:
+                self._blocked_until = blocked_until
+                print(
+                    f"GitHub rate limit hit, pausing requests for "
+                    f"{round(blocked_until - time.time())}s ({budget or self.budget})"
+                )
+            self._cond.notify_all()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any, ItemsView
+
+import requests
+from github.Requester import (
+    HTTPRequestsConnectionClass,
+    HTTPSRequestsConnectionClass,
+    Requester,
+    RequestsResponse,
+)
+
+from core.github.http_cache import CachedResponse, HttpCache
+from core.github.scheduler import RequestScheduler
+from core.tracing import span
+
+
+class CachedRequestsResponse:
+    # mimic RequestsResponse for a body replayed from the http cache
+    def __init__(self, cached: CachedResponse, fresh_headers: dict[str, str]):
+        self.status = cached.status
+        # 304 carries up-to-date rate limit headers, keep them over the cached ones
+        self.headers = {**cached.headers, **fresh_headers}
+        self.text = cached.body
+
+    def getheaders(self) -> ItemsView[str, str]:
+        return self.headers.items()
+
+    def read(self) -> str:
+        return self.text
+
+
+class _ConnectionMixin:
+    """
+    PyGithub connection with a session shared between all instances, going through the
+    request scheduler and an optional conditional-request cache for GET requests.
+
+    Injected connection classes are created once per request (PyGithub doesn't persist them),
+    which also means the request state below is never shared between threads.
+    """
+
+    http_cache: HttpCache | None = None
+    scheduler: RequestScheduler | None = None
+    _sessions: dict[tuple[str, str, int], requests.Session] = {}
+    _sessions_lock = threading.Lock()
+
+    def _share_session(self) -> None:
+        key = (self.protocol, self.host, self.port)
+        with self._sessions_lock:
+            if key not in self._sessions:
+                self._sessions[key] = self.session
+            else:
+                self.session.close()
+            self.session = self._sessions[key]
+
+    def getresponse(self) -> RequestsResponse | CachedRequestsResponse:
+        if self.scheduler is None:
+            return self._getresponse()
+
+        verb = self._scheduled_verb()
+        if verb == "GET":
+            return self._scheduled_response(verb)
+        # Writes are traced including the time waiting for the scheduler
+        with span(f"GitHub {self.verb}", "github", url=self.url) as write:
+            response = self._scheduled_response(verb)
+            write.args["status"] = response.status
+        return response
+
+    def _scheduled_response(
+        self, verb: str
+    ) -> RequestsResponse | CachedRequestsResponse:
+        self.scheduler.acquire(verb)
+        response = self._getresponse()
+        self.scheduler.record(
+            response.status,
+            response.headers,
+            response.text if response.status in (403, 429) else "",
+        )
+        return response
+
+    def _scheduled_verb(self) -> str:
+        # GraphQL queries are POSTed but they are reads, only mutations are paced as writes
+        if self.verb == "POST" and self.url.endswith("/graphql"):
+            try:
+                query = json.loads(self.input)["query"]
+            except (TypeError, ValueError, KeyError):
+                return self.verb
+            if not query.lstrip().startswith("mutation"):
+                return "GET"
+        return self.verb
+
+    def _getresponse(self) -> RequestsResponse | CachedRequestsResponse:
+        cache = self.http_cache
+        if cache is None or self.verb != "GET":
+            return super().getresponse()
+
+        key = cache.key(f"{self.host}{self.url}", self.headers)
+        cached = cache.get(key)
+        if cached is not None:
+            self.headers = {**self.headers, **cached.conditional_headers}
+
+        response = super().getresponse()
+
+        if response.status == 304 and cached is not None:
+            cache.record_hit()
+            return CachedRequestsResponse(cached, dict(response.headers))
+
+        cache.record_miss()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status == 200 and (etag or last_modified):
+            cache.put(
+                key,
+                CachedResponse(
+                    url=self.url,
+                    status=response.status,
+                    headers=dict(response.headers),
+                    body=response.text,
+                    etag=etag,
+                    last_modified=last_modified,
+                ),
+            )
+        return response
+
+    def close(self) -> None:
+        # The session is shared, it lives as long as the process
+        pass
+
+
+class HTTPConnection(_ConnectionMixin, HTTPRequestsConnectionClass):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._share_session()
+
+
+class HTTPSConnection(_ConnectionMixin, HTTPSRequestsConnectionClass):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._share_session()
+
+
+def install_transport(
+    http_cache: HttpCache | None, scheduler: RequestScheduler | None
+) -> None:
+    _ConnectionMixin.http_cache = http_cache
+    _ConnectionMixin.scheduler = scheduler
+    Requester.injectConnectionClasses(HTTPConnection, HTTPSConnection)
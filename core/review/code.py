@@ -1,25 +1,27 @@
 from __future__ import annotations
 
-import concurrent.futures
 import re
 import traceback
 from typing import Tuple
 
-from github.File import File
-
 from core.bots.bot import Bot
 from core.commenter import CommentMode, GithubCommentManager
-from core.github import GITHUB_CONTEXT
+from core.github import GITHUB_CONTEXT, GITHUB_SCHEDULER
+from core.github.scheduler import Priority
 from core.schemas.files import AiSummary, FileSummary, FilteredFile
 from core.schemas.options import Options
 from core.schemas.patch import pack_patches_with_associated_comments_chains
 from core.schemas.pr_common import PRDescription, PRInfo, ReviewedCommitIds
+from core.schemas.pr_snapshot import SnapshotFile
 from core.schemas.prompts import ExistingSummarizedComment, Prompts
 from core.schemas.review import ReviewSummary
 from core.templates.tags import SUMMARIZE_TAG, TAGS
 from core.tokenizer import get_token_count
+from core.tracing import traced
+from core.utils import bounded_parallel_map
 
 
+@traced("do_summary", "review", file=lambda file, *args, **kwargs: file.filename)
 def do_summary(
     file: FilteredFile,
     options: Options,
@@ -44,7 +46,7 @@ def do_summary(
         return None
 
     try:
-        summarize_response = light_bot.chat(summarize_prompt)
+        summarize_response = light_bot.chat(summarize_prompt, stage="summarize")
         summary = summarize_response.message
         if summary == "":
             print(f"summarize: nothing obtained from {options.light_model_name} model")
@@ -84,34 +86,24 @@ def generate_summaries_on_filtered_files(
     light_bot: Bot,
 ) -> Tuple[list[FileSummary], list[str], list[str]]:
     summaries_failed = []
-    summary_promises = []
     skipped_files = []
 
-    for filtered_file in filtered_files:
-        #  Less than or equal to 0 means no limit.
-        if options.max_files <= 0 or len(summary_promises) < options.max_files:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=options.concurrency_limit
-            ) as executor:
-                summary_promises.append(
-                    executor.submit(
-                        do_summary,
-                        filtered_file,
-                        options,
-                        prompts,
-                        light_bot,
-                        summaries_failed,
-                    )
-                )
-        else:
-            skipped_files.append(filtered_file.filename)
-
-    summaries: list[FileSummary] = []
-    for future in concurrent.futures.as_completed(summary_promises):
-        # Use result to get the result of the future
-        summary = future.result()
-        if summary is not None:
-            summaries.append(summary)
+    #  Less than or equal to 0 means no limit.
+    if options.max_files > 0:
+        skipped_files = [file.filename for file in filtered_files[options.max_files :]]
+        filtered_files = filtered_files[: options.max_files]
+
+    summaries: list[FileSummary] = [
+        summary
+        for summary in bounded_parallel_map(
+            lambda filtered_file: do_summary(
+                filtered_file, options, prompts, light_bot, summaries_failed
+            ),
+            filtered_files,
+            max_workers=options.concurrency_limit,
+        )
+        if summary is not None
+    ]
 
     return summaries, summaries_failed, skipped_files
 
@@ -128,50 +120,51 @@ def generate_reviews_on_filtered_files(
     heavy_bot: Bot,
 ) -> Tuple[ReviewSummary, list[str]]:
     #  Perform review on filtered files that need review.
+    needs_review = {
+        file_summary.filename for file_summary in summaries if file_summary.needs_review
+    }
     files_need_review = [
         filtered_file
         for filtered_file in filtered_files
-        for file_summary in summaries
-        if filtered_file.filename == file_summary.filename and file_summary.needs_review
+        if filtered_file.filename in needs_review
     ]
     reviews_skipped = [
         filtered_file.filename
         for filtered_file in filtered_files
-        if filtered_file.filename not in [f.filename for f in files_need_review]
+        if filtered_file.filename not in needs_review
     ]
 
     review_summary = ReviewSummary()
     review_summary.skipped.extend(reviews_skipped)
 
-    review_futures = []
-    for file in files_need_review:
-        if options.max_files <= 0 or len(review_futures) < options.max_files:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=options.concurrency_limit
-            ) as executor:
-                # Add the Future object to the list
-                review_futures.append(
-                    executor.submit(
-                        do_review,
-                        file,
-                        ai_summary,
-                        options,
-                        prompts,
-                        pr_description,
-                        commenter,
-                        heavy_bot,
-                        review_summary,
-                    )
-                )
-        else:
-            skipped_files.append(file.filename)
-
-    reviews = []
-    for future in concurrent.futures.as_completed(review_futures):
-        # Use result to get the result of the future
-        review = future.result()
-        if review is not None:
-            reviews.append(review)
+    if options.max_files > 0:
+        skipped_files.extend(
+            file.filename for file in files_need_review[options.max_files :]
+        )
+        files_need_review = files_need_review[: options.max_files]
+
+    # Files that won't be reviewed are done
+    to_review = {file.filename for file in files_need_review}
+    for filtered_file in filtered_files:
+        if filtered_file.filename not in to_review:
+            filtered_file.release()
+
+    # Files go through the review as they complete, only a window of them is in flight
+    for _ in bounded_parallel_map(
+        lambda file: do_review(
+            file,
+            ai_summary,
+            options,
+            prompts,
+            pr_description,
+            commenter,
+            heavy_bot,
+            review_summary,
+        ),
+        files_need_review,
+        max_workers=options.concurrency_limit,
+    ):
+        pass
 
     return review_summary, skipped_files
 
@@ -189,15 +182,17 @@ def process_review_response(
         response = heavy_bot.chat(
             prompts.render_review_file_diff(
                 file=file, ai_summary=ai_summary, pr_description=pr_description
-            )
+            ),
+            stage="review",
         )
         if not response.message:
             print(f"review: nothing obtained from {options.heavy_model_name} model")
             review_summary.failed.append(f"{file.filename} (no response)")
             return
 
-        review_summary.parse_ai_review(response, file, options.debug)
-        review_summary.filter_lgtm_reviews(options)
+        with review_summary.lock:
+            review_summary.parse_ai_review(response, file, options.debug)
+            review_summary.filter_lgtm_reviews(options)
 
     except Exception as e:
         print(
@@ -206,6 +201,7 @@ def process_review_response(
         review_summary.failed.append(f"{file.filename} ({str(e)})")
 
 
+@traced("do_review", "review", file=lambda file, *args, **kwargs: file.filename)
 def do_review(
     file: FilteredFile,
     ai_summary: AiSummary,
@@ -251,46 +247,56 @@ def do_review(
             options=options,
         )
 
+    # The review is buffered, nothing of the file is needed anymore
+    file.release()
+
 
 def generate_filtered_ignored_files(
     pr_info: PRInfo, options: Options
-) -> Tuple[list[FilteredFile], list[File]]:
+) -> Tuple[list[FilteredFile], list[SnapshotFile]]:
 
-    incremental_files: list[File] = pr_info.incremental_diff.files
-    target_branch_files: list[File] = pr_info.target_branch_diff.files
+    incremental_files: list[SnapshotFile] = pr_info.incremental_diff.files
+    target_branch_files: list[SnapshotFile] = pr_info.target_branch_diff.files
 
     if incremental_files is None or target_branch_files is None:
         return [], []
 
+    incremental_filenames = {
+        incremental_file.filename for incremental_file in incremental_files
+    }
     files = [
         target_branch_file
         for target_branch_file in target_branch_files
-        if any(
-            incremental_file.filename == target_branch_file.filename
-            for incremental_file in incremental_files
-        )
+        if target_branch_file.filename in incremental_filenames
     ]
 
-    filter_selected_files: list[File] = []
-    filter_ignored_files: list[File] = []
-    for file in files:
-        if not options.check_path(file.filename):
-            filter_ignored_files.append(file)
-        else:
-            filter_selected_files.append(file)
+    filter_selected_files, filter_ignored_files = options.path_filters.partition(
+        files, key=lambda file: file.filename
+    )
+    print(
+        f"path filters: {len(filter_selected_files)} files selected, "
+        f"{len(filter_ignored_files)} ignored"
+    )
 
-    filtered_files = FilteredFile.get_filtered_files(filter_selected_files, options)
+    filtered_files = FilteredFile.get_filtered_files(filter_selected_files)
+    # The filtered files hold the only reference to their diff from now on, it's freed as soon
+    # as the file is done
+    pr_info.target_branch_diff.release_patches()
+    pr_info.incremental_diff.release_patches()
 
     return filtered_files, filter_ignored_files
 
 
+@traced("code_review")
 def code_review(light_bot: Bot, heavy_bot: Bot, options: Options, prompts: Prompts):
     if not GITHUB_CONTEXT.is_context_valid(
         event_names=("pull_request", "pull_request_target")
     ):
         return
 
-    commenter = GithubCommentManager()
+    commenter = GithubCommentManager(
+        github_concurrency_limit=options.github_concurrency_limit
+    )
     pr_info = PRInfo()
     pr_description = PRDescription()
 
@@ -309,7 +315,7 @@ def code_review(light_bot: Bot, heavy_bot: Bot, options: Options, prompts: Promp
         existing_summarize_comment.reviewed_commits_ids.highest_reviewed_commit_id
     )
 
-    if pr_info.commits.totalCount == 0:
+    if len(pr_info.commits) == 0:
         print("Skipped: commits is None")
         return
 
@@ -321,6 +327,16 @@ def code_review(light_bot: Bot, heavy_bot: Bot, options: Options, prompts: Promp
         print("Skipped: no files to review")
         return
 
+    # Both bots are built at once (the heavy one can take minutes), and before the in
+    # progress comment so that a bot that can't be built skips the run
+    heavy_bot.warm_up(background=True)
+    try:
+        light_bot.warm_up()
+        heavy_bot.warm_up()
+    except Exception as e:
+        print(f"Skipped: {e}")
+        return
+
     commenter.comment(
         message=existing_summarize_comment.status_message_in_progress(
             filtered_files=filtered_files, ignored_files=ignored_files
@@ -336,6 +352,9 @@ def code_review(light_bot: Bot, heavy_bot: Bot, options: Options, prompts: Promp
         prompts=prompts,
         light_bot=light_bot,
     )
+    if options.disable_review:
+        for filtered_file in filtered_files:
+            filtered_file.release()
 
     ai_summary = existing_summarize_comment.ai_summary.model_copy()
     ai_summary.generate_new_raw_summary(
@@ -374,7 +393,8 @@ def code_review(light_bot: Bot, heavy_bot: Bot, options: Options, prompts: Promp
         # Let it be a less spammy review option
 
         if options.less_spammy:
-            commenter.dismiss_review_and_remove_comments(pr_info.number)
+            with GITHUB_SCHEDULER.priority(Priority.LOW):
+                commenter.dismiss_review_and_remove_comments(pr_info.number)
 
         status_message_finished_review = review_summary.get_status_message_finished_review(
             existing_summarize_comment.reviewed_commits_ids.highest_reviewed_commit_id,
@@ -395,9 +415,10 @@ def code_review(light_bot: Bot, heavy_bot: Bot, options: Options, prompts: Promp
     print(
         "[DEBUG]--------------------------BEFORE END COMMENT------------------------------------"
     )
-    commenter.comment(
-        message=f"{existing_summarize_comment.render(disable_review=options.disable_review)}",
-        pr_number=pr_info.number,
-        tag=SUMMARIZE_TAG,
-        mode=CommentMode.REPLACE,
-    )
+    with GITHUB_SCHEDULER.priority(Priority.HIGH):
+        commenter.comment(
+            message=f"{existing_summarize_comment.render(disable_review=options.disable_review)}",
+            pr_number=pr_info.number,
+            tag=SUMMARIZE_TAG,
+            mode=CommentMode.REPLACE,
+        )
@@ -12,6 +12,7 @@ from core.schemas.pr_common import PRDescription, PRInfo
 from core.schemas.prompts import ExistingSummarizedComment, Prompts
 from core.templates.tags import TAGS
 from core.tokenizer import get_token_count
+from core.tracing import traced
 
 
 def bot_call_itself(comment: Box) -> bool:
@@ -32,6 +33,7 @@ def is_token_limit_exceeded(tokens: int, token_limits: int) -> bool:
     return tokens > token_limits
 
 
+@traced("handle_review_comment")
 def handle_review_comment(heavy_bot: Bot, options: Options, prompts: Prompts):
     if not GITHUB_CONTEXT.is_context_valid(
         event_names=("pull_request_review_comment",)
@@ -45,7 +47,9 @@ def handle_review_comment(heavy_bot: Bot, options: Options, prompts: Prompts):
     if bot_call_itself(comment):
         return
 
-    commenter = GithubCommentManager()
+    commenter = GithubCommentManager(
+        github_concurrency_limit=options.github_concurrency_limit
+    )
     comment_reply = CommentReply().init_with(
         comment=comment, comment_manager=commenter, pr_info=pr_info
     )
@@ -66,11 +70,15 @@ def handle_review_comment(heavy_bot: Bot, options: Options, prompts: Prompts):
         )
         return
 
+    heavy_bot.warm_up(background=True)
+
+    # The full file content is only downloaded if it fits in the prompt
+    exclude = "file_content"
     final_prompt = prompts.render_comment(
         comment_reply=comment_reply,
         pr_description=pr_description,
         ai_summary=None,
-        exclude="file_content",
+        exclude=exclude,
     )
 
     tokens_prompt = get_token_count(final_prompt)
@@ -87,10 +95,10 @@ def handle_review_comment(heavy_bot: Bot, options: Options, prompts: Prompts):
         )
         return
 
-    if not is_token_limit_exceeded(
-        tokens_prompt + comment_reply.file.content_tokens,
-        token_limits=options.heavy_token_limits.request_tokens,
+    if comment_reply.file.file_content.fits(
+        options.heavy_token_limits.request_tokens - tokens_prompt
     ):
+        exclude = None
         final_prompt = prompts.render_comment(
             comment_reply=comment_reply,
             pr_description=pr_description,
@@ -108,9 +116,19 @@ def handle_review_comment(heavy_bot: Bot, options: Options, prompts: Prompts):
             comment_reply=comment_reply,
             pr_description=pr_description,
             ai_summary=existing_ai_summary,
+            exclude=exclude,
         )
 
-    reply = heavy_bot.chat(final_prompt)
+    # The prompt holds its own copy now
+    comment_reply.file.file_content.release()
+
+    try:
+        heavy_bot.warm_up()
+    except Exception as e:
+        notice(f"Skipped: {e}")
+        return
+
+    reply = heavy_bot.chat(final_prompt, stage="reply")
     commenter.review_comment_reply(
         pr_info.number, comment_reply.top_level_comment, reply.message
     )
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable
+
+from github_action_utils import notice
+
+from core.consts import PR_LINES_LIMIT
+from core.github import GITHUB_CONTEXT
+from core.review.comment import bot_call_itself
+from core.schemas.options import Options
+from core.schemas.pr_common import PRDescription
+from core.utils import get_total_new_lines
+
+PULL_REQUEST_EVENTS = ("pull_request", "pull_request_target")
+REVIEW_COMMENT_EVENTS = ("pull_request_review_comment",)
+
+
+class Cost(IntEnum):
+    # Rules run cheapest first
+    PAYLOAD = 0
+    API = 1
+
+
+@dataclass
+class GateRule:
+    name: str
+    cost: Cost
+    # None for every event
+    events: tuple[str, ...] | None
+    # Returns why the run should stop, None to go on
+    check: Callable[[Options], str | None]
+
+
+@dataclass
+class GateDecision:
+    proceed: bool
+    rule: str | None = None
+    reason: str = ""
+
+    def __str__(self) -> str:
+        if self.proceed:
+            return "passed all gates"
+        return f"stopped by {self.rule}: {self.reason}"
+
+
+def _unsupported_event(options: Options) -> str | None:
+    if GITHUB_CONTEXT.event_name not in PULL_REQUEST_EVENTS + REVIEW_COMMENT_EVENTS:
+        return (
+            f"{GITHUB_CONTEXT.event_name} event, this action only works on "
+            "pull_request and pull_request_review_comment events"
+        )
+    return None
+
+
+def _invalid_context(options: Options) -> str | None:
+    event_names = (
+        REVIEW_COMMENT_EVENTS
+        if GITHUB_CONTEXT.event_name in REVIEW_COMMENT_EVENTS
+        else PULL_REQUEST_EVENTS
+    )
+    if not GITHUB_CONTEXT.is_context_valid(event_names=event_names):
+        return "event payload is incomplete"
+    return None
+
+
+def _bot_comment(options: Options) -> str | None:
+    if bot_call_itself(GITHUB_CONTEXT.payload.comment):
+        return "comment was posted by the bot"
+    return None
+
+
+def _ignore_keyword(options: Options) -> str | None:
+    if PRDescription().user_ask_to_ignore:
+        return "description contains ignore_keyword"
+    return None
+
+
+def _draft(options: Options) -> str | None:
+    if not options.review_drafts and GITHUB_CONTEXT.payload.pull_request.get("draft"):
+        return "pull request is a draft"
+    return None
+
+
+def _no_changed_files(options: Options) -> str | None:
+    if GITHUB_CONTEXT.payload.pull_request.get("changed_files") == 0:
+        return "pull request has no changed files"
+    return None
+
+
+def _too_large(options: Options) -> str | None:
+    # Added lines over all files, as counted by GitHub when the event was sent
+    additions = GITHUB_CONTEXT.payload.pull_request.get("additions")
+    if additions is not None and additions > PR_LINES_LIMIT:
+        return f"{additions} new lines, over the {PR_LINES_LIMIT} lines limit"
+    return None
+
+
+def _too_large_from_files(options: Options) -> str | None:
+    # Only for payloads without counts, pages through the files of the PR
+    if GITHUB_CONTEXT.payload.pull_request.get("additions") is not None:
+        return None
+    new_lines = get_total_new_lines()
+    print("Number of new lines in PR: ", new_lines)
+    if new_lines > PR_LINES_LIMIT:
+        return f"{new_lines} new lines, over the {PR_LINES_LIMIT} lines limit"
+    return None
+
+
+GATE_RULES = sorted(
+    [
+        GateRule("unsupported_event", Cost.PAYLOAD, None, _unsupported_event),
+        GateRule("invalid_context", Cost.PAYLOAD, None, _invalid_context),
+        GateRule("bot_comment", Cost.PAYLOAD, REVIEW_COMMENT_EVENTS, _bot_comment),
+        GateRule("ignore_keyword", Cost.PAYLOAD, PULL_REQUEST_EVENTS, _ignore_keyword),
+        GateRule("draft", Cost.PAYLOAD, PULL_REQUEST_EVENTS, _draft),
+        GateRule(
+            "no_changed_files", Cost.PAYLOAD, PULL_REQUEST_EVENTS, _no_changed_files
+        ),
+        GateRule("too_large", Cost.PAYLOAD, PULL_REQUEST_EVENTS, _too_large),
+        GateRule(
+            "too_large_from_files", Cost.API, PULL_REQUEST_EVENTS, _too_large_from_files
+        ),
+    ],
+    # Stable, rules of the same cost keep their order
+    key=lambda rule: rule.cost,
+)
+
+
+def evaluate_gates(
+    options: Options, rules: list[GateRule] = GATE_RULES
+) -> GateDecision:
+    """
+    Early exits decided before any expensive work, the ones answered from the event
+    payload first. The decision records the rule that ended the run.
+    """
+    for rule in rules:
+        if rule.events is not None and GITHUB_CONTEXT.event_name not in rule.events:
+            continue
+        reason = rule.check(options)
+        if reason is not None:
+            decision = GateDecision(proceed=False, rule=rule.name, reason=reason)
+            notice(f"Skipped: {decision}")
+            return decision
+    return GateDecision(proceed=True)
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
+import threading
 import traceback
 from typing import TYPE_CHECKING, List, Tuple
 
-from box import Box
-from github.File import File
 from pydantic import BaseModel
 
 from core.bots.bot import Bot
-from core.github import GITHUB_CONTEXT, REPO
+from core.github import GITHUB_CONTEXT, GITHUB_HANDLES, REPO
+from core.schemas.pr_snapshot import SnapshotFile
 from core.tokenizer import get_token_count
+from core.tracing import traced
 
 if TYPE_CHECKING:  # a hack to avoid circular imports, when we ONLY want to type hint
     # https://peps.python.org/pep-0563/#runtime-annotation-resolution-and-type-checking
@@ -18,44 +19,111 @@ if TYPE_CHECKING:  # a hack to avoid circular imports, when we ONLY want to type
     from core.schemas.comment_chains import CommentChains
 
 from core.schemas.options import Options
-from core.schemas.patch import (
-    Patch,
-    Patches,
-    parse_patch,
-    patch_start_end_line,
-    split_patch,
-)
+from core.schemas.patch import Patch, Patches, parse_hunks
 from core.templates.tags import TAGS
 
+# Source code averages 3 to 4 bytes per cl100k_base token, a file with more bytes than this
+# many per token of the budget can't fit
+MAX_BYTES_PER_TOKEN = 8
 
-class BaseFile(BaseModel):
-    filename: str
-    file_content: str
 
-    @classmethod
-    def get_base_file(cls, filename: str, ref: str) -> BaseFile:
-        file_content = ""
+class FileContent:
+    """
+    Full content of a file at a ref, downloaded on first use: most prompts never include it.
+    Once rendered it can be released, the token count is kept.
+    """
+
+    def __init__(self, filename: str, ref: str):
+        self.filename = filename
+        self.ref = ref
+        self._content: str | None = None
+        self._tokens: int | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def content(self) -> str:
+        with self._lock:
+            if self._content is None:
+                self._content = self._fetch()
+            return self._content
+
+    def _fetch(self) -> str:
         try:
-            contents = REPO.get_contents(filename, ref=ref)
-            file_content = contents.decoded_content.decode() if contents else ""
+            contents = REPO.get_contents(self.filename, ref=self.ref)
+            return contents.decoded_content.decode() if contents else ""
         except Exception as e:
             print(
-                f"Failed to get file contents: {str(e)}. This is OK if it's a new file: {filename}"
+                f"Failed to get file contents: {str(e)}. This is OK if it's a new file: {self.filename}"
             )
+            return ""
 
-        return cls(filename=filename, file_content=file_content)
+    @property
+    def tokens(self) -> int:
+        if self._tokens is None:
+            self._tokens = get_token_count(self.content)
+        return self._tokens
+
+    @property
+    def size(self) -> int | None:
+        # Bytes, from the tree of the ref: known without downloading the file
+        try:
+            return GITHUB_HANDLES.get_blob_sizes(self.ref).get(self.filename)
+        except Exception as e:
+            print(f"Failed to get the size of {self.filename}: {e}")
+            return None
+
+    def fits(self, budget: int) -> bool:
+        # Nothing is downloaded when there is no room left anyway, or when the file is
+        # obviously too large for it
+        if budget <= 0:
+            return False
+        if self._tokens is None:
+            size = self.size
+            if size is not None and size > budget * MAX_BYTES_PER_TOKEN:
+                return False
+        return self.tokens <= budget
+
+    def release(self) -> None:
+        with self._lock:
+            self._content = None
+
+    def __str__(self) -> str:
+        return self.content
+
+
+class BaseFile(BaseModel):
+    filename: str
+    file_content: FileContent
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def get_base_file(cls, filename: str, ref: str) -> BaseFile:
+        return cls(filename=filename, file_content=FileContent(filename, ref=ref))
 
     @property
     def content_tokens(self) -> int:
-        return get_token_count(self.file_content)
+        return self.file_content.tokens
 
 
 class FilteredFile(BaseModel):
     filename: str
-    file_content: str
+    file_content: FileContent
     file_diff: str
     patches: Patches
 
+    class Config:
+        arbitrary_types_allowed = True
+
+    def release(self) -> None:
+        # The file is done: its name and the line ranges of its patches are all that's left
+        self.file_diff = ""
+        self.patches.items_str = ""
+        for patch in self.patches:
+            patch.hunk.release()
+        self.file_content.release()
+
     def compute_patch_associated_comment_chains(
         self, commenter: GithubCommentManager
     ) -> list[Tuple[Patch, CommentChains | None]]:
@@ -83,60 +151,26 @@ class FilteredFile(BaseModel):
             return patch_associated_comment_chains
 
     @classmethod
-    def get_file_contents(cls, file: File) -> str:
-        try:
-            contents = REPO.get_contents(
-                file.filename, ref=GITHUB_CONTEXT.payload.pull_request.base.sha
-            )
-            return contents.decoded_content.decode() if contents else ""
-        except Exception as e:
-            print(
-                f"Failed to get file contents: {str(e)}. This is OK if it's a new file: {file.filename}"
-            )
-            return ""
-
-    @classmethod
-    def parse_patch(cls, patch: str) -> Patch | None:
-        patch_lines = patch_start_end_line(patch)
-        if not patch_lines:
-            return None
-        patch_lines = Box(patch_lines)
-        # TODO make better typing not Box
-        hunks = Box(parse_patch(patch, patch_lines))
-        if not hunks:
-            return None
-        return Patch(
-            start_line=patch_lines.new_hunk.start_line,
-            end_line=patch_lines.new_hunk.end_line,
-            patch_str=f"\n---new_hunk---\n```\n{hunks.new_hunk}\n```\n"
-            f"\n---old_hunk---\n```\n{hunks.old_hunk}\n```\n",
-        )
-
-    @classmethod
+    @traced("get_filtered_files")
     def get_filtered_files(
-        cls, files: List[File], options: Options
+        cls, filter_selected_files: List[SnapshotFile]
     ) -> List[FilteredFile]:
-        """Filter files based on options and extract relevant information."""
-        filter_selected_files = [
-            file for file in files if options.check_path(file.filename)
-        ]
+        """Extract relevant information from the files selected by the path filters."""
         if not filter_selected_files:
             print("Skipped: filter_selected_files is None")
             return []
 
         filtered_files = []
         for file in filter_selected_files:
-            file_content = cls.get_file_contents(file)
-            patches = [
-                parsed_patch
-                for patch in split_patch(file.patch)
-                if (parsed_patch := cls.parse_patch(patch))
-            ]
+            patches = [Patch.from_hunk(hunk) for hunk in parse_hunks(file.patch)]
             if patches:
                 filtered_files.append(
                     cls(
                         filename=file.filename,
-                        file_content=file_content,
+                        file_content=FileContent(
+                            file.filename,
+                            ref=GITHUB_CONTEXT.payload.pull_request.base.sha,
+                        ),
                         file_diff=file.patch if file.patch else "",
                         patches=Patches(items=patches),
                     )
@@ -159,6 +193,7 @@ class AiSummary(BaseModel):
     def short_summary_tokens(self) -> int:
         return get_token_count(self.short_summary)
 
+    @traced("summary reduction: raw", "summary")
     def generate_new_raw_summary(
         self,
         heavy_bot: Bot,
@@ -181,7 +216,9 @@ class AiSummary(BaseModel):
             # In this way we pass the previous summary to the model in the first batch
             self.raw_summary += f"\n---\n{batch_summary}"
             # TODO need to define an AI function here, which will give the unified summary
-            summarize_resp = heavy_bot.chat(prompts.render_summarize_raw(self))
+            summarize_resp = heavy_bot.chat(
+                prompts.render_summarize_raw(self), stage="raw"
+            )
             if not summarize_resp.message:
                 print(
                     f"summarize: nothing obtained from {options.heavy_model_name} model"
@@ -189,13 +226,15 @@ class AiSummary(BaseModel):
             else:
                 self.raw_summary = summarize_resp.message
 
+    @traced("summary reduction: short", "summary")
     def generate_new_short_summary(self, heavy_bot: Bot, prompts: Prompts) -> None:
         # TODO check if we don't have raw empty summary in this way we should skip
         self.short_summary = heavy_bot.chat(
-            prompts.render_summarize_short(self)
+            prompts.render_summarize_short(self), stage="short"
         ).message
 
+    @traced("summary reduction: changeset", "summary")
     def generate_new_changeset_summary(self, heavy_bot: Bot, prompts: Prompts) -> None:
         self.changeset_summary = heavy_bot.chat(
-            prompts.render_summarize_changeset(self)
+            prompts.render_summarize_changeset(self), stage="changeset"
         ).message
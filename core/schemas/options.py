@@ -1,10 +1,12 @@
-from fnmatch import fnmatch
-from typing import List, Optional, Tuple
+import re
+from typing import Callable, Iterable, List, Optional, Tuple, TypeVar
 
 from github_action_utils import notice as info
 
 from core.schemas.limits import TokenLimits
 
+T = TypeVar("T")
+
 
 class Options:
     def __init__(
@@ -30,6 +32,7 @@ class Options:
         language: str = "en-US",
         allow_empty_review: bool = False,
         less_spammy: bool = False,
+        review_drafts: bool = True,
         api_base_url_azure: str = "",
         light_model_name_azure: str = "",
         light_model_token_azure: str = "",
@@ -63,6 +66,7 @@ class Options:
         self.heavy_model_port = heavy_model_port
         self.allow_empty_review = allow_empty_review
         self.less_spammy = less_spammy
+        self.review_drafts = review_drafts
         # Azure
         self.api_base_url_azure = (
             [""]
@@ -100,6 +104,7 @@ class Options:
         info(f"heavy_model_port: {self.heavy_model_port}")
         info(f"allow_empty_review: {self.allow_empty_review}")
         info(f"less_spammy: {self.less_spammy}")
+        info(f"review_drafts: {self.review_drafts}")
         info(f"api_base_url_azure: {self.api_base_url_azure}")
         info(f"light_model_name_azure: {self.light_model_name_azure}")
         if self.light_model_token_azure:
@@ -113,12 +118,70 @@ class Options:
             info(f"heavy_model_token_azure: {self.heavy_model_token_azure}")
 
     def check_path(self, path: str) -> bool:
-        ok = self.path_filters.check(path)
-        info(f"checking path: {path} => {ok}")
-        return ok
+        return self.path_filters.check(path)
+
+
+def _translate_segment(segment: str) -> str:
+    # Glob segment to regex, wildcards never cross a "/"
+    regex = ""
+    index = 0
+    while index < len(segment):
+        char = segment[index]
+        index += 1
+        if char == "*":
+            if segment.startswith("*", index):
+                # "**" inside a segment (e.g. "src/**.py") matches across directories
+                while segment.startswith("*", index):
+                    index += 1
+                regex += ".*"
+            else:
+                regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            # A "]" right after "[" or "[!" is part of the class
+            end = index + 1 if segment.startswith("!", index) else index
+            end = segment.find("]", end + 1)
+            if end == -1:
+                regex += "\\["
+                continue
+            content = segment[index:end].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            regex += f"[{content}]"
+            index = end + 1
+        else:
+            regex += re.escape(char)
+    return regex
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    gitignore / minimatch style glob to regex:
+    - "**" as a whole segment matches any number of directories, including none
+    - a pattern without "/" matches a file or directory name at any depth
+    - a pattern matching a directory matches everything below it
+    """
+    anchored = "/" in pattern.rstrip("/")
+    segments = pattern.strip("/").split("/")
+    regex = ""
+    for index, segment in enumerate(segments):
+        last = index == len(segments) - 1
+        if segment == "**":
+            regex += ".*" if last else "(?:.*/)?"
+        else:
+            regex += _translate_segment(segment) + ("" if last else "/")
+    if not anchored:
+        regex = f"(?:.*/)?{regex}"
+    return f"{regex}(?:/.*)?"
 
 
 class PathFilter:
+    """
+    Inclusion and exclusion rules compiled once into two regex alternations,
+    results are memoized per path.
+    """
+
     def __init__(self, rules: str | None = None):
         self.rules: List[Tuple[str, bool]] = []
         if rules is not None:
@@ -130,21 +193,40 @@ class PathFilter:
                     else:
                         self.rules.append((rule, False))  # Inclusion rule
 
+        self._include = self._compile(
+            [rule for rule, exclude in self.rules if not exclude]
+        )
+        self._exclude = self._compile([rule for rule, exclude in self.rules if exclude])
+        self._results: dict[str, bool] = {}
+
+    @staticmethod
+    def _compile(patterns: List[str]) -> re.Pattern | None:
+        if not patterns:
+            return None
+        return re.compile(
+            "|".join(f"(?:{glob_to_regex(pattern)})" for pattern in patterns)
+        )
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{'!' if exclude else ''}{rule}" for rule, exclude in self.rules
+        )
+
     def check(self, path: str) -> bool:
-        if not self.rules:
-            return True
-
-        included = False
-        excluded = False
-        inclusion_rule_exists = False
-
-        for rule, exclude in self.rules:
-            if fnmatch(path, rule):
-                if exclude:
-                    excluded = True
-                else:
-                    included = True
-            if not exclude:
-                inclusion_rule_exists = True
-
-        return (not inclusion_rule_exists or included) and not excluded
+        if path in self._results:
+            return self._results[path]
+
+        ok = (self._include is None or self._include.fullmatch(path) is not None) and (
+            self._exclude is None or self._exclude.fullmatch(path) is None
+        )
+        self._results[path] = ok
+        return ok
+
+    def partition(
+        self, items: Iterable[T], key: Callable[[T], str] = str
+    ) -> Tuple[List[T], List[T]]:
+        # Split items (paths, or anything holding one through key) into (selected, ignored)
+        selected, ignored = [], []
+        for item in items:
+            (selected if self.check(key(item)) else ignored).append(item)
+        return selected, ignored
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import io
 import re
-from typing import TYPE_CHECKING, Iterator, Tuple
+from functools import cached_property
+from typing import TYPE_CHECKING, Iterator, TextIO, Tuple
 
-from box import Box
 from pydantic import BaseModel, Field, computed_field
 
 if TYPE_CHECKING:  # a hack to avoid circular imports, when we ONLY want to type hint
@@ -15,19 +16,187 @@ if TYPE_CHECKING:  # a hack to avoid circular imports, when we ONLY want to type
 from core.schemas.options import Options
 from core.tokenizer import get_token_count
 
+HUNK_HEADER = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Skip annotations for the first 3 and last 3 lines, it's a context line which provided by Github
+SKIP_START = 3
+SKIP_END = 3
+
+
+class Hunk:
+    """
+    One hunk of a unified diff, as offsets into the patch string: nothing is copied
+    until the new / old hunk text is rendered.
+    """
+
+    __slots__ = (
+        "patch",
+        "start",
+        "body_start",
+        "end",
+        "old_start",
+        "old_count",
+        "new_start",
+        "new_count",
+        "has_additions",
+    )
+
+    def __init__(
+        self,
+        patch: str,
+        start: int,
+        body_start: int,
+        old_start: int,
+        old_count: int,
+        new_start: int,
+        new_count: int,
+    ):
+        self.patch = patch
+        self.start = start
+        self.body_start = body_start
+        self.end = len(patch)
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.has_additions = False
+
+    @property
+    def new_end_line(self) -> int:
+        return self.new_start + self.new_count - 1
+
+    def release(self) -> None:
+        # Only the line numbers are kept, the patch string can be freed
+        self.patch = ""
+        self.start = self.body_start = self.end = 0
+
+    @property
+    def old_end_line(self) -> int:
+        return self.old_start + self.old_count - 1
+
+    def __str__(self) -> str:
+        return self.patch[self.start : self.end]
+
+    @property
+    def line_count(self) -> int:
+        # Lines of the body, a trailing newline doesn't start a new line
+        count = self.patch.count("\n", self.body_start, self.end)
+        if self.end > self.body_start and self.patch[self.end - 1] != "\n":
+            count += 1
+        return count
+
+    def line_spans(self) -> Iterator[tuple[int, int]]:
+        position = self.body_start
+        while position < self.end:
+            line_end = self.patch.find("\n", position, self.end)
+            if line_end == -1:
+                yield position, self.end
+                return
+            yield position, line_end
+            position = line_end + 1
+
+    def write(self, out: TextIO) -> None:
+        # Stream the annotated new hunk (new line numbers in front of the lines) and the old hunk
+        patch = self.patch
+        annotate_until = self.line_count - SKIP_END
+        removal_only = not self.has_additions
+
+        out.write("\n---new_hunk---\n```\n")
+        new_line = self.new_start
+        separator = ""
+        for current_line, (start, end) in enumerate(self.line_spans(), start=1):
+            # "\ No newline at end of file" is a marker, not a line of the file
+            if patch.startswith(("-", "\\"), start, end):
+                continue
+            out.write(separator)
+            separator = "\n"
+            if patch.startswith("+", start, end):
+                out.write(f"{new_line}: ")
+                start += 1
+            elif removal_only or (SKIP_START < current_line <= annotate_until):
+                # context line
+                out.write(f"{new_line}: ")
+            out.write(patch[start:end])
+            new_line += 1
+
+        out.write("\n```\n\n---old_hunk---\n```\n")
+        separator = ""
+        for start, end in self.line_spans():
+            if patch.startswith(("+", "\\"), start, end):
+                continue
+            out.write(separator)
+            separator = "\n"
+            if patch.startswith("-", start, end):
+                start += 1
+            out.write(patch[start:end])
+        out.write("\n```\n")
+
+
+def parse_hunks(patch: str | None) -> list[Hunk]:
+    # Single pass over the patch, anything before the first hunk header is ignored
+    if not patch:
+        return []
+
+    hunks = []
+    hunk = None
+    position = 0
+    length = len(patch)
+    while position < length:
+        line_end = patch.find("\n", position)
+        next_position = length if line_end == -1 else line_end + 1
+        if patch.startswith("@@ -", position):
+            match = HUNK_HEADER.match(patch, position)
+            if match:
+                old_count, new_count = match.group(2), match.group(4)
+                if hunk is not None:
+                    hunk.end = position
+                hunk = Hunk(
+                    patch,
+                    start=position,
+                    body_start=next_position,
+                    old_start=int(match.group(1)),
+                    # A count is omitted when it's 1
+                    old_count=1 if old_count is None else int(old_count),
+                    new_start=int(match.group(3)),
+                    new_count=1 if new_count is None else int(new_count),
+                )
+                hunks.append(hunk)
+        elif hunk is not None and patch.startswith("+", position):
+            hunk.has_additions = True
+        position = next_position
+
+    return hunks
+
 
 class Patch(BaseModel):
     start_line: int
     end_line: int
-    patch_str: str
+    # The text is rendered from the hunk on demand, never stored
+    hunk: Hunk = Field(exclude=True)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_hunk(cls, hunk: Hunk) -> Patch:
+        return cls(start_line=hunk.new_start, end_line=hunk.new_end_line, hunk=hunk)
+
+    def write(self, out: TextIO) -> None:
+        self.hunk.write(out)
 
-    @computed_field
     @property
+    def patch_str(self) -> str:
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+    @computed_field
+    @cached_property
     def tokens(self) -> int:
         return get_token_count(self.patch_str)
 
     def __str__(self) -> str:
-        return "\n".join([f"{line}" for line in self.patch_str.split("\n")])
+        return self.patch_str
 
 
 class Patches(BaseModel):
@@ -82,7 +251,8 @@ def pack_patches_with_associated_comments_chains(
     patches_comments_chains: list[Tuple[Patch, CommentChains | str]] = (
         file.compute_patch_associated_comment_chains(commenter)
     )
-    patches_str = ""
+    # Everything is streamed into one buffer, the hunks are rendered straight into it
+    buffer = io.StringIO()
 
     for patch, comment_chains in patches_comments_chains:
         if patches_packed >= patch_packing_limit:
@@ -95,96 +265,18 @@ def pack_patches_with_associated_comments_chains(
         patches_packed += 1
 
         if comment_chains is None:
-            patches_str += f"\n{patch.patch_str}\n"
+            buffer.write("\n")
+            patch.write(buffer)
+            buffer.write("\n")
             continue
 
         if tokens + comment_chains.tokens < options.heavy_token_limits.request_tokens:
-            patches_str += f"\n---comment_chains---\n```\n{comment_chains}\n```\n"
-            patches_str += f"\n{patch.patch_str}\n"
+            buffer.write(f"\n---comment_chains---\n```\n{comment_chains}\n```\n")
+            buffer.write("\n")
+            patch.write(buffer)
+            buffer.write("\n")
             tokens += comment_chains.tokens
 
-        patches_str += "\n---end_change_section---\n"
-
-    return patches_str
-
-
-def split_patch(patch: str) -> list[str]:
-    if patch is None:
-        return []
-    # TODO verify if this function is correct
-    pattern = re.compile(r"(^@@ -(\d+),(\d+) \+(\d+),(\d+) @@).*$", re.MULTILINE)
-
-    result = []
-    last = -1
-    match = pattern.search(patch)
-    while match is not None:
-        if last == -1:
-            last = match.start()
-        else:
-            result.append(patch[last : match.start()])
-            last = match.start()
-        match = pattern.search(patch, match.end())
-
-    if last != -1:
-        result.append(patch[last:])
-
-    return result
-
-
-def patch_start_end_line(patch: str) -> dict[str, dict[str, int]] | None:
-    pattern = r"(^@@ -(\d+),(\d+) \+(\d+),(\d+) @@)"
-    match = re.search(pattern, patch, re.MULTILINE)
-    if match:
-        old_begin = int(match.group(2))
-        old_diff = int(match.group(3))
-        new_begin = int(match.group(4))
-        new_diff = int(match.group(5))
-        return {
-            "old_hunk": {"start_line": old_begin, "end_line": old_begin + old_diff - 1},
-            "new_hunk": {"start_line": new_begin, "end_line": new_begin + new_diff - 1},
-        }
-    else:
-        return None
-
-
-def parse_patch(patch: str, patch_lines: Box):
-
-    old_hunk_lines = []
-    new_hunk_lines = []
-
-    new_line = patch_lines.new_hunk.start_line
-
-    lines = patch.split("\n")[1:]  # Skip the @@ line
-
-    # Remove the last line if it's empty
-    if lines and lines[-1] == "":
-        lines.pop()
-
-    # Skip annotations for the first 3 and last 3 lines, it's a context line which provided by Github
-    skip_start = 3
-    skip_end = 3
-
-    current_line = 0
-
-    removal_only = not any(line.startswith("+") for line in lines)
-
-    for line in lines:
-        current_line += 1
-        if line.startswith("-"):
-            old_hunk_lines.append(line[1:])
-        elif line.startswith("+"):
-            new_hunk_lines.append(f"{new_line}: {line[1:]}")
-            new_line += 1
-        else:
-            # context line
-            old_hunk_lines.append(line)
-            if removal_only or (skip_start < current_line <= len(lines) - skip_end):
-                new_hunk_lines.append(f"{new_line}: {line}")
-            else:
-                new_hunk_lines.append(line)
-            new_line += 1
+        buffer.write("\n---end_change_section---\n")
 
-    return {
-        "old_hunk": "\n".join(old_hunk_lines),
-        "new_hunk": "\n".join(new_hunk_lines),
-    }
+    return buffer.getvalue()
@@ -5,14 +5,13 @@ from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any
 
 from github.Commit import Commit
-from github.Comparison import Comparison
-from github.PaginatedList import PaginatedList
 from github_action_utils import warning
 from pydantic import BaseModel
 
 from core.bots.bot import Bot
 from core.consts import BOT_NAME_NO_TAG, IGNORE_KEYWORD
-from core.github import GITHUB_CONTEXT, REPO
+from core.github import GITHUB_CONTEXT, GITHUB_HANDLES, lazy_commit
+from core.schemas.pr_snapshot import PRDiff, PRSnapshot, SnapshotCommit, get_pr_snapshot
 
 if TYPE_CHECKING:  # a hack to avoid circular imports, when we ONLY want to type hint
     # https://peps.python.org/pep-0563/#runtime-annotation-resolution-and-type-checking
@@ -25,34 +24,37 @@ from core.templates.tags import (
     get_content_within_tags,
     remove_content_within_tags,
 )
+from core.tracing import span, traced
 
 
 @dataclass
 class PRInfo:
+    snapshot: PRSnapshot | None = None
     base_sha: str | None = None
     head_sha: str | None = None
     number: int | None = None
-    target_branch_diff: Comparison | None = None
+    target_branch_diff: PRDiff | None = None
     # Members above are set during fetch_commits
-    commits: PaginatedList[Commit] | None = None
-    incremental_diff: Comparison | None = None
+    commits: list[SnapshotCommit] | None = None
+    incremental_diff: PRDiff | None = None
 
     def __post_init__(self):
-        self.base_sha = GITHUB_CONTEXT.payload.pull_request.base.sha
-        self.head_sha = GITHUB_CONTEXT.payload.pull_request.head.sha
-        self.number = int(GITHUB_CONTEXT.payload.pull_request.number)
-        self.target_branch_diff: Comparison = REPO.compare(self.base_sha, self.head_sha)
-
+        if self.snapshot is None:
+            with span("PRInfo snapshot", "github"):
+                self.snapshot = get_pr_snapshot()
+        self.base_sha = self.snapshot.base_sha
+        self.head_sha = self.snapshot.head_sha
+        self.number = self.snapshot.number
+        self.target_branch_diff = self.snapshot
+
+    @traced("PRInfo.fetch_commits", "github")
     def fetch_commits(self, highest_reviewed_commit_id: str) -> None:
-        self.incremental_diff: Comparison = REPO.compare(
-            highest_reviewed_commit_id,
-            self.head_sha,
-        )
+        self.incremental_diff = self.snapshot.diff_since(highest_reviewed_commit_id)
         self.commits = self.incremental_diff.commits
 
     @property
     def last_commit(self) -> Commit:
-        return self.commits[-1]
+        return lazy_commit(self.commits[-1].sha)
 
 
 class PRDescription(BaseModel):
@@ -87,7 +89,7 @@ class PRDescription(BaseModel):
         # for the tag (marker)
         try:
             # get latest description from PR
-            pr = REPO.get_pull(pull_number)
+            pr = GITHUB_HANDLES.get_pull(pull_number)
             body = pr.body if pr.body else ""
             self.description = self.get_description(body)
 
@@ -118,7 +120,7 @@ class PRDescription(BaseModel):
             return
 
         release_notes_response = heavy_bot.chat(
-            prompts.render_summarize_release_notes(ai_summary)
+            prompts.render_summarize_release_notes(ai_summary), stage="release_notes"
         )
         if release_notes_response.message == "":
             print(
@@ -160,16 +162,7 @@ class ReviewedCommitIds:
 
     @staticmethod
     def get_all_commit_ids(pr_info: PRInfo) -> list[str]:
-        all_commits = []
-        try:
-            pull = REPO.get_pull(pr_info.number)
-            # Get the commits from the pull request:
-            commits = pull.get_commits()
-            return [commit.sha for commit in commits]
-        except Exception as e:
-            print(f"Failed to list commits: {e}")
-
-        return all_commits
+        return pr_info.snapshot.commit_ids
 
     @staticmethod
     def get_reviewed_commit_ids(comment_body: str) -> list[str]:
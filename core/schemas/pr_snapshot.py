@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+from github.Comparison import Comparison
+from github.File import File
+from pydantic import BaseModel
+
+from core.github import GITHUB_CONTEXT, REPO
+
+# Set it to a json file path to reuse the same PR snapshot between runs (debugging, benchmarks).
+# The snapshot is fetched and stored there if the file does not exist yet.
+PR_SNAPSHOT_PATH_ENV = "PR_SNAPSHOT_PATH"
+
+
+class SnapshotFile(BaseModel):
+    filename: str
+    status: str = "modified"
+    additions: int = 0
+    deletions: int = 0
+    patch: str | None = None
+
+    @classmethod
+    def from_github_file(cls, file: File) -> SnapshotFile:
+        return cls(
+            filename=file.filename,
+            status=file.status,
+            additions=file.additions,
+            deletions=file.deletions,
+            patch=file.patch,
+        )
+
+    @property
+    def new_lines(self) -> int:
+        if self.patch is None:
+            return 0
+        # Skip everything before the first hunk header
+        first_hunk = self.patch.find("@@")
+        if first_hunk == -1:
+            return 0
+        return sum(
+            1 for line in self.patch[first_hunk:].split("\n") if line.startswith("+")
+        )
+
+
+class SnapshotCommit(BaseModel):
+    sha: str
+    # Only the first line of the commit message is kept
+    message: str = ""
+
+    @classmethod
+    def from_github_commit(cls, commit) -> SnapshotCommit:
+        # Already part of the comparison, raw_data would fetch every commit once more
+        message = commit.commit.message or ""
+        return cls(sha=commit.sha, message=message.split("\n", 1)[0])
+
+
+class PRDiff(BaseModel):
+    files: list[SnapshotFile] = []
+    commits: list[SnapshotCommit] = []
+
+    @classmethod
+    def from_comparison(cls, comparison: Comparison) -> PRDiff:
+        return cls(
+            files=[SnapshotFile.from_github_file(file) for file in comparison.files],
+            commits=[
+                SnapshotCommit.from_github_commit(commit)
+                for commit in comparison.commits
+            ],
+        )
+
+    @property
+    def commit_ids(self) -> list[str]:
+        return [commit.sha for commit in self.commits]
+
+    def release_patches(self) -> None:
+        for file in self.files:
+            file.patch = None
+
+
+class PRSnapshot(PRDiff):
+    # Everything a run needs to know about the PR, fetched once with a single compare call.
+    # The rest is taken from the event payload.
+    number: int
+    title: str = ""
+    body: str | None = None
+    draft: bool = False
+    base_sha: str
+    head_sha: str
+
+    @classmethod
+    def fetch(cls) -> PRSnapshot:
+        pull_request = GITHUB_CONTEXT.payload.pull_request
+        diff = PRDiff.from_comparison(
+            REPO.compare(pull_request.base.sha, pull_request.head.sha)
+        )
+        return cls(
+            number=int(pull_request.number),
+            title=pull_request.title or "",
+            body=pull_request.body,
+            draft=bool(pull_request.get("draft", False)),
+            base_sha=pull_request.base.sha,
+            head_sha=pull_request.head.sha,
+            files=diff.files,
+            commits=diff.commits,
+        )
+
+    def matches_payload(self) -> bool:
+        # A snapshot saved for another PR or an older push must not be reused
+        pull_request = GITHUB_CONTEXT.payload.pull_request
+        return (
+            self.number == int(pull_request.number)
+            and self.base_sha == pull_request.base.sha
+            and self.head_sha == pull_request.head.sha
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> PRSnapshot:
+        return cls.model_validate_json(Path(path).read_text())
+
+    def save(self, path: str | Path) -> None:
+        Path(path).write_text(self.model_dump_json(indent=2))
+
+    @property
+    def total_new_lines(self) -> int:
+        return sum(file.new_lines for file in self.files)
+
+    def diff_since(self, commit_id: str) -> PRDiff:
+        # The diff from the base is already part of the snapshot, no need to ask GitHub again
+        if commit_id == self.base_sha:
+            return self
+        return PRDiff.from_comparison(REPO.compare(commit_id, self.head_sha))
+
+
+_pr_snapshot: PRSnapshot | None = None
+_pr_snapshot_lock = threading.Lock()
+
+
+def get_pr_snapshot() -> PRSnapshot:
+    global _pr_snapshot
+    with _pr_snapshot_lock:
+        if _pr_snapshot is not None:
+            return _pr_snapshot
+
+        snapshot_path = os.environ.get(PR_SNAPSHOT_PATH_ENV)
+        if snapshot_path and Path(snapshot_path).exists():
+            print(f"Loading PR snapshot from {snapshot_path}")
+            snapshot = PRSnapshot.load(snapshot_path)
+            if snapshot.matches_payload():
+                _pr_snapshot = snapshot
+                return _pr_snapshot
+            print(
+                f"PR snapshot {snapshot_path} is for PR #{snapshot.number} at {snapshot.head_sha}, "
+                "fetching it again"
+            )
+
+        _pr_snapshot = PRSnapshot.fetch()
+        print(
+            f"PR snapshot: {len(_pr_snapshot.files)} files, {len(_pr_snapshot.commits)} commits"
+        )
+        if snapshot_path:
+            _pr_snapshot.save(snapshot_path)
+            print(f"PR snapshot saved to {snapshot_path}")
+        return _pr_snapshot
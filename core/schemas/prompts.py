@@ -2,11 +2,10 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from string import Template
-from typing import Final, List, Optional
+from typing import Any, Final, List, Mapping, Optional
 
-from github.File import File
 from github.IssueComment import IssueComment
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 from core.commenter import GithubCommentManager
 from core.consts import (
@@ -20,6 +19,9 @@ from core.github import GITHUB_CONTEXT
 from core.schemas.comment_reply import CommentReply
 from core.schemas.files import AiSummary, FilteredFile
 from core.schemas.pr_common import PRDescription, ReviewedCommitIds
+from core.schemas.pr_snapshot import SnapshotFile
+from core.schemas.render_context import RenderContext
+from core.templates.compiled import CompiledTemplate
 from core.templates.prompts import (
     COMMENT,
     REVIEW_FILE_DIFF,
@@ -43,52 +45,61 @@ class Prompts(BaseModel):
     review_file_diff: Final[Template] = REVIEW_FILE_DIFF
     comment: Final[Template] = COMMENT
 
-    def _render(self, content: str | Template, replacements: dict) -> str:
+    _compiled: dict[str, CompiledTemplate] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        # Composed and parsed once, hundreds of prompts are rendered per PR
+        self._compiled = {
+            "summarize_file_diff": CompiledTemplate(self.summarize_file_diff),
+            "summarize_file_diff_triage": CompiledTemplate(
+                self.summarize_file_diff, self.triage_file_diff
+            ),
+            "summarize_changesets": CompiledTemplate(self.summarize_changesets),
+            "summarize_changeset": CompiledTemplate(
+                self.summarize_prefix, self.summarize
+            ),
+            "summarize_short": CompiledTemplate(
+                self.summarize_prefix, self.summarize_short
+            ),
+            "summarize_release_notes": CompiledTemplate(
+                self.summarize_prefix, self.summarize_release_notes
+            ),
+            "review_file_diff": CompiledTemplate(self.review_file_diff),
+            "comment": CompiledTemplate(self.comment),
+        }
+
+    def _render(self, name: str, replacements: Mapping[str, Any]) -> str:
+        content = self._compiled[name]
         if not content:
             return ""
-        return content.safe_substitute(replacements)
-
-    def ensure_template(self, maybe_str: str | Template) -> Template:
-        if isinstance(maybe_str, Template):
-            return maybe_str
-        else:
-            return Template(str(maybe_str))
-
-    def _safe_add_template(
-        self, template_1: str | Template, template_2: str | Template
-    ) -> Template:
-        return Template(
-            self.ensure_template(template_1).template
-            + self.ensure_template(template_2).template
-        )
+        return content.render(replacements)
 
     def render_summarize_file_diff(
         self, file: FilteredFile, review_simple_changes: bool
     ) -> str:
-        prompt = self.summarize_file_diff
+        name = "summarize_file_diff"
         if not review_simple_changes:
-            prompt = self._safe_add_template(prompt, self.triage_file_diff)
+            name = "summarize_file_diff_triage"
 
-        return self._render(prompt, replacements=file.model_dump())
+        return self._render(name, replacements=RenderContext(file))
 
     def render_summarize_raw(self, ai_summary: AiSummary) -> str:
         return self._render(
-            self.summarize_changesets, replacements=ai_summary.model_dump()
+            "summarize_changesets", replacements=RenderContext(ai_summary)
         )
 
     def render_summarize_changeset(self, ai_summary: AiSummary) -> str:
-        prompt = self._safe_add_template(self.summarize_prefix, self.summarize)
-        return self._render(prompt, replacements=ai_summary.model_dump())
+        return self._render(
+            "summarize_changeset", replacements=RenderContext(ai_summary)
+        )
 
     def render_summarize_short(self, ai_summary: AiSummary) -> str:
-        prompt = self._safe_add_template(self.summarize_prefix, self.summarize_short)
-        return self._render(prompt, replacements=ai_summary.model_dump())
+        return self._render("summarize_short", replacements=RenderContext(ai_summary))
 
     def render_summarize_release_notes(self, ai_summary: AiSummary) -> str:
-        prompt = self._safe_add_template(
-            self.summarize_prefix, self.summarize_release_notes
+        return self._render(
+            "summarize_release_notes", replacements=RenderContext(ai_summary)
         )
-        return self._render(prompt, replacements=ai_summary.model_dump())
 
     def render_comment(
         self,
@@ -97,32 +108,27 @@ class Prompts(BaseModel):
         ai_summary: AiSummary | None,
         exclude: str | None = None,
     ) -> str:
-        replacements = {}
-        if comment_reply is not None:
-            replacements = {**replacements, **comment_reply.model_dump()}
-        if comment_reply.file is not None:
-            exclude = {exclude} if exclude is not None else set()
-            replacements = {
-                **replacements,
-                **comment_reply.file.model_dump(exclude=exclude),
-            }
-        if ai_summary is not None:
-            replacements = {**replacements, **ai_summary.model_dump()}
-        if pr_description is not None:
-            replacements = {**replacements, **pr_description.model_dump()}
-
-        return self._render(self.comment, replacements=replacements)
+        replacements = RenderContext(
+            comment_reply.model_dump() if comment_reply is not None else None,
+            comment_reply.file if comment_reply is not None else None,
+            ai_summary,
+            pr_description,
+            exclude={exclude} if exclude is not None else frozenset(),
+        )
+
+        return self._render("comment", replacements=replacements)
 
     def render_review_file_diff(
         self, file: FilteredFile, ai_summary: AiSummary, pr_description: PRDescription
     ) -> str:
-        replacements = {
-            **file.model_dump(),
-            **file.patches.model_dump(by_alias=True),
-            **ai_summary.model_dump(),
-            **pr_description.model_dump(),
-        }
-        return self._render(self.review_file_diff, replacements=replacements)
+        replacements = RenderContext(
+            file,
+            ai_summary,
+            pr_description,
+            # Patches are only needed packed
+            patches=file.patches.items_str,
+        )
+        return self._render("review_file_diff", replacements=replacements)
 
 
 class StatusMessagePrompt(BaseModel):
@@ -190,7 +196,7 @@ class StatusMessagePrompt(BaseModel):
         )
         return self.summary_message
 
-    def render_files_ignored(self, filter_ignored_files: List[File]) -> str:
+    def render_files_ignored(self, filter_ignored_files: List[SnapshotFile]) -> str:
         files_ignored_list = "\n* ".join(
             [file.filename for file in filter_ignored_files]
         )
@@ -254,7 +260,7 @@ class StatusMessagePrompt(BaseModel):
         self,
         highest_reviewed_commit_id: str,
         selected_files: List[FilteredFile],
-        ignored_files: List[File],
+        ignored_files: List[SnapshotFile],
     ) -> StatusMessagePrompt:
         # TODO do it better, need to move out template strings from the class
         self.render_commits_summary(
@@ -346,7 +352,7 @@ class ExistingSummarizedComment:
         self.ai_summary = ai_summary
 
     def status_message_in_progress(
-        self, filtered_files: list[FilteredFile], ignored_files: list[File]
+        self, filtered_files: list[FilteredFile], ignored_files: list[SnapshotFile]
     ) -> str:
         init_msg = StatusMessagePrompt().init(
             self.reviewed_commits_ids.highest_reviewed_commit_id,
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any, Iterator, Mapping
+
+from pydantic import BaseModel
+
+RenderSource = BaseModel | Mapping[str, Any]
+
+# Per source type, the field names of models or None for mappings.
+# isinstance() against the pydantic metaclass is slow enough to show up per render
+_MODEL_KEYS: dict[type, frozenset[str] | None] = {}
+
+
+def _model_keys(source_type: type) -> frozenset[str] | None:
+    if source_type not in _MODEL_KEYS:
+        _MODEL_KEYS[source_type] = (
+            frozenset((*source_type.model_fields, *source_type.model_computed_fields))
+            if issubclass(source_type, BaseModel)
+            else None
+        )
+    return _MODEL_KEYS[source_type]
+
+
+class RenderContext(Mapping[str, Any]):
+    """
+    Substitution fields of the prompt templates, read from the models on lookup.
+    Nothing is serialized, copied or validated, and only the placeholders of the rendered
+    template are looked up. Later sources take precedence, like merging their model_dump().
+    """
+
+    def __init__(
+        self,
+        *sources: RenderSource | None,
+        exclude: frozenset[str] | set[str] = frozenset(),
+        **fields: Any,
+    ):
+        self._sources = [
+            (source, _model_keys(type(source)))
+            for source in reversed(sources)
+            if source is not None
+        ]
+        self._exclude = exclude
+        self._fields = fields
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._fields:
+            return self._fields[key]
+        if key in self._exclude:
+            raise KeyError(key)
+        for source, model_keys in self._sources:
+            if model_keys is None:
+                if key in source:
+                    return source[key]
+            elif key in model_keys:
+                return getattr(source, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        keys = dict.fromkeys(self._fields)
+        for source, model_keys in reversed(self._sources):
+            keys.update(
+                (key, None)
+                for key in (source if model_keys is None else model_keys)
+                if key not in self._exclude
+            )
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
 import re
+import threading
 from dataclasses import dataclass, field
 from typing import Any
 
-from github.File import File
 from pydantic import BaseModel
 
 from core.bots.bot import AiResponse
 from core.schemas.files import FilteredFile
 from core.schemas.options import Options
+from core.schemas.pr_snapshot import SnapshotFile
 from core.schemas.prompts import StatusMessagePrompt
 from core.templates.tags import TAGS
 from core.utils import sanitize_response
@@ -67,12 +68,16 @@ class ReviewSummary:
     skipped: list[str] = field(default_factory=list)
     lgtm: list[int] = field(default_factory=list)
     done: list[int] = field(default_factory=list)
+    # Files are reviewed concurrently, parsing a response rewrites the buffer
+    lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
 
     def get_status_message_finished_review(
         self,
         highest_reviewed_commit_id: str,
         filtered_files: list[FilteredFile],
-        ignored_files: list[File],
+        ignored_files: list[SnapshotFile],
         skipped_files: list[str],
         summaries_failed: list[str],
     ) -> str:
@@ -1,11 +1,7 @@
+from functools import cached_property
 from types import SimpleNamespace
 
 from core.consts import ACTION_INPUTS, BOT_NAME_NO_TAG
-from core.utils import get_input_default
-
-COMMENT_GREETING = (
-    f"{get_input_default(ACTION_INPUTS, key='bot_icon')} {BOT_NAME_NO_TAG}"
-)
 
 COMMENT_TAG = f"<!-- This is an auto-generated comment by {BOT_NAME_NO_TAG} -->"
 
@@ -42,8 +38,17 @@ SHORT_SUMMARY_END_TAG = (
 COMMIT_ID_START_TAG = "<!-- commit_ids_reviewed_start -->"
 COMMIT_ID_END_TAG = "<!-- commit_ids_reviewed_end -->"
 
-TAGS = SimpleNamespace(
-    COMMENT_GREETING=COMMENT_GREETING,
+
+class _Tags(SimpleNamespace):
+    @cached_property
+    def COMMENT_GREETING(self) -> str:
+        # Depends on the bot_icon input, read on first use rather than at import
+        from core.utils import get_input_default
+
+        return f"{get_input_default(ACTION_INPUTS, key='bot_icon')} {BOT_NAME_NO_TAG}"
+
+
+TAGS = _Tags(
     COMMENT_TAG=COMMENT_TAG,
     COMMENT_REPLY_TAG=COMMENT_REPLY_TAG,
     SUMMARIZE_TAG=SUMMARIZE_TAG,
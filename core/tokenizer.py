@@ -1,9 +1,113 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import mmap
+import os
+import threading
+from pathlib import Path
+
 import tiktoken
 
+ENCODING_NAME = "cl100k_base"
+# Same file and hash tiktoken downloads from openaipublic.blob.core.windows.net
+BPE_HASH = "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7"
+TOKENIZER_PATH_ENV = "PR_REVIEWER_TOKENIZER_PATH"
+BUNDLED_BPE_PATH = Path(__file__).resolve().parent / "assets" / "cl100k_base.tiktoken"
+
+# From tiktoken_ext.openai_public.cl100k_base(), which would download the file itself
+PAT_STR = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+SPECIAL_TOKENS = {
+    "<|endoftext|>": 100257,
+    "<|fim_prefix|>": 100258,
+    "<|fim_middle|>": 100259,
+    "<|fim_suffix|>": 100260,
+    "<|endofprompt|>": 100276,
+}
+
+
+def bpe_path() -> Path | None:
+    path = os.environ.get(TOKENIZER_PATH_ENV)
+    if path:
+        return Path(path)
+    if BUNDLED_BPE_PATH.exists():
+        return BUNDLED_BPE_PATH
+    return None
+
+
+def load_bpe_ranks(
+    path: Path, expected_hash: str | None = BPE_HASH
+) -> dict[bytes, int]:
+    # Mapped rather than read, the file is hashed and split without a copy of its 1.7 MB
+    with open(path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        if expected_hash is not None:
+            digest = hashlib.sha256(data).hexdigest()
+            if digest != expected_hash:
+                raise ValueError(f"{path} has hash {digest}, expected {expected_hash}")
+        ranks = {}
+        for line in iter(data.readline, b""):
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+        return ranks
+
+
+def load_encoding() -> tiktoken.Encoding:
+    path = bpe_path()
+    if path is not None:
+        try:
+            return tiktoken.Encoding(
+                name=ENCODING_NAME,
+                pat_str=PAT_STR,
+                mergeable_ranks=load_bpe_ranks(path),
+                special_tokens=SPECIAL_TOKENS,
+            )
+        except Exception as e:
+            print(f"Failed to load tokenizer from {path}: {e}, using tiktoken's own")
+    # Downloads the file unless TIKTOKEN_CACHE_DIR already holds it
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+class _Tokenizer:
+    """
+    The encoding is built once, either by warm_up() on a background thread while the
+    action sets up, or by the first caller. Callers arriving meanwhile wait for that build.
+    """
+
+    def __init__(self):
+        self._encoding: tiktoken.Encoding | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        if self._encoding is None:
+            with self._lock:
+                if self._encoding is None:
+                    self._encoding = load_encoding()
+        return self._encoding
+
+    def warm_up(self) -> None:
+        def load() -> None:
+            try:
+                self.encoding
+            except Exception as e:
+                # The first get_token_count() tries again and raises
+                print(f"Failed to warm up the tokenizer: {e}")
+
+        threading.Thread(target=load, name="tokenizer-warm-up", daemon=True).start()
+
+
+TOKENIZER = _Tokenizer()
+
+
+def warm_up_tokenizer() -> None:
+    TOKENIZER.warm_up()
+
 
 def encode(input_str: str) -> list[int]:
-    encoding = tiktoken.get_encoding("cl100k_base")
-    return encoding.encode(input_str)
+    return TOKENIZER.encoding.encode(input_str)
 
 
 def get_token_count(input_str: str) -> int:
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+TRACE_PATH_ENV = "PR_REVIEWER_TRACE_PATH"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    # Microseconds since the tracer started
+    start: float
+    end: float = 0.0
+    thread_id: int = 0
+    args: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def _busy_time(spans: list[Span]) -> float:
+    # Wall time covered by at least one of the spans
+    busy = 0.0
+    current_start = current_end = None
+    for span in sorted(spans, key=lambda span: span.start):
+        if current_end is None or span.start > current_end:
+            if current_end is not None:
+                busy += current_end - current_start
+            current_start, current_end = span.start, span.end
+        else:
+            current_end = max(current_end, span.end)
+    if current_end is not None:
+        busy += current_end - current_start
+    return busy
+
+
+class Tracer:
+    """
+    Spans of a run kept in memory, exported once at the end as Chrome trace events
+    (chrome://tracing, https://ui.perfetto.dev) and as a markdown table for the step summary.
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._spans: list[Span] = []
+        self._threads: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "", **args: Any) -> Iterator[Span]:
+        thread = threading.current_thread()
+        span = Span(
+            name=name,
+            category=category,
+            start=self._now(),
+            thread_id=thread.ident or 0,
+            args=args,
+        )
+        try:
+            yield span
+        except BaseException as e:
+            span.args["error"] = repr(e)
+            raise
+        finally:
+            span.end = self._now()
+            with self._lock:
+                self._spans.append(span)
+                self._threads.setdefault(span.thread_id, thread.name)
+
+    @property
+    def spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def chrome_trace(self) -> dict[str, Any]:
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self._spans)
+            threads = dict(self._threads)
+        events = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": thread_id,
+                "args": {"name": thread_name},
+            }
+            for thread_id, thread_name in threads.items()
+        ]
+        events.extend(
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round(span.start, 1),
+                "dur": round(span.duration, 1),
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {key: str(value) for key, value in span.args.items()},
+            }
+            for span in spans
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str | Path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary_table(self) -> str:
+        """
+        Per span name: count, total and longest duration, the share of the run it kept busy,
+        and its mean concurrency (total duration / busy time, 1.0 when nothing overlaps).
+        """
+        spans = self.spans
+        if not spans:
+            return ""
+        run_time = max(span.end for span in spans) - min(span.start for span in spans)
+        by_name: dict[str, list[Span]] = defaultdict(list)
+        for span in spans:
+            by_name[span.name].append(span)
+
+        lines = [
+            "| Span | Count | Total (s) | Max (s) | Busy (% of run) | Concurrency |",
+            "| --- | ---: | ---: | ---: | ---: | ---: |",
+        ]
+        rows = []
+        for name, named_spans in by_name.items():
+            total = sum(span.duration for span in named_spans)
+            busy = _busy_time(named_spans)
+            rows.append(
+                (
+                    busy,
+                    f"| {name} | {len(named_spans)} | {total / 1e6:.2f} "
+                    f"| {max(span.duration for span in named_spans) / 1e6:.2f} "
+                    f"| {100 * busy / run_time if run_time else 0:.0f}% "
+                    f"| {total / busy if busy else 1:.1f} |",
+                )
+            )
+        lines.extend(row for _, row in sorted(rows, key=lambda row: -row[0]))
+        return (
+            f"#### Trace ({run_time / 1e6:.1f} s, {len(spans)} spans)\n\n"
+            + "\n".join(lines)
+            + "\n"
+        )
+
+    def export(self) -> None:
+        # Trace file where asked (or in the runner temp dir), table in the step summary
+        trace_path = os.environ.get(TRACE_PATH_ENV)
+        if not trace_path and os.environ.get("RUNNER_TEMP"):
+            trace_path = os.path.join(
+                os.environ["RUNNER_TEMP"], "pr-reviewer-trace.json"
+            )
+        try:
+            if trace_path:
+                self.write_chrome_trace(trace_path)
+                print(f"Trace written to {trace_path}")
+            step_summary = os.environ.get("GITHUB_STEP_SUMMARY")
+            table = self.summary_table()
+            if step_summary and table:
+                with open(step_summary, "a") as f:
+                    f.write(table)
+        except Exception as e:
+            print(f"Failed to export the trace: {e}")
+
+
+TRACER = Tracer()
+
+
+def span(name: str, category: str = "", **args: Any):
+    return TRACER.span(name, category, **args)
+
+
+def traced(
+    name: str, category: str = "", **span_args: Callable[..., Any]
+) -> Callable[[F], F]:
+    # Whole function calls as spans, span_args are computed from the call arguments
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with TRACER.span(
+                name,
+                category,
+                **{key: arg(*args, **kwargs) for key, arg in span_args.items()},
+            ):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
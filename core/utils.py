@@ -1,14 +1,18 @@
+import concurrent.futures
 import contextlib
 import re
 import warnings
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterable, Iterator, TypeVar
 
 import requests
 from box import Box
 from github.PullRequestComment import PullRequestComment
 from urllib3.exceptions import InsecureRequestWarning
 
-from core.github import GITHUB_CONTEXT, REPO
+from core.schemas.pr_snapshot import get_pr_snapshot
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def get_input_default(inputs: Dict[str, Any], key: str) -> str:
@@ -29,6 +33,11 @@ def string_to_bool(value: str) -> bool:
         raise ValueError(f"Invalid value: {value}")
 
 
+def service_url(url: str) -> str:
+    # api_base_url(_azure) entries are hosts served over https, local stand-ins can give a scheme
+    return url if "://" in url else f"https://{url}"
+
+
 @contextlib.contextmanager
 def no_ssl_verification():
     old_merge_environment_settings = requests.Session.merge_environment_settings
@@ -63,33 +72,33 @@ def no_ssl_verification():
                 pass
 
 
+def bounded_parallel_map(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int,
+    max_pending: int | None = None,
+) -> Iterator[R]:
+    # Run fn over items on a thread pool and yield the results as they complete.
+    # Items are pulled lazily and at most max_pending are in flight (backpressure),
+    # so memory depends on the window, not on the number of items.
+    max_pending = max_pending or 2 * max_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for item in items:
+            if len(pending) >= max_pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(fn, item))
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
 def get_total_new_lines():
-    pull = REPO.get_pull(GITHUB_CONTEXT.payload.pull_request.number)
-
-    # Initialize a variable to store the total number of new lines added
-    total_new_lines = 0
-
-    # Iterate over the files in the pull request
-    for file in pull.get_files():
-        # Get the diff hunks for the file
-        if file.patch is None:
-            print(f"Skipped: {file.filename} has no patch")
-            continue
-        diff_hunks = file.patch.split("@@")[1:]
-
-        # Iterate over the diff hunks
-        for diff_hunk in diff_hunks:
-            # Split the diff hunk into lines
-            lines = diff_hunk.split("\n")
-
-            # Iterate over the lines in the diff hunk
-            for line in lines:
-                # If the line starts with a "+", increment the total number of new lines added
-                if line.startswith("+"):
-                    total_new_lines += 1
-
-    # Return the total number of new lines added
-    return total_new_lines
+    # Total number of new lines added, computed from the shared PR snapshot
+    return get_pr_snapshot().total_new_lines
 
 
 def sanitize_code_block(comment: str, code_block_label: str) -> str:
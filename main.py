@@ -9,14 +9,18 @@ from github_action_utils import error
 from github_action_utils import notice
 from github_action_utils import notice as warning
 
-from core.bots.bot_hf import HFBot, HFOptions
-from core.bots.bot_mistral import MistralBot, MistralOptions
-from core.consts import ACTION_INPUTS, PR_LINES_LIMIT
+from core.bots.factory import BotFactory
+from core.bots.metrics import LLM_METRICS
+from core.consts import ACTION_INPUTS
+from core.github.github import GITHUB_SCHEDULER, HTTP_CACHE
 from core.review.code import code_review
 from core.review.comment import handle_review_comment
+from core.review.gating import PULL_REQUEST_EVENTS, evaluate_gates
 from core.schemas.options import Options
 from core.schemas.prompts import Prompts
-from core.utils import get_input_default, get_total_new_lines, string_to_bool
+from core.tokenizer import warm_up_tokenizer
+from core.tracing import TRACER, span
+from core.utils import get_input_default, string_to_bool
 
 # Entry point of the application.
 # This function is responsible for running the code review process based on the provided options and prompts.
@@ -51,6 +55,15 @@ def debug_context():
 
 
 def run():
+    # Builds the tokenizer while options, bots and GitHub state are set up
+    warm_up_tokenizer()
+    with span("run"):
+        _run()
+    TRACER.export()
+    LLM_METRICS.export(extra=GITHUB_SCHEDULER.report())
+
+
+def _run():
     try:
         options = Options(
             debug=string_to_bool(get_input_default(ACTION_INPUTS, key="debug")),
@@ -88,6 +101,9 @@ def run():
             less_spammy=string_to_bool(
                 get_input_default(ACTION_INPUTS, key="less_spammy")
             ),
+            review_drafts=string_to_bool(
+                get_input_default(ACTION_INPUTS, key="review_drafts")
+            ),
             api_base_url_azure=get_input_default(
                 ACTION_INPUTS, key="api_base_url_azure"
             ),
@@ -114,79 +130,30 @@ def run():
             ),
         )
 
-        # Create two bots, one for summary and one for review
-
-        try:
-            light_bot_azure = None
-            if options.light_model_token_azure:
-                light_bot_azure = MistralBot(
-                    options,
-                    MistralOptions(
-                        options.light_model_name_azure, options.light_token_limits_azure
-                    ),
-                    api_key=options.light_model_token_azure,
-                    base_url=options.api_base_url_azure[0],
-                )
-            light_bot = HFBot(
-                options,
-                HFOptions(options.light_model_name, options.light_token_limits),
-                back_up_bot=light_bot_azure,
-            )
-
-        except Exception as e:
-            warning(
-                f"Skipped: failed to create summary bot {options.light_model_name}: {e}, "
-                f"backtrace: {e.__traceback__}"
-            )
-            return
-
-        try:
-            heavy_bot_azure = None
-            if options.heavy_model_token_azure:
-                heavy_bot_azure = MistralBot(
-                    options,
-                    MistralOptions(
-                        options.heavy_model_name_azure, options.heavy_token_limits_azure
-                    ),
-                    api_key=options.heavy_model_token_azure,
-                    base_url=options.api_base_url_azure[1],
-                )
-            heavy_bot = HFBot(
-                options,
-                HFOptions(options.heavy_model_name, options.heavy_token_limits),
-                back_up_bot=heavy_bot_azure,
-            )
-
-        except Exception as e:
-            warning(
-                f"Skipped: failed to create review bot {options.heavy_model_name}:"
-                f" {e}, backtrace: {str(e.__traceback__)}"
-            )
-            return
-
-        numbers_new_lines = get_total_new_lines()
-        print("Number of new lines in PR: ", numbers_new_lines)
+        # Bots are built on first use: skipped runs need none, replies only the heavy one
+        bots = BotFactory(options)
+        light_bot = bots.light_bot()
+        heavy_bot = bots.heavy_bot()
 
         try:
-            # check if the event is pull_request
-            event_name = os.getenv("GITHUB_EVENT_NAME")
-            if event_name in ("pull_request", "pull_request_target"):
-
-                if numbers_new_lines > PR_LINES_LIMIT:
-                    warning("PR is too large, skipping review process.")
-                    return
-
-                code_review(light_bot, heavy_bot, options, prompts)
-            elif event_name == "pull_request_review_comment":
-                handle_review_comment(heavy_bot, options, prompts)
-            else:
-                warning(
-                    "Skipped: this action only works on push events or pull_request"
-                )
+            # Early exits from the event payload, before any request to GitHub
+            if evaluate_gates(options).proceed:
+                # Other events are stopped by the gates
+                if os.getenv("GITHUB_EVENT_NAME") in PULL_REQUEST_EVENTS:
+                    code_review(light_bot, heavy_bot, options, prompts)
+                else:
+                    handle_review_comment(heavy_bot, options, prompts)
         except Exception as e:
             #  TODO must be set fail
             error(f"Failed to run: {str(e)}, backtrace: {traceback.format_exc()}")
 
+        if HTTP_CACHE is not None:
+            notice(f"GitHub http cache: {HTTP_CACHE.stats}")
+        notice(
+            f"GitHub requests: {GITHUB_SCHEDULER.metrics}, "
+            f"rate limit: {GITHUB_SCHEDULER.budget}"
+        )
+
     except Exception as e:
         warning(f"Unhandled exception: {str(e)}, backtrace: {e.__traceback__}")
 
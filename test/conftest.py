@@ -0,0 +1,14 @@
+import os
+from pathlib import Path
+
+# core.github builds the action context and the repository handle at import, from the
+# same variables as a run. Nothing is requested from GitHub.
+TEST_FOLDER = Path(__file__).resolve().parent
+
+os.environ.setdefault("GITHUB_REPOSITORY", "Stellantis-ADX/pr-reviewer-ai")
+os.environ.setdefault("GITHUB_API_URL", "http://127.0.0.1:9")
+os.environ.setdefault("GITHUB_EVENT_NAME", "pull_request")
+os.environ.setdefault(
+    "GITHUB_EVENT_PATH", str(TEST_FOLDER / "github_event_path_mock_pull_request.json")
+)
+os.environ.setdefault("GITHUB_TOKEN", "test")
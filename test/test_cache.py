@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from core.github.cache import MemoizedLoader
+
+THREADS = 16
+
+
+def run_threads(target, count: int = THREADS) -> list[threading.Thread]:
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def join(threads: list[threading.Thread]) -> None:
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+
+def test_concurrent_gets_fetch_once():
+    loader = MemoizedLoader()
+    calls = []
+    start = threading.Barrier(THREADS)
+    results = []
+
+    def fetch():
+        calls.append(1)
+        # Long enough for every thread to ask while it's in flight
+        time.sleep(0.2)
+        return object()
+
+    def get():
+        start.wait()
+        results.append(loader.get("pull", fetch))
+
+    join(run_threads(get))
+
+    assert len(calls) == 1
+    assert len(results) == THREADS
+    assert all(result is results[0] for result in results)
+    assert loader.get("pull", fetch) is results[0]
+    assert len(calls) == 1
+
+
+def test_failed_load_reaches_all_waiters_and_is_not_cached():
+    loader = MemoizedLoader()
+    calls = []
+    release = threading.Event()
+    errors = []
+
+    def failing_fetch():
+        calls.append(1)
+        release.wait(timeout=5)
+        raise ValueError("502 Bad Gateway")
+
+    def get():
+        try:
+            loader.get("pull", failing_fetch)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = run_threads(get)
+    # Let every thread join the load in flight before it fails
+    time.sleep(0.2)
+    release.set()
+    join(threads)
+
+    assert len(calls) == 1
+    assert len(errors) == THREADS
+    assert all(error is errors[0] for error in errors)
+    assert loader.peek("pull") is None
+    # The next call loads again
+    assert loader.get("pull", lambda: "loaded") == "loaded"
+
+
+def test_invalidate_during_load_does_not_store_stale_value():
+    loader = MemoizedLoader()
+    loading = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def slow_fetch():
+        loading.set()
+        release.wait(timeout=5)
+        return "stale"
+
+    threads = run_threads(lambda: results.append(loader.get("pull", slow_fetch)), 1)
+    assert loading.wait(timeout=5)
+    loader.invalidate("pull")
+    release.set()
+    join(threads)
+
+    # The caller still gets what it asked for, it's just not kept
+    assert results == ["stale"]
+    assert loader.peek("pull") is None
+    assert loader.get("pull", lambda: "fresh") == "fresh"
+
+
+@pytest.mark.parametrize("key", [None, "pull"])
+def test_invalidate_all_or_one_key_during_load(key):
+    loader = MemoizedLoader()
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_fetch():
+        loading.set()
+        release.wait(timeout=5)
+        return "stale"
+
+    threads = run_threads(lambda: loader.get("pull", slow_fetch), 1)
+    assert loading.wait(timeout=5)
+    loader.invalidate(key)
+    release.set()
+    join(threads)
+
+    assert loader.peek("pull") is None
+
+
+def test_update_unloaded_key_is_noop():
+    loader = MemoizedLoader()
+    updates = []
+
+    def updater(value):
+        updates.append(value)
+        return value + ["comment"]
+
+    loader.update("comments", updater)
+    assert updates == []
+    assert loader.peek("comments") is None
+
+    loader.get("comments", lambda: [])
+    loader.update("comments", updater)
+    assert updates == [[]]
+    assert loader.peek("comments") == ["comment"]
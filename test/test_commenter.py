@@ -0,0 +1,52 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from core.commenter import GithubCommentManager
+from core.consts import DISMISSAL_MESSAGE
+from core.github import GITHUB_HANDLES
+from core.github.review_threads import ReviewThread
+
+REVIEW_ID = 7
+
+
+def comment(comment_id: int, review_id: int, deleted: list[int]) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=comment_id,
+        pull_request_review_id=review_id,
+        delete=lambda: deleted.append(comment_id),
+    )
+
+
+def test_less_spammy_cleanup_keeps_only_threads_with_replies(monkeypatch):
+    deleted = []
+    edits = []
+    review = SimpleNamespace(
+        id=REVIEW_ID,
+        user=SimpleNamespace(type="Bot"),
+        body="review",
+        submitted_at=datetime(2024, 1, 1),
+        edit=lambda body: edits.append(body),
+    )
+    threads = [
+        ReviewThread("a", "a.py", comments=[comment(1, REVIEW_ID, deleted)]),
+        # Resolved or not, the thread of the last review goes
+        ReviewThread(
+            "b", "a.py", is_resolved=True, comments=[comment(2, REVIEW_ID, deleted)]
+        ),
+        ReviewThread(
+            "c",
+            "a.py",
+            comments=[comment(3, REVIEW_ID, deleted), comment(4, 99, deleted)],
+        ),
+        # Started by an older review
+        ReviewThread("d", "a.py", comments=[comment(5, 1, deleted)]),
+    ]
+    monkeypatch.setattr(GITHUB_HANDLES, "get_reviews", lambda pull_number: [review])
+    monkeypatch.setattr(
+        GITHUB_HANDLES, "get_review_threads", lambda pull_number: threads
+    )
+
+    GithubCommentManager().dismiss_review_and_remove_comments(1)
+
+    assert edits == [DISMISSAL_MESSAGE]
+    assert sorted(deleted) == [1, 2]
@@ -0,0 +1,51 @@
+import pytest
+
+from core.github import GITHUB_HANDLES
+from core.schemas.files import MAX_BYTES_PER_TOKEN, FileContent, FilteredFile
+from core.schemas.patch import Patch, Patches, parse_hunks
+
+
+@pytest.fixture
+def file_content(monkeypatch):
+    fetched = []
+    content = FileContent("a.py", ref="base")
+
+    def fetch():
+        fetched.append(content.filename)
+        return "value = 1\n"
+
+    monkeypatch.setattr(content, "_fetch", fetch)
+    return content, fetched
+
+
+def test_too_large_file_is_not_downloaded(monkeypatch, file_content):
+    content, fetched = file_content
+    monkeypatch.setattr(
+        GITHUB_HANDLES,
+        "get_blob_sizes",
+        lambda ref: {"a.py": 1000 * MAX_BYTES_PER_TOKEN + 1},
+    )
+    assert not content.fits(1000)
+    assert fetched == []
+
+
+@pytest.mark.parametrize("sizes", [{"a.py": 10}, {}])
+def test_file_is_counted_when_it_may_fit(monkeypatch, file_content, sizes):
+    content, fetched = file_content
+    monkeypatch.setattr(GITHUB_HANDLES, "get_blob_sizes", lambda ref: sizes)
+    assert content.fits(1000)
+    assert fetched == ["a.py"]
+
+
+def test_released_file_keeps_only_line_ranges():
+    patch = "@@ -1,3 +1,4 @@\n a\n-b\n+c\n+d\n e"
+    file = FilteredFile(
+        filename="a.py",
+        file_content=FileContent("a.py", ref="base"),
+        file_diff=patch,
+        patches=Patches(items=[Patch.from_hunk(hunk) for hunk in parse_hunks(patch)]),
+    )
+    file.release()
+    assert file.file_diff == ""
+    assert [(item.start_line, item.end_line) for item in file.patches] == [(1, 4)]
+    assert all(item.hunk.patch == "" for item in file.patches)
@@ -0,0 +1,64 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_FOLDER = Path(__file__).resolve().parent.parent
+
+BUDGET_MS = 1500
+
+# Only imported when a bot actually needs them
+DEFERRED_MODULES = ("huggingface_hub", "mistralai", "openai", "tenacity")
+
+IMPORT_TIME_LINE = re.compile(
+    r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|\s+(?P<module>\S+)$"
+)
+
+
+@pytest.fixture(scope="module")
+def imports() -> dict[str, tuple[int, int]]:
+    """Self and cumulative import time of every module imported by main, in us."""
+    env = {
+        **os.environ,
+        # Any request at import time fails right away
+        "GITHUB_API_URL": "http://127.0.0.1:9",
+    }
+    env.pop("GITHUB_ACTIONS", None)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT_FOLDER,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert process.returncode == 0, process.stderr[-2000:]
+
+    imports = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            imports[match.group("module")] = (
+                int(match.group("self")),
+                int(match.group("cumulative")),
+            )
+    return imports
+
+
+def test_import_main_is_within_budget(imports):
+    total_ms = imports["main"][1] / 1000
+    slowest = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)[:15]
+    report = "\n".join(
+        f"{self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms  {module}"
+        for module, (self_us, cumulative_us) in slowest
+    )
+    assert total_ms <= BUDGET_MS, f"import main took {total_ms:.0f} ms:\n{report}"
+
+
+def test_import_main_defers_provider_sdks(imports):
+    deferred = sorted(
+        module for module in imports if module.split(".")[0] in DEFERRED_MODULES
+    )
+    assert deferred == []
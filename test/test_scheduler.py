@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from core.commenter import GithubCommentManager
+from core.github import GITHUB_HANDLES, GITHUB_SCHEDULER
+from core.github.scheduler import (
+    Priority,
+    RateLimitBudget,
+    RateLimitExhausted,
+    RequestScheduler,
+)
+
+
+def low_budget_scheduler() -> RequestScheduler:
+    scheduler = RequestScheduler(write_interval=0, low_priority_reserve=100)
+    scheduler.budgets["core"] = RateLimitBudget(
+        limit=5000, remaining=50, reset=time.time() + 3600
+    )
+    return scheduler
+
+
+def test_low_budget_refuses_low_priority_writes():
+    scheduler = low_budget_scheduler()
+    with scheduler.priority(Priority.LOW):
+        with pytest.raises(RateLimitExhausted):
+            scheduler.acquire("DELETE")
+    assert scheduler.metrics.skipped_low_priority == 1
+
+
+def test_low_budget_serves_low_priority_reads():
+    scheduler = low_budget_scheduler()
+    with scheduler.priority(Priority.LOW):
+        scheduler.acquire("GET")
+    assert scheduler.metrics.skipped_low_priority == 0
+
+
+def test_low_budget_serves_high_priority_writes():
+    scheduler = low_budget_scheduler()
+    with scheduler.priority(Priority.HIGH):
+        scheduler.acquire("POST")
+    assert scheduler.metrics.writes == 1
+
+
+def test_refused_housekeeping_does_not_abort_the_review(monkeypatch, capsys):
+    def get_reviews(pull_number):
+        raise RateLimitExhausted("reserved for high priority requests")
+
+    monkeypatch.setattr(GITHUB_HANDLES, "get_reviews", get_reviews)
+    with GITHUB_SCHEDULER.priority(Priority.LOW):
+        GithubCommentManager().dismiss_review_and_remove_comments(1)
+    assert "Skipped dismissing the previous review" in capsys.readouterr().out